@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the relay catalog, filter, sort and parse hot paths.
+
+Generates synthetic relays.json files (mullvad_fake.synthetic_relay_data)
+for each size and times loading the cache, flattening and protocol
+filtering, building and querying the relay catalog, parsing ping output,
+coloring result cells and the server list's sort keys and sorting
+(result_model, as used by gui.py). Each benchmark runs several times with
+the garbage collector disabled (like timeit); the best and median times
+are reported and saved as JSON.
+
+A saved report can be passed as --baseline to compare commits: the run
+exits with status 1 if a median got slower than the baseline by more than
+--threshold (and by more than --min-delta-ms, so sub-millisecond noise on
+small sizes is not reported).
+
+    python benchmarks/hot_paths.py --output before.json
+    python benchmarks/hot_paths.py --baseline before.json --output after.json
+    python benchmarks/hot_paths.py --sizes 1000 10000 --repeat 9 catalog_select sort_latency
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mullvad_api import load_cached_servers
+from server_manager import (get_all_servers, filter_servers_by_protocol, parse_unix_ping,
+                            calculate_latency_color, LATENCY_PALETTE)
+from catalog import RelayCatalog, relay_protocol
+from result_model import ResultModel
+from mullvad_fake import synthetic_relay_data
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_THRESHOLD = 1.25 # Median may grow by 25% before it counts as a regression
+DEFAULT_MIN_DELTA_MS = 1.0
+STREAMED_RESULTS = 1000 # Results arriving while the list is sorted by latency (see ResultModel.set_result)
+
+# --- Inputs ---
+
+def ping_outputs(count: int, rng: random.Random) -> List[str]:
+    """Linux (rtt ... regex) and macOS (round-trip ... fallback) ping summaries, plus some unparsable ones."""
+    outputs = []
+    for _ in range(count):
+        avg = rng.uniform(5, 300)
+        roll = rng.random()
+        if roll < 0.6:
+            outputs.append("3 packets transmitted, 3 received, 0% packet loss, time 2003ms\n"
+                           f"rtt min/avg/max/mdev = {avg - 2:.3f}/{avg:.3f}/{avg + 3:.3f}/1.204 ms\n")
+        elif roll < 0.9:
+            outputs.append("3 packets transmitted, 3 packets received, 0.0% packet loss\n"
+                           f"round-trip min/avg/max/stddev = {avg - 2:.3f}/{avg:.3f}/{avg + 3:.3f}/1.204 ms\n")
+        else:
+            outputs.append("3 packets transmitted, 0 received, 100% packet loss, time 2040ms\n")
+    return outputs
+
+def server_rows(servers: List[Dict[str, Any]]) -> List[Tuple[str, ...]]:
+    """Grid value tuples shaped like MullvadFinderApp._build_server_row (without Tk)."""
+    labels = {"wireguard": "WireGuard", "openvpn": "OpenVPN"}
+    return [("☐", s["hostname"], s["city"], f"\U0001F3F3 {s['country']}",
+             labels.get(relay_protocol(s), "Unknown"), "", "", "") for s in servers]
+
+def filled_model(rows: List[Tuple[str, ...]], latencies: List[Optional[float]]) -> ResultModel:
+    model = ResultModel()
+    for i, row in enumerate(rows):
+        model.add(f"I{i:06d}", row)
+    for i, latency in enumerate(latencies):
+        model.set_result(f"I{i:06d}", "latency", latency)
+    return model
+
+# --- Benchmarks ---
+
+# name -> (size, inputs) -> (setup, func); func(setup()) is timed, setup() is not
+Benchmark = Callable[[int, Dict[str, Any]], Tuple[Optional[Callable[[], Any]], Callable[[Any], Any]]]
+
+def _load_cache(size, inputs):
+    return None, lambda _: load_cached_servers(inputs["path"])
+
+def _get_all_servers(size, inputs):
+    return (lambda: load_cached_servers(inputs["path"])), get_all_servers
+
+def _filter_protocol(size, inputs):
+    return None, lambda _: filter_servers_by_protocol(inputs["servers"], "wireguard")
+
+def _catalog_build(size, inputs):
+    return (lambda: load_cached_servers(inputs["path"])), RelayCatalog
+
+def _catalog_select(size, inputs):
+    catalog = inputs["catalog"]
+    def run(_):
+        catalog.select(None, "wireguard", None)
+        catalog.select("ab", None, "owned:yes")
+        catalog.select(None, "openvpn", "provider:M247,xtom")
+        catalog.select(None, None, "c01 wg")
+    return None, run
+
+def _parse_ping(size, inputs):
+    outputs = inputs["ping_outputs"]
+    return None, lambda _: [parse_unix_ping(output) for output in outputs]
+
+def _color_gradient(size, inputs):
+    latencies = inputs["latencies"]
+    return None, lambda _: [calculate_latency_color(latency) for latency in latencies]
+
+def _color_palette(size, inputs):
+    latencies = inputs["latencies"]
+    tag_for = LATENCY_PALETTE.tag_for
+    return None, lambda _: [tag_for(latency) for latency in latencies if latency is not None]
+
+def _model_fill(size, inputs):
+    return None, lambda _: filled_model(inputs["rows"], inputs["latencies"])
+
+def _sort(column: str, descending: bool = False) -> Benchmark:
+    def bench(size, inputs):
+        def setup():
+            model = filled_model(inputs["rows"], inputs["latencies"])
+            model.sort("hostname") # Start from an order unrelated to the measured column
+            return model
+        return setup, lambda model: model.sort(column, descending)
+    return bench
+
+def _stream_sorted(size, inputs):
+    rng = random.Random(size)
+    updates = [(f"I{rng.randrange(size):06d}", rng.uniform(5, 300)) for _ in range(min(size, STREAMED_RESULTS))]
+    def setup():
+        model = filled_model(inputs["rows"], inputs["latencies"])
+        model.sort("latency")
+        return model
+    def run(model):
+        for item_id, latency in updates:
+            model.set_result(item_id, "latency", latency)
+    return setup, run
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "load_cached_servers": _load_cache,
+    "get_all_servers": _get_all_servers,
+    "filter_wireguard": _filter_protocol,
+    "catalog_build": _catalog_build,
+    "catalog_select": _catalog_select,
+    "parse_unix_ping": _parse_ping,
+    "latency_color_gradient": _color_gradient,
+    "latency_color_palette": _color_palette,
+    "result_model_fill": _model_fill,
+    "sort_latency": _sort("latency"),
+    "sort_country": _sort("country"),
+    "sort_download_desc": _sort("download", descending=True),
+    "stream_results_sorted": _stream_sorted,
+}
+
+def time_benchmark(setup: Optional[Callable[[], Any]], func: Callable[[Any], Any], repeat: int) -> List[float]:
+    """Run func(setup()) `repeat` times; returns the times in ms (setup excluded, gc disabled while timing)."""
+    runs = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            func(arg)
+            runs.append((time.perf_counter() - started) * 1000.0)
+        finally:
+            gc.enable()
+    return runs
+
+def prepare_inputs(size: int, directory: str, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    path = os.path.join(directory, f"relays_{size}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(synthetic_relay_data(size, seed=seed), f)
+    servers = get_all_servers(load_cached_servers(path))
+    return {
+        "path": path,
+        "servers": servers,
+        "catalog": RelayCatalog(load_cached_servers(path)),
+        "rows": server_rows(servers),
+        # Every 10th relay timed out
+        "latencies": [None if rng.random() < 0.1 else rng.uniform(5, 300) for _ in range(size)],
+        "ping_outputs": ping_outputs(size, rng),
+    }
+
+def run(sizes: List[int], repeat: int, seed: int, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            inputs = prepare_inputs(size, directory, seed)
+            for name, bench in BENCHMARKS.items():
+                if only and name not in only:
+                    continue
+                setup, func = bench(size, inputs)
+                runs = time_benchmark(setup, func, repeat)
+                median = statistics.median(runs)
+                results.setdefault(name, {})[str(size)] = {
+                    "best_ms": round(min(runs), 3),
+                    "median_ms": round(median, 3),
+                    "per_relay_us": round(median * 1000.0 / size, 3),
+                }
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "seed": seed,
+        "sizes": sizes,
+        "results": results,
+    }
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            min_delta_ms: float) -> List[Dict[str, Any]]:
+    """Benchmarks/sizes present in both reports whose median grew beyond the threshold."""
+    regressions = []
+    for name, by_size in report["results"].items():
+        for size, current in by_size.items():
+            previous = baseline.get("results", {}).get(name, {}).get(size)
+            if not previous or not previous.get("median_ms"):
+                continue
+            ratio = current["median_ms"] / previous["median_ms"]
+            current["baseline_median_ms"] = previous["median_ms"]
+            current["ratio"] = round(ratio, 3)
+            if ratio > threshold and current["median_ms"] - previous["median_ms"] > min_delta_ms:
+                regressions.append({"benchmark": name, "size": int(size), "ratio": round(ratio, 3),
+                                    "baseline_ms": previous["median_ms"], "median_ms": current["median_ms"]})
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time the catalog/filter/sort/parse hot paths on synthetic relay lists.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help=f"Relay counts (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark and size (median is compared, default: 5)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Allowed median ratio against the baseline (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help=f"Ignore slowdowns smaller than this (default: {DEFAULT_MIN_DELTA_MS} ms)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("benchmarks", nargs="*", help=f"Subset of: {', '.join(BENCHMARKS)}")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    report = run(args.sizes, args.repeat, args.seed, args.benchmarks or None)
+    regressions: List[Dict[str, Any]] = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        report["baseline"] = {"file": args.baseline, "threshold": args.threshold,
+                              "min_delta_ms": args.min_delta_ms, "regressions": regressions}
+
+    header = "".join(f"{size:>18}" for size in args.sizes)
+    print(f"{'median ms':<24}{header}")
+    for name, by_size in report["results"].items():
+        cells = ""
+        for size in args.sizes:
+            result = by_size.get(str(size), {})
+            cell = f"{result['median_ms']:.2f}" if result else "-"
+            if "ratio" in result:
+                cell += f" x{result['ratio']:.2f}"
+            cells += f"{cell:>18}"
+        print(f"{name:<24}{cells}")
+    for regression in regressions:
+        print(f"REGRESSION {regression['benchmark']} @ {regression['size']}: "
+              f"{regression['baseline_ms']:.2f} -> {regression['median_ms']:.2f} ms (x{regression['ratio']:.2f})")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for the application entry points.
+
+Runs `python -X importtime -c "<imports>"` for each entry point in a fresh
+interpreter, takes the median over several runs, records the results (and
+the slowest imported modules) as JSON and exits with status 1 if an entry
+point exceeds its budget or loads a module it must not load at startup
+(e.g. tkinter from the CLI, sqlite3/http.client from the GUI).
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --repeat 9 --output import_times.json
+    python benchmarks/import_budget.py --budget-scale 2   # slower CI machines
+
+Sources are byte-compiled first, so the numbers describe a warm start
+(as after installation), not the first run after an edit.
+"""
+
+import argparse
+import compileall
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Optional, List, Dict, Any, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> imports, budget (ms of import time on top of interpreter startup), modules that must not be loaded
+ENTRY_POINTS: Dict[str, Dict[str, Any]] = {
+    "gui": {
+        "imports": ["main"], # main.py: logging setup + gui.py (tkinter)
+        "budget_ms": 100,
+        "forbidden": ["sqlite3", "http.client", "http.server", "csv", "gzip",
+                      "results_io", "history", "exporters", "daemon", "failover", "connection", "asyncio"],
+    },
+    "cli": {
+        "imports": ["mullvad_finder"], # --help, argument errors
+        "budget_ms": 50,
+        "forbidden": ["tkinter", "subprocess", "sqlite3", "http.client"],
+    },
+    "cli-scan": {
+        "imports": ["mullvad_finder", "config", "mullvad_api", "catalog", "server_manager", "history"],
+        "budget_ms": 80,
+        "forbidden": ["tkinter", "http.client"],
+    },
+    "cli-attach": {
+        "imports": ["mullvad_finder", "daemon"], # scan --use-daemon
+        "budget_ms": 60,
+        "forbidden": ["tkinter", "http.client", "http.server", "sqlite3", "subprocess"],
+    },
+}
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, depth, self_us, cumulative_us) for each line of -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, int(parts[0]), int(parts[1])))
+    return entries
+
+def measure(imports: List[str], env: Dict[str, str]) -> Tuple[float, List[Tuple[str, int, int, int]]]:
+    """Import time in ms of the given modules (top-level entries of the requested imports) and the raw entries."""
+    statement = "; ".join(f"import {module}" for module in imports)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"'{statement}' failed:\n{result.stderr[-2000:]}")
+    entries = parse_importtime(result.stderr)
+    # Top-level entries after interpreter startup (site etc. are imported before -c runs)
+    baseline = {"site", "encodings", "zipimport", "codecs", "io", "abc", "_signal"}
+    top_level = [e for e in entries if e[1] == 0 and e[0] not in baseline and not e[0].startswith(("_frozen", "encodings."))]
+    total_us = sum(e[3] for e in top_level)
+    return total_us / 1000.0, entries
+
+def run(repeat: int, budget_scale: float, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    compileall.compile_dir(PROJECT_ROOT, quiet=1, maxlevels=0)
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, PYTHONDONTWRITEBYTECODE="1") # main.py writes its log/config below HOME
+        env.pop("PYTHONPROFILEIMPORTTIME", None)
+        results: Dict[str, Any] = {}
+        for name, spec in ENTRY_POINTS.items():
+            if only and name not in only:
+                continue
+            measure(spec["imports"], env) # Warm the OS file cache
+            runs, entries = [], []
+            for _ in range(repeat):
+                total_ms, entries = measure(spec["imports"], env)
+                runs.append(total_ms)
+            loaded = {e[0] for e in entries}
+            forbidden = sorted(m for m in spec["forbidden"] if m in loaded)
+            budget = spec["budget_ms"] * budget_scale
+            median = statistics.median(runs)
+            slowest = sorted(entries, key=lambda e: e[2], reverse=True)[:10]
+            results[name] = {
+                "imports": spec["imports"],
+                "median_ms": round(median, 2),
+                "runs_ms": [round(r, 2) for r in runs],
+                "budget_ms": budget,
+                "forbidden_loaded": forbidden,
+                "slowest_self_ms": {e[0]: round(e[2] / 1000.0, 2) for e in slowest},
+                "ok": median <= budget and not forbidden,
+            }
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "budget_scale": budget_scale,
+        "results": results,
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the import time of each entry point against its budget.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per entry point (median is used, default: 5)")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiply all budgets (slow machines)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("entry_points", nargs="*", help=f"Subset of: {', '.join(ENTRY_POINTS)}")
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat, args.budget_scale, args.entry_points or None)
+    for name, result in report["results"].items():
+        status = "ok" if result["ok"] else "FAIL"
+        print(f"{name:<12} {result['median_ms']:7.1f} ms  (budget {result['budget_ms']:.0f} ms)  {status}")
+        if result["forbidden_loaded"]:
+            print(f"{'':<12} loads at import: {', '.join(result['forbidden_loaded'])}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if all(r["ok"] for r in report["results"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
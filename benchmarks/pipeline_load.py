@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Load test of the connect, status and failover pipelines against the
+simulated Mullvad backend (mullvad_fake), so it runs without the VPN.
+
+Connects to random relays of a synthetic catalog one after another (as the
+GUI's connection lane does) while several threads poll `mullvad status`,
+then drives a failover monitor whose connected relay degrades. Reports
+time-to-connected and status latency percentiles, CLI calls per connect,
+failures and failover switches as JSON, and exits with status 1 if the
+failover monitor never switched.
+
+    python benchmarks/pipeline_load.py
+    python benchmarks/pipeline_load.py --relays 20000 --connects 500 --failure-rate 0.05 --output load.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+from typing import Optional, List, Dict, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mullvad_api import MullvadCLIError, get_mullvad_status
+from mullvad_client import set_backend, parse_status
+from mullvad_fake import FakeMullvadBackend, synthetic_relay_data
+from catalog import relay_protocol
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(values)
+    return {"p50": round(statistics.median(ordered), 2),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+            "max": round(ordered[-1], 2)}
+
+def flatten(relay_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [dict(relay, country_code=country["code"], city_code=city["code"])
+            for country in relay_data["countries"] for city in country["cities"] for relay in city["relays"]]
+
+def run_connects(relays: List[Dict[str, Any]], count: int, status_readers: int, rng: random.Random) -> Dict[str, Any]:
+    from connection import connect_relay, is_tunnel_up
+    stop = threading.Event()
+    status_ms: List[float] = []
+    status_lock = threading.Lock()
+
+    def read_status():
+        samples = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            get_mullvad_status()
+            samples.append((time.perf_counter() - started) * 1000.0)
+        with status_lock:
+            status_ms.extend(samples)
+
+    readers = [threading.Thread(target=read_status, daemon=True) for _ in range(status_readers)]
+    for reader in readers:
+        reader.start()
+
+    connect_ms: List[float] = []
+    commands: List[int] = []
+    not_connected = errors = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        relay = rng.choice(relays)
+        try:
+            result = connect_relay(relay["hostname"], relay["country_code"], relay["city_code"], relay_protocol(relay),
+                                   tunnel_up=is_tunnel_up(get_mullvad_status()), timeout_sec=10)
+        except MullvadCLIError:
+            errors += 1
+            continue
+        commands.append(result.commands)
+        if result.connected:
+            connect_ms.append(result.elapsed_ms)
+        else:
+            not_connected += 1
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for reader in readers:
+        reader.join()
+    return {
+        "connects": count,
+        "connected": len(connect_ms),
+        "not_connected": not_connected,
+        "cli_errors": errors,
+        "connects_per_sec": round(count / elapsed, 2),
+        "time_to_connected_ms": percentiles(connect_ms),
+        "cli_calls_per_connect": round(statistics.mean(commands), 2) if commands else None,
+        "status_reads": len(status_ms),
+        "status_ms": percentiles(status_ms),
+    }
+
+def run_failover(relays: List[Dict[str, Any]], checks: int, rng: random.Random) -> Dict[str, Any]:
+    from failover import FailoverMonitor, FailoverPolicy
+    wireguard = [r for r in relays if relay_protocol(r) == "wireguard"]
+    base_latency = {r["hostname"]: rng.uniform(10, 120) for r in wireguard}
+    degraded = set()
+
+    def ping(relay: Dict[str, Any]) -> Optional[float]:
+        hostname = relay["hostname"]
+        if hostname in degraded:
+            return None if rng.random() < 0.5 else base_latency[hostname] + 200
+        return base_latency[hostname] + rng.uniform(0, 5)
+
+    ranked = sorted(wireguard, key=lambda r: base_latency[r["hostname"]])
+
+    def shortlist(current: Dict[str, Any], size: int) -> List[Dict[str, Any]]:
+        # Best relays that have not degraded yet, like the GUI's snapshot of its best test results
+        return [r for r in ranked if r["hostname"] not in degraded and r is not current][:size]
+
+    # Start from a tunnel that is up on the monitored relay: the connect phase leaves
+    # the last random relay (and its tunnel protocol) behind
+    from connection import connect_relay, is_tunnel_up
+    start = rng.choice(wireguard)
+    connect_relay(start["hostname"], start["country_code"], start["city_code"], relay_protocol(start),
+                  tunnel_up=is_tunnel_up(get_mullvad_status()), timeout_sec=10)
+
+    policy = FailoverPolicy(cooldown_sec=0, min_samples=3, window=6, bad_checks=2)
+    monitor = FailoverMonitor(start, shortlist, policy=policy, ping=ping)
+    switches = 0
+    check_ms: List[float] = []
+    for i in range(checks):
+        if i % 10 == 0: # The connected relay goes bad every few checks
+            degraded.add(monitor.current["hostname"])
+        started = time.perf_counter()
+        decision = monitor.check()
+        check_ms.append((time.perf_counter() - started) * 1000.0)
+        if decision is not None and decision.switched:
+            switches += 1
+    return {"checks": checks, "switches": switches, "check_ms": percentiles(check_ms),
+            "final_state": parse_status(get_mullvad_status()).state}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Exercise the connect/status/failover pipelines against the fake backend.")
+    parser.add_argument("--relays", type=int, default=5000, help="Synthetic relays (default: 5000)")
+    parser.add_argument("--connects", type=int, default=100, help="Sequential connects (default: 100)")
+    parser.add_argument("--status-readers", type=int, default=4, help="Threads polling the status meanwhile (default: 4)")
+    parser.add_argument("--failover-checks", type=int, default=200, help="Failover monitor checks (default: 200)")
+    parser.add_argument("--latency", type=float, default=0.01, help="Simulated CLI latency in seconds (default: 0.01)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Extra random CLI latency in seconds (default: 0.01)")
+    parser.add_argument("--connect-delay", type=float, default=0.05, help="Connecting -> Connected in seconds (default: 0.05)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of state-changing commands that fail")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    relay_data = synthetic_relay_data(args.relays, seed=args.seed)
+    relays = flatten(relay_data)
+    backend = FakeMullvadBackend(relay_data, command_latency_sec=args.latency, jitter_sec=args.jitter,
+                                 connect_delay_sec=args.connect_delay, failure_rate=args.failure_rate, seed=args.seed)
+    set_backend(backend)
+    rng = random.Random(args.seed)
+
+    report = {
+        "python": platform.python_version(),
+        "settings": vars(args),
+        "connect": run_connects(relays, args.connects, args.status_readers, rng),
+        "failover": run_failover(relays, args.failover_checks, rng),
+        "cli_calls": len(backend.calls),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.failover_checks and report["failover"]["switches"] == 0:
+        print("FAIL: the failover monitor never switched relays", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
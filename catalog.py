@@ -0,0 +1,415 @@
+import logging
+import re
+import shlex
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Set, Tuple, Iterable
+
+from server_manager import get_all_servers
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+class RelayQueryError(ValueError):
+    """Custom exception for malformed relay query strings."""
+    pass
+
+# --- Query Language ---
+#
+# A query is a whitespace separated list of terms which are ANDed together:
+#
+#   owned protocol:wireguard country:de,se -provider:M247 weight>=100
+#
+#   field:value[,value...]   match any of the values (also '=')
+#   -field:value / field!=v  exclude the values
+#   field>N, field>=N, ...   numeric comparison (weight)
+#   owned / active           bare boolean field, same as 'owned:true'
+#   word                     hostname substring match
+#
+# Values containing spaces can be quoted: city:"New York".
+
+INDEXED_FIELDS = ("country", "city", "protocol", "provider", "owned", "active")
+NUMERIC_FIELDS = ("weight",)
+BOOLEAN_FIELDS = ("owned", "active")
+TEXT_FIELDS = ("hostname",)
+COMPARISON_OPERATORS = (">=", "<=", "!=", ">", "<", ":", "=")
+
+_PROTOCOL_ALIASES = {
+    "wg": "wireguard", "wireguard": "wireguard",
+    "ovpn": "openvpn", "openvpn": "openvpn",
+    "bridge": "bridge",
+}
+_TRUE_VALUES = ("1", "true", "yes", "y", "on")
+_FALSE_VALUES = ("0", "false", "no", "n", "off")
+
+def relay_protocol(server: Dict[str, Any]) -> str:
+    """Determine the tunnel protocol of a relay from its 'endpoint_data' field."""
+    endpoint_data = server.get("endpoint_data")
+    if isinstance(endpoint_data, dict) and "wireguard" in endpoint_data:
+        return "wireguard"
+    if isinstance(endpoint_data, str) and endpoint_data in ("openvpn", "bridge"):
+        return endpoint_data
+    return "unknown"
+
+def _parse_bool(value: str) -> bool:
+    value_lower = value.lower()
+    if value_lower in _TRUE_VALUES:
+        return True
+    if value_lower in _FALSE_VALUES:
+        return False
+    raise RelayQueryError(f"Expected a boolean value (yes/no), got '{value}'")
+
+def _normalize_value(field: str, value: str) -> Any:
+    """Normalize a raw query value so it can be compared with index keys."""
+    if field in BOOLEAN_FIELDS:
+        return _parse_bool(value)
+    if field in NUMERIC_FIELDS:
+        try:
+            return float(value)
+        except ValueError:
+            raise RelayQueryError(f"Expected a number for '{field}', got '{value}'")
+    if field == "protocol":
+        protocol = _PROTOCOL_ALIASES.get(value.lower())
+        if not protocol:
+            raise RelayQueryError(f"Unknown protocol '{value}'")
+        return protocol
+    return value.lower()
+
+class RelayQuery:
+    """A parsed relay query: a list of (field, operator, values, negated) terms."""
+
+    def __init__(self, terms: Optional[List[Tuple[str, str, List[Any], bool]]] = None):
+        self.terms: List[Tuple[str, str, List[Any], bool]] = terms or []
+
+    @classmethod
+    def parse(cls, text: Optional[str]) -> "RelayQuery":
+        """Parse a query string into a RelayQuery. Raises RelayQueryError on bad input."""
+        query = cls()
+        if not text or not text.strip():
+            return query
+        try:
+            tokens = shlex.split(text)
+        except ValueError as e:
+            raise RelayQueryError(f"Could not parse query: {e}")
+
+        for token in tokens:
+            negated = token.startswith("-") and len(token) > 1
+            if negated:
+                token = token[1:]
+
+            # Find the first operator in the token (longest operators are listed first)
+            positions = [pos for pos in (token.find(op) for op in COMPARISON_OPERATORS) if pos > 0]
+            op_pos = min(positions) if positions else -1
+            operator = next((op for op in COMPARISON_OPERATORS if token.startswith(op, op_pos)), "") if positions else ""
+
+            if op_pos == -1:
+                # Bare word: boolean field shorthand or hostname substring
+                word = token.lower()
+                if word in BOOLEAN_FIELDS:
+                    query.add(word, "=", [True], negated)
+                else:
+                    query.add("hostname", "~", [word], negated)
+                continue
+
+            field = token[:op_pos].lower()
+            raw_value = token[op_pos + len(operator):]
+            if operator == ":":
+                operator = "="
+            if operator == "!=":
+                operator, negated = "=", not negated
+
+            if field not in INDEXED_FIELDS + NUMERIC_FIELDS + TEXT_FIELDS:
+                raise RelayQueryError(f"Unknown query field '{field}'")
+            if not raw_value:
+                raise RelayQueryError(f"Missing value for '{field}'")
+            if operator in (">", ">=", "<", "<=") and field not in NUMERIC_FIELDS:
+                raise RelayQueryError(f"Operator '{operator}' is only supported for numeric fields")
+
+            values = [_normalize_value(field, v) for v in raw_value.split(",") if v]
+            if not values:
+                raise RelayQueryError(f"Missing value for '{field}'")
+            if field in TEXT_FIELDS:
+                operator = "~"
+            query.add(field, operator, values, negated)
+        return query
+
+    def add(self, field: str, operator: str, values: List[Any], negated: bool = False) -> "RelayQuery":
+        """Append a term to the query. Returns self to allow chaining."""
+        self.terms.append((field, operator, values, negated))
+        return self
+
+    def mentions(self, field: str) -> bool:
+        """Check whether any term of the query filters on the given field."""
+        return any(term[0] == field for term in self.terms)
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def __repr__(self) -> str:
+        return f"RelayQuery({self.terms!r})"
+
+
+# --- Type-Ahead Search Index ---
+
+_TOKEN_SPLIT_RE = re.compile(r"[\s\-_.,()]+")
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
+    """
+    Prefix and trigram index over relay hostname, city and country.
+
+    Indexes are built over distinct field values (a city name is indexed
+    once, not once per relay) which then map to relay positions. Terms
+    shorter than three characters are answered from a sorted token list
+    (prefix range via bisect); longer terms intersect trigram posting sets
+    and verify the few remaining values with a substring check. Multiple
+    whitespace separated terms are ANDed.
+    """
+
+    def __init__(self, relays: List[Dict[str, Any]]):
+        self.relays = relays
+        self._values: List[str] = [] # Distinct lowercase field values
+        self._value_positions: List[Set[int]] = [] # value id -> relay positions
+        self._token_postings: Dict[str, Set[int]] = {} # token -> value ids
+        self._trigram_postings: Dict[str, Set[int]] = {} # trigram -> value ids
+
+        value_ids: Dict[str, int] = {}
+        for pos, relay in enumerate(relays):
+            for field in ("hostname", "city", "city_code", "country", "country_code"):
+                value = str(relay.get(field) or "").lower()
+                if not value:
+                    continue
+                value_id = value_ids.get(value)
+                if value_id is None:
+                    value_id = value_ids[value] = len(self._values)
+                    self._values.append(value)
+                    self._value_positions.append(set())
+                    self._index_value(value_id, value)
+                self._value_positions[value_id].add(pos)
+        self._tokens: List[str] = sorted(self._token_postings)
+
+    def _index_value(self, value_id: int, value: str):
+        for token in _TOKEN_SPLIT_RE.split(value):
+            if token:
+                self._token_postings.setdefault(token, set()).add(value_id)
+        for trigram in _trigrams(value):
+            self._trigram_postings.setdefault(trigram, set()).add(value_id)
+
+    def _positions_of(self, value_ids: Iterable[int]) -> Set[int]:
+        positions: Set[int] = set()
+        for value_id in value_ids:
+            positions |= self._value_positions[value_id]
+        return positions
+
+    def _match_prefix(self, term: str) -> Set[int]:
+        value_ids: Set[int] = set()
+        index = bisect_left(self._tokens, term)
+        while index < len(self._tokens) and self._tokens[index].startswith(term):
+            value_ids |= self._token_postings[self._tokens[index]]
+            index += 1
+        return self._positions_of(value_ids)
+
+    def _match_substring(self, term: str) -> Set[int]:
+        postings = sorted((self._trigram_postings.get(trigram, set()) for trigram in _trigrams(term)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = postings[0].intersection(*postings[1:])
+        return self._positions_of(value_id for value_id in candidates if term in self._values[value_id])
+
+    def search(self, text: str) -> Optional[Set[int]]:
+        """Return the relay positions matching every term, or None for an empty search."""
+        terms = text.lower().split()
+        if not terms:
+            return None
+        result: Optional[Set[int]] = None
+        # Longest terms first: they are usually the most selective
+        for term in sorted(terms, key=len, reverse=True):
+            matched = self._match_prefix(term) if len(term) < 3 else self._match_substring(term)
+            result = matched if result is None else result & matched
+            if not result:
+                return set()
+        return result
+
+    def search_hostnames(self, text: str) -> Optional[Set[str]]:
+        """Like search(), but returns hostnames."""
+        positions = self.search(text)
+        if positions is None:
+            return None
+        return {self.relays[pos].get("hostname", "") for pos in positions}
+
+
+# --- Relay Catalog ---
+
+class RelayCatalog:
+    """
+    Flat, indexed view over the relays in a relays.json document.
+
+    Each indexed field maps a normalized value to the set of relay positions
+    carrying it, so most query terms are answered with set operations instead
+    of scanning every relay.
+    """
+
+    def __init__(self, data: Optional[Dict[str, Any]]):
+        self.relays: List[Dict[str, Any]] = get_all_servers(data) if data else []
+        self.by_hostname: Dict[str, Dict[str, Any]] = {}
+        self._all_positions: Set[int] = set(range(len(self.relays)))
+        self._indexes: Dict[str, Dict[Any, Set[int]]] = {field: {} for field in INDEXED_FIELDS}
+
+        for pos, relay in enumerate(self.relays):
+            hostname = relay.get("hostname")
+            if hostname:
+                self.by_hostname[hostname] = relay
+            for field, key in self._index_keys(relay):
+                self._indexes[field].setdefault(key, set()).add(pos)
+        self.search_index = SearchIndex(self.relays)
+
+        logger.info(f"Relay catalog built with {len(self.relays)} relays.")
+
+    @staticmethod
+    def _index_keys(relay: Dict[str, Any]) -> Iterable[Tuple[str, Any]]:
+        yield "country", str(relay.get("country_code", "")).lower()
+        yield "country", str(relay.get("country", "")).lower()
+        yield "city", str(relay.get("city_code", "")).lower()
+        yield "city", str(relay.get("city", "")).lower()
+        yield "protocol", relay_protocol(relay)
+        yield "provider", str(relay.get("provider", "")).lower()
+        yield "owned", bool(relay.get("owned", False))
+        yield "active", relay.get("active", True) is not False
+
+    def __len__(self) -> int:
+        return len(self.relays)
+
+    def get(self, hostname: str) -> Optional[Dict[str, Any]]:
+        """Look up a relay by hostname."""
+        return self.by_hostname.get(hostname)
+
+    def countries(self) -> List[Dict[str, str]]:
+        """Return the distinct countries of the catalog as {'code', 'name'} dicts."""
+        seen: Dict[str, str] = {}
+        for relay in self.relays:
+            seen.setdefault(relay.get("country_code", ""), relay.get("country", "Unknown"))
+        return [{"code": code, "name": name} for code, name in seen.items()]
+
+    def _match_term(self, candidates: Set[int], field: str, operator: str, values: List[Any]) -> Set[int]:
+        """Return the subset of candidates matching one (non-negated) term."""
+        if field in self._indexes and operator == "=":
+            index = self._indexes[field]
+            matched: Set[int] = set()
+            for value in values:
+                matched |= index.get(value, set())
+            return candidates & matched
+
+        if field in NUMERIC_FIELDS:
+            threshold = values[0]
+            compare = {
+                "=": lambda v: v in values,
+                ">": lambda v: v > threshold,
+                ">=": lambda v: v >= threshold,
+                "<": lambda v: v < threshold,
+                "<=": lambda v: v <= threshold,
+            }[operator]
+            result = set()
+            for pos in candidates:
+                raw = self.relays[pos].get(field)
+                if isinstance(raw, (int, float)) and compare(float(raw)):
+                    result.add(pos)
+            return result
+
+        if field == "hostname":
+            return {pos for pos in candidates
+                    if any(v in str(self.relays[pos].get("hostname", "")).lower() for v in values)}
+
+        raise RelayQueryError(f"Unsupported query term: {field}{operator}{values}")
+
+    def query(self, query: Any = None, include_inactive: bool = False) -> List[Dict[str, Any]]:
+        """
+        Return relays matching a query, in catalog order.
+
+        Args:
+            query: A query string or a RelayQuery instance.
+            include_inactive: Keep relays with 'active: false'. Ignored when the
+                query itself filters on 'active'.
+
+        Returns:
+            List of relay dictionaries (shared with the catalog, not copies).
+        """
+        parsed = query if isinstance(query, RelayQuery) else RelayQuery.parse(query)
+
+        candidates = set(self._all_positions)
+        if not include_inactive and not parsed.mentions("active"):
+            candidates &= self._indexes["active"].get(True, set())
+
+        for field, operator, values, negated in parsed.terms:
+            if not candidates:
+                break
+            matched = self._match_term(candidates, field, operator, values)
+            candidates = candidates - matched if negated else matched
+
+        return [self.relays[pos] for pos in sorted(candidates)]
+
+    def select(self, country_code: Optional[str] = None, protocol: Optional[str] = None,
+               query: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Combine the GUI country/protocol selectors with a free-form query string."""
+        parsed = RelayQuery.parse(query)
+        if country_code:
+            parsed.add("country", "=", [country_code.lower()])
+        if protocol and protocol.lower() != "both":
+            parsed.add("protocol", "=", [_normalize_value("protocol", protocol)])
+        return self.query(parsed)
+
+
+# --- Filter Result Cache ---
+
+class FilterResultCache:
+    """
+    LRU cache of computed filter results keyed by (country, protocol, query).
+
+    Values are opaque to the cache; the GUI stores the matching relays together
+    with their pre-built display rows. Clear it whenever the catalog is rebuilt.
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], Any]" = OrderedDict()
+
+    @staticmethod
+    def make_key(country_code: Optional[str], protocol: Optional[str], query: Optional[str]) -> Tuple[str, str, str]:
+        """Build a normalized cache key so equivalent filter states share an entry."""
+        return ((country_code or "").lower(), (protocol or "both").lower(), " ".join((query or "").split()))
+
+    def get(self, key: Tuple[str, str, str]) -> Any:
+        """Return the cached value for key (marking it most recently used), or None."""
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key: Tuple[str, str, str], value: Any):
+        """Store a value, evicting the least recently used entry when full."""
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached entries (e.g. after a catalog reload)."""
+        if self._entries:
+            logger.debug(f"Clearing {len(self._entries)} cached filter results.")
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def query_relays(data: Optional[Dict[str, Any]], query: Optional[str] = None,
+                 include_inactive: bool = False) -> List[Dict[str, Any]]:
+    """Convenience wrapper: build a catalog from relays.json data and run one query."""
+    return RelayCatalog(data).query(query, include_inactive=include_inactive)
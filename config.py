@@ -1,9 +1,13 @@
 
 import json
 import os
+import atexit
 import platform
+import tempfile
+import threading
+import time
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Set
 
 # Setup logger for this module
 logger = logging.getLogger(__name__)
@@ -40,11 +44,15 @@ def get_default_cache_path() -> str:
 CONFIG_DIR = os.path.expanduser("~/.config/mullvad-finder") # Store config in .config subdir
 CONFIG_PATH = os.path.join(CONFIG_DIR, "mullvad_finder_config.json")
 LOG_PATH = os.path.expanduser("~/mullvad_finder.log") # Log file in home directory
+RELAY_LIST_CACHE_PATH = os.path.join(CONFIG_DIR, "relays_cli.json") # Relay list fetched via the CLI
+HISTORY_DB_PATH = os.path.join(CONFIG_DIR, "history.sqlite3") # Probe history (SQLite, WAL)
+DAEMON_SOCKET_PATH = os.path.join(CONFIG_DIR, "daemon.sock") # Probe daemon query API (Unix socket)
 
 DEFAULT_CONFIG: Dict[str, Any] = {
     "favorite_servers": [],
     "last_country": "",
     "last_protocol": "wireguard",
+    "last_query": "", # Relay query typed into the filter bar
     "ping_count": 3, # Reduced default for faster initial tests
     "max_workers": 15, # Increased default
     "cache_path": get_default_cache_path(), # Platform-specific default
@@ -58,10 +66,155 @@ DEFAULT_CONFIG: Dict[str, Any] = {
     "default_sort_column": "latency",
     "default_sort_order": "ascending",
     "test_type": "ping",  # ping, speed, both
-    "alternating_row_colors": True
+    "alternating_row_colors": True,
+    "record_history": True, # Append every ping/speed result to the probe history database
+    "history_retention_days": 90, # Older probes are pruned at startup (0 keeps everything)
+    "use_daemon": True, # Take ping results from a running probe daemon instead of probing
+    "daemon_max_age_sec": 900, # Daemon results older than this are probed again
+    "auto_failover": False, # Switch relays automatically when the connected one degrades
+    "failover_max_latency_ms": 150,
+    "failover_max_loss": 0.2, # Fraction of lost pings over the last minute
+    "failover_max_jitter_ms": 40,
+    "failover_cooldown_sec": 300 # Minimum time between two automatic switches
 }
 
-def load_config() -> Dict[str, Any]:
+# --- Atomic Writes ---
+
+def write_json_atomic(path: str, data: Any, indent: Optional[int] = None):
+    """Write JSON to a temp file next to path and atomically rename it into place."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# --- Config Store ---
+
+class ConfigStore(dict):
+    """
+    In-memory configuration with dirty-key tracking and debounced flushes.
+
+    Behaves like the plain config dict it replaces. Changing a value marks the
+    key dirty and (re)starts a short debounce timer; when it fires, the whole
+    config is written once via temp file + atomic rename. Bursts of changes
+    (filter clicks, theme toggles, favorites) therefore cost a single write.
+    Mutations of nested values (e.g. the favorites list) must be reported with
+    mark_dirty(). load_config() registers the store it returns for a final
+    flush at exit; other instances must call flush() themselves.
+    """
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, path: str = CONFIG_PATH,
+                 debounce_sec: float = 1.5, max_delay_sec: float = 10.0):
+        super().__init__(data or {})
+        self.path = path
+        self.debounce_sec = debounce_sec
+        self.max_delay_sec = max_delay_sec # Upper bound while changes keep arriving
+        self.writes = 0
+        self._dirty: Set[str] = set()
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        self._first_dirty_at: Optional[float] = None
+
+    @property
+    def dirty_keys(self) -> Set[str]:
+        with self._lock:
+            return set(self._dirty)
+
+    def __setitem__(self, key: str, value: Any):
+        with self._lock:
+            if key in self and self[key] == value:
+                return
+            super().__setitem__(key, value)
+            self.mark_dirty(key)
+
+    def __delitem__(self, key: str):
+        with self._lock:
+            super().__delitem__(key)
+            self.mark_dirty(key)
+
+    def update(self, *args: Any, **kwargs: Any):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self:
+                self[key] = default
+            return self[key]
+
+    def pop(self, key: str, *default: Any) -> Any:
+        with self._lock:
+            if key in self:
+                self.mark_dirty(key)
+            return super().pop(key, *default)
+
+    def copy(self) -> Dict[str, Any]:
+        """Return a plain dict snapshot (edits to it are not tracked)."""
+        with self._lock:
+            return dict(self)
+
+    def mark_dirty(self, key: str):
+        """Record that key changed and schedule a debounced flush."""
+        with self._lock:
+            self._dirty.add(key)
+            now = time.monotonic()
+            if self._first_dirty_at is None:
+                self._first_dirty_at = now
+            delay = min(self.debounce_sec, max(0.0, self._first_dirty_at + self.max_delay_sec - now))
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> bool:
+        """Write the config now if anything is dirty. Returns False if the write failed."""
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return True
+            dirty = sorted(self._dirty)
+            try:
+                write_json_atomic(self.path, dict(self), indent=2)
+            except Exception as e:
+                logger.exception(f"Error saving config file {self.path}: {e}")
+                return False
+            self._dirty.clear()
+            self._first_dirty_at = None
+            self.writes += 1
+        logger.info(f"Saved configuration to {self.path} (changed: {', '.join(dirty)})")
+        return True
+
+
+# The store in use (the last one load_config() returned). Only it is flushed at
+# exit, so an older instance with stale dirty keys cannot overwrite a newer write.
+_active_store: Optional[ConfigStore] = None
+
+def _flush_active_store():
+    if _active_store is not None:
+        _active_store.flush() # Last chance to persist pending changes
+
+atexit.register(_flush_active_store)
+
+def _activate(store: ConfigStore) -> ConfigStore:
+    global _active_store
+    _active_store = store
+    return store
+
+def load_config() -> ConfigStore:
     """Load the user configuration from the config file."""
     # Ensure config directory exists
     os.makedirs(CONFIG_DIR, exist_ok=True)
@@ -77,7 +230,7 @@ def load_config() -> Dict[str, Any]:
             # Ensure cache_path is updated if default logic changed but custom isn't set
             if not loaded_config.get("custom_cache_path"):
                 loaded_config["cache_path"] = get_default_cache_path()
-            return loaded_config
+            return _activate(ConfigStore(loaded_config))
         except json.JSONDecodeError:
             logger.exception(f"Error decoding JSON from config file: {CONFIG_PATH}. Using defaults.")
         except Exception as e:
@@ -86,16 +239,20 @@ def load_config() -> Dict[str, Any]:
         logger.info(f"Config file not found at {CONFIG_PATH}. Creating with defaults.")
         save_config(DEFAULT_CONFIG.copy()) # Save defaults if file doesn't exist
 
-    return DEFAULT_CONFIG.copy()
+    return _activate(ConfigStore(DEFAULT_CONFIG.copy()))
 
-def save_config(config: Dict[str, Any]) -> bool:
-    """Save the user configuration to the config file."""
-    # Ensure config directory exists
-    os.makedirs(CONFIG_DIR, exist_ok=True)
+def save_config(config: Dict[str, Any], immediate: bool = False) -> bool:
+    """
+    Save the user configuration.
+
+    A ConfigStore is flushed by its debounce timer (or right away with
+    immediate=True); a plain dict is written atomically at once.
+    """
+    if isinstance(config, ConfigStore):
+        return config.flush() if immediate else True
     try:
         logger.info(f"Saving configuration to: {CONFIG_PATH}")
-        with open(CONFIG_PATH, "w", encoding='utf-8') as f:
-            json.dump(config, f, indent=2)
+        write_json_atomic(CONFIG_PATH, config, indent=2)
         return True
     except Exception as e:
         logger.exception(f"Error saving config file {CONFIG_PATH}: {e}")
@@ -125,6 +282,8 @@ def add_favorite_server(config: Dict[str, Any], server: Dict[str, Any]) -> bool:
     # Add to favorites
     logger.info(f"Adding server {server_info['hostname']} to favorites.")
     favorites.append(server_info)
+    if isinstance(config, ConfigStore):
+        config.mark_dirty("favorite_servers") # In-place list change is not seen by __setitem__
     return save_config(config) # Save after modification
 
 def remove_favorite_server(config: Dict[str, Any], hostname: str) -> bool:
@@ -157,3 +316,14 @@ def get_log_path() -> str:
     """Get the path to the log file."""
     return LOG_PATH
 
+def get_relay_list_cache_path() -> str:
+    """Get the path of the relay list cached from the Mullvad CLI."""
+    return RELAY_LIST_CACHE_PATH
+
+def get_history_db_path() -> str:
+    """Get the path of the probe history database."""
+    return HISTORY_DB_PATH
+
+def get_daemon_socket_path() -> str:
+    """Get the path of the probe daemon's Unix socket."""
+    return DAEMON_SOCKET_PATH
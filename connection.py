@@ -0,0 +1,167 @@
+import asyncio
+import time
+import logging
+from typing import Optional, Tuple, NamedTuple
+
+from mullvad_api import MullvadCLIError, StatusStreamParser
+from mullvad_client import MullvadClient, CommandStream, get_client, parse_status
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT_SEC = 30.0 # From the connect request to the Connected state
+STATUS_POLL_SEC = 2.0 # `mullvad status` check while the stream is silent (or unavailable)
+
+
+class ConnectResult(NamedTuple):
+    """Outcome of one connect pipeline run."""
+    hostname: str
+    connected: bool
+    elapsed_ms: float # Since started_at (the user's click), also on failure
+    commands: int # Mutating CLI calls issued
+    status: str # Last status seen
+
+
+def is_tunnel_up(status: Optional[str]) -> bool:
+    """True for Connected/Connecting states, in which a new location reconnects by itself."""
+    return bool(status) and parse_status(status).tunnel_up
+
+def is_connected_to(status: Optional[str], hostname: str) -> bool:
+    return bool(status) and parse_status(status).is_connected_to(hostname)
+
+
+# --- Status Stream ---
+
+async def _open_status_stream(client: MullvadClient) -> Optional[CommandStream]:
+    try:
+        return await client.open_stream(['status', 'listen'])
+    except (MullvadCLIError, OSError) as e:
+        logger.warning(f"Status stream unavailable, polling 'mullvad status' instead: {e}")
+        return None
+
+async def _poll_status(client: MullvadClient) -> str:
+    try:
+        result = await client.execute(['status'])
+    except MullvadCLIError as e:
+        logger.debug(f"Status check failed: {e}")
+        return ""
+    return result.stdout if result.ok else ""
+
+async def wait_for_connected(client: MullvadClient, stream: Optional[CommandStream], hostname: str,
+                             deadline: float) -> Tuple[bool, str]:
+    """
+    Wait until the status stream reports Connected to `hostname`. While the
+    stream is silent for STATUS_POLL_SEC (e.g. the relay was already up and
+    nothing changed, or `status listen` is unsupported), `mullvad status` is
+    checked instead. A Blocked (error) state ends the wait early.
+
+    Returns:
+        (connected, last status text)
+    """
+    parser = StatusStreamParser()
+    status = ""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False, status
+        line = None
+        if stream is not None and stream.running:
+            try:
+                line = await asyncio.wait_for(stream.readline(), min(remaining, STATUS_POLL_SEC))
+            except asyncio.TimeoutError:
+                pass
+            if line == "": # Stream ended
+                stream = None
+        if line:
+            update = parser.feed(line)
+            if update is None:
+                continue
+            status = update
+        else:
+            if stream is None:
+                await asyncio.sleep(min(max(0.0, deadline - time.monotonic()), STATUS_POLL_SEC / 4))
+            status = await _poll_status(client) or status
+        logger.debug("Connect pipeline status: %s", status.splitlines()[0] if status else "")
+        parsed = parse_status(status)
+        if parsed.is_connected_to(hostname):
+            return True, status
+        if parsed.state == "blocked":
+            return False, status
+
+
+# --- Connect Pipeline ---
+
+async def _current_protocol(client: MullvadClient) -> Optional[str]:
+    """The daemon's tunnel protocol setting, or None if it cannot be read (then it is set anyway)."""
+    try:
+        return await client.tunnel_protocol()
+    except MullvadCLIError as e:
+        logger.debug(f"Could not read the tunnel protocol: {e}")
+        return None
+
+async def connect_relay_async(hostname: str, country_code: str, city_code: str, protocol: Optional[str] = None,
+                              tunnel_up: bool = False, started_at: Optional[float] = None,
+                              timeout_sec: float = CONNECT_TIMEOUT_SEC,
+                              client: Optional[MullvadClient] = None) -> ConnectResult:
+    """
+    Point the Mullvad daemon at one relay and wait until the tunnel is up.
+
+    Issues only the mutating calls that are needed: the tunnel protocol is
+    set unless the daemon already uses it (read with `relay get`, since the
+    Mullvad app or another process may have changed it; None leaves it
+    alone), and `mullvad connect` is skipped while the tunnel is up, since
+    the daemon reconnects to a new location by itself. The status stream is
+    opened before the first call so no state change is missed.
+
+    Must run on the loop of `client` (the shared client unless given), e.g.
+    through client.submit() or the blocking connect_relay().
+
+    Args:
+        started_at: time.monotonic() of the user's request; elapsed_ms is measured from it.
+        tunnel_up: The current state is Connected/Connecting (see is_tunnel_up).
+
+    Raises:
+        MullvadCLIError: A CLI call failed. Timeouts and Blocked states are
+            returned as a ConnectResult with connected=False instead.
+    """
+    if not country_code:
+        raise ValueError("Country code is required to set location.")
+    if protocol is not None:
+        protocol = protocol.lower()
+        if protocol not in ("openvpn", "wireguard"):
+            raise ValueError("Protocol must be either 'openvpn' or 'wireguard'")
+    client = client or get_client()
+    started_at = time.monotonic() if started_at is None else started_at
+    deadline = time.monotonic() + timeout_sec
+
+    stream = await _open_status_stream(client)
+    commands = 0
+    try:
+        async with client.exclusive(): # No other state change in between
+            if protocol is not None and await _current_protocol(client) != protocol:
+                await client.set_tunnel_protocol(protocol)
+                commands += 1
+            await client.set_location(country_code, city_code, hostname)
+            commands += 1
+            if not tunnel_up:
+                await client.connect()
+                commands += 1
+        connected, status = await wait_for_connected(client, stream, hostname, deadline)
+    finally:
+        if stream is not None:
+            await stream.close()
+
+    elapsed_ms = (time.monotonic() - started_at) * 1000.0
+    if connected:
+        logger.info(f"Connected to {hostname} in {elapsed_ms:.0f} ms ({commands} CLI calls)")
+    else:
+        logger.warning(f"Connection to {hostname} not up after {elapsed_ms:.0f} ms. Last status: {status or 'n/a'}")
+    return ConnectResult(hostname, connected, elapsed_ms, commands, status)
+
+def connect_relay(hostname: str, country_code: str, city_code: str, protocol: Optional[str] = None,
+                  tunnel_up: bool = False, started_at: Optional[float] = None,
+                  timeout_sec: float = CONNECT_TIMEOUT_SEC) -> ConnectResult:
+    """Blocking wrapper around connect_relay_async for worker threads (runs on the shared client's loop)."""
+    client = get_client()
+    return client.call(connect_relay_async(hostname, country_code, city_code, protocol, tunnel_up,
+                                           started_at, timeout_sec, client))
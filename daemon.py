@@ -0,0 +1,589 @@
+import json
+import os
+import socket
+import threading
+import time
+import logging
+from collections import deque
+from heapq import merge
+from itertools import zip_longest
+from queue import Queue, Full, Empty
+from threading import Event
+from typing import Optional, List, Dict, Any, Deque, Tuple, Callable
+from urllib.parse import urlsplit, parse_qs, urlencode, quote, unquote
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+# --- Probe Daemon ---
+#
+# A long-running process that keeps probing the relay catalog at a low, fixed
+# rate and maintains a rolling ranking in memory. The ranking is rebuilt into
+# pre-sorted per-(country, protocol) lists after each probe, so a "best N
+# relays" query is a dict lookup plus a slice. The GUI and the CLI read the
+# ranking over a local HTTP API (Unix socket, or 127.0.0.1 where AF_UNIX is
+# unavailable) instead of running their own sweeps.
+
+DEFAULT_DAEMON_PORT = 47821
+DEFAULT_PROBE_RATE = 1.0 # Probes started per second
+DEFAULT_PROBE_WORKERS = 4 # Concurrent pings (bounds the work in flight when relays time out)
+DEFAULT_PING_COUNT = 2
+DEFAULT_TIMEOUT_SEC = 4 # Per relay; ping itself gets half (see get_server_latency)
+DEFAULT_WINDOW = 5 # Samples kept per relay
+DEFAULT_RESULT_COUNT = 5
+TOP_REFRESH_EVERY = 4 # Every Nth probe re-checks the stalest relay of the current top list
+TOP_REFRESH_SIZE = 20
+TOP_REFRESH_MIN_AGE_SEC = 60.0
+LOSS_PENALTY_MS = 100.0 # Ranking score = median latency + loss ratio * penalty + connect time penalty
+CATALOG_RELOAD_SEC = 3600.0
+CLIENT_TIMEOUT_SEC = 2.0
+
+_UNREACHABLE = float("inf")
+
+
+class DaemonError(Exception):
+    """Custom exception for daemon startup, connection or protocol errors."""
+    pass
+
+
+def _median(sorted_values: List[float]) -> Optional[float]:
+    if not sorted_values:
+        return None
+    mid = len(sorted_values) // 2
+    if len(sorted_values) % 2:
+        return sorted_values[mid]
+    return (sorted_values[mid - 1] + sorted_values[mid]) / 2
+
+
+# --- Rolling Ranking ---
+
+class RollingRanking:
+    """
+    Last `window` ping results per relay, ranked by median latency plus a loss
+    penalty. Relays that were slow to connect (from the history) get a
+    further penalty. rebuild() publishes an immutable snapshot by swapping a
+    single reference, so readers never take the lock.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._relays: Dict[str, Dict[str, Any]] = {}
+        self._protocols: Dict[str, str] = {}
+        self._samples: Dict[str, Deque[Optional[float]]] = {}
+        self._last_probe: Dict[str, float] = {}
+        self._connect_penalties: Dict[str, float] = {}
+        self._default_connect_penalty = 0.0
+        self._dirty = False
+        # (country_code or "", protocol or "both") -> (reachable entries, unreachable entries)
+        self._snapshot: Dict[Tuple[str, str], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = {}
+        self._by_hostname: Dict[str, Dict[str, Any]] = {}
+        self.generated_at = 0.0
+
+    def set_relays(self, relays: List[Dict[str, Any]]):
+        """Replace the probed relay set; samples of relays that are gone are dropped."""
+        from catalog import relay_protocol # Daemon side only; clients never need the catalog
+        with self._lock:
+            self._relays = {r["hostname"]: r for r in relays if r.get("hostname")}
+            self._protocols = {hostname: relay_protocol(r) for hostname, r in self._relays.items()}
+            for hostname in list(self._samples):
+                if hostname not in self._relays:
+                    del self._samples[hostname]
+                    self._last_probe.pop(hostname, None)
+            self._dirty = True
+
+    def set_connect_penalties(self, penalties: Dict[str, float], default: float = 0.0):
+        """Score penalty per relay for its time-to-connected (see history.connect_penalties)."""
+        with self._lock:
+            self._connect_penalties = penalties
+            self._default_connect_penalty = default
+            self._dirty = True
+
+    def relay(self, hostname: str) -> Optional[Dict[str, Any]]:
+        return self._relays.get(hostname)
+
+    def last_probe(self, hostname: str) -> float:
+        return self._last_probe.get(hostname, 0.0)
+
+    def add_sample(self, hostname: str, latency_ms: Optional[float], ts: Optional[float] = None):
+        with self._lock:
+            if hostname not in self._relays:
+                return
+            samples = self._samples.get(hostname)
+            if samples is None:
+                samples = self._samples[hostname] = deque(maxlen=self.window)
+            samples.append(latency_ms)
+            self._last_probe[hostname] = ts if ts is not None else time.time()
+            self._dirty = True
+
+    def _entry(self, hostname: str, samples: Deque[Optional[float]]) -> Dict[str, Any]:
+        relay = self._relays[hostname]
+        ok = sorted(s for s in samples if s is not None)
+        loss = 1.0 - len(ok) / len(samples)
+        median = _median(ok)
+        connect_penalty = self._connect_penalties.get(hostname, self._default_connect_penalty)
+        return {
+            "hostname": hostname,
+            "country": relay.get("country"),
+            "country_code": str(relay.get("country_code", "")).lower(),
+            "city": relay.get("city"),
+            "city_code": relay.get("city_code"),
+            "protocol": self._protocols[hostname],
+            "ipv4_addr_in": relay.get("ipv4_addr_in"),
+            "latency_ms": round(median, 2) if median is not None else None,
+            "best_ms": ok[0] if ok else None,
+            "loss": round(loss, 3),
+            "samples": len(samples),
+            "last_probe": self._last_probe.get(hostname),
+            "score": median + loss * LOSS_PENALTY_MS + connect_penalty if median is not None else _UNREACHABLE,
+        }
+
+    def rebuild(self) -> bool:
+        """Re-rank if new samples arrived. Returns True if a new snapshot was published."""
+        with self._rebuild_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                self._dirty = False
+                entries = [self._entry(hostname, samples) for hostname, samples in self._samples.items() if samples]
+            entries.sort(key=lambda e: (e["score"], e["hostname"]))
+
+            snapshot: Dict[Tuple[str, str], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = {}
+            for entry in entries:
+                bucket = 0 if entry["score"] != _UNREACHABLE else 1
+                for key in (("", "both"), ("", entry["protocol"]),
+                            (entry["country_code"], "both"), (entry["country_code"], entry["protocol"])):
+                    lists = snapshot.get(key)
+                    if lists is None:
+                        lists = snapshot[key] = ([], [])
+                    lists[bucket].append(entry)
+            self._by_hostname = {entry["hostname"]: entry for entry in entries}
+            self._snapshot = snapshot
+            self.generated_at = time.time()
+            return True
+
+    def best(self, n: int = DEFAULT_RESULT_COUNT, countries: Optional[List[str]] = None,
+             protocol: Optional[str] = None, city: Optional[str] = None,
+             include_unreachable: bool = False) -> List[Dict[str, Any]]:
+        """
+        Best ranked relays from the current snapshot.
+
+        Args:
+            n: Number of relays (0 for all).
+            countries: Country codes (None/empty for all countries).
+            protocol: 'wireguard', 'openvpn' or None/'both'.
+            city: City code or name.
+            include_unreachable: Append relays whose recent pings all failed.
+        """
+        snapshot = self._snapshot
+        protocol = (protocol or "both").lower()
+        keys = [(c.lower(), protocol) for c in countries] if countries else [("", protocol)]
+        lists = [snapshot[key] for key in keys if key in snapshot]
+        if not lists:
+            return []
+        if len(lists) == 1:
+            reachable, unreachable = lists[0]
+        else:
+            # Only the first n of each country can make the top n (unless the city filter drops some)
+            limit = n if n and not city else None
+            score = lambda e: (e["score"], e["hostname"])
+            reachable = list(merge(*(l[0][:limit] for l in lists), key=score))
+            unreachable = list(merge(*(l[1][:limit] for l in lists), key=score))
+        candidates = reachable + unreachable if include_unreachable else reachable
+
+        if city:
+            city = city.lower()
+            candidates = [e for e in candidates
+                          if str(e["city_code"]).lower() == city or str(e["city"]).lower() == city]
+        return candidates[:n] if n else list(candidates)
+
+    def get(self, hostname: str) -> Optional[Dict[str, Any]]:
+        return self._by_hostname.get(hostname)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        reachable, unreachable = snapshot.get(("", "both"), ([], []))
+        return {
+            "relays": len(self._relays),
+            "ranked": len(reachable),
+            "unreachable": len(unreachable),
+            "unprobed": len(self._relays) - len(reachable) - len(unreachable),
+            "generated_at": self.generated_at,
+        }
+
+
+# --- Probe Scheduler ---
+
+def _interleave_by_country(relays: List[Dict[str, Any]]) -> List[str]:
+    """Hostnames ordered round-robin across countries, so every country is ranked early in a sweep."""
+    by_country: Dict[str, List[str]] = {}
+    for relay in relays:
+        by_country.setdefault(str(relay.get("country_code", "")), []).append(relay["hostname"])
+    return [hostname for group in zip_longest(*by_country.values()) for hostname in group if hostname]
+
+class ProbeDaemon:
+    """
+    Continuous low-rate latency probing of the catalog.
+
+    A scheduler thread releases one probe every 1/rate seconds into a bounded
+    queue served by a few ping workers. Probes walk the catalog round-robin
+    (interleaved by country); every TOP_REFRESH_EVERY-th probe instead
+    re-checks the stalest relay of the current top list, so the head of the
+    ranking stays fresh between full sweeps.
+    """
+
+    def __init__(self, catalog: Any, history: Optional[Any] = None,
+                 rate_per_sec: float = DEFAULT_PROBE_RATE, workers: int = DEFAULT_PROBE_WORKERS,
+                 ping_count: int = DEFAULT_PING_COUNT, timeout_sec: int = DEFAULT_TIMEOUT_SEC,
+                 window: int = DEFAULT_WINDOW, catalog_loader: Optional[Callable[[], Any]] = None,
+                 reload_interval_sec: float = CATALOG_RELOAD_SEC):
+        if rate_per_sec <= 0:
+            raise DaemonError("Probe rate must be positive.")
+        self.history = history
+        self.rate_per_sec = rate_per_sec
+        self.workers = max(1, workers)
+        self.ping_count = ping_count
+        self.timeout_sec = timeout_sec
+        self.catalog_loader = catalog_loader
+        self.reload_interval_sec = reload_interval_sec
+        self.ranking = RollingRanking(window)
+        self.stop_event = Event()
+        self.started_at = time.time()
+        self.probes = 0
+        self.sweeps = 0
+        self._order: Deque[str] = deque()
+        self._sweep_position = 0
+        self._order_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._queue: "Queue[str]" = Queue(maxsize=self.workers)
+        self._threads: List[threading.Thread] = []
+        self._catalog_loaded_at = 0.0
+        self.set_catalog(catalog)
+
+    def set_catalog(self, catalog: Any):
+        """Probe the active relays (with an IPv4 address) of a RelayCatalog."""
+        relays = [r for r in catalog.relays
+                  if r.get("hostname") and r.get("ipv4_addr_in") and r.get("active", True) is not False]
+        self.ranking.set_relays(relays)
+        self._load_connect_penalties()
+        with self._order_lock:
+            self._order = deque(_interleave_by_country(relays))
+            self._sweep_position = 0
+        self._catalog_loaded_at = time.monotonic()
+        logger.info(f"Probe daemon catalog: {len(relays)} relays, full sweep every "
+                    f"{len(relays) / self.rate_per_sec / 60:.0f} min at {self.rate_per_sec:g} probes/s")
+
+    def _load_connect_penalties(self):
+        """Rank relays that are slow to connect to lower (connect times are recorded by the GUI)."""
+        if self.history is None:
+            return
+        try:
+            from history import connect_penalties
+            self.ranking.set_connect_penalties(*connect_penalties(self.history.connect_times()))
+        except Exception as e:
+            logger.warning(f"Could not load connect times from history: {e}")
+
+    # --- Lifecycle ---
+
+    def start(self):
+        self.stop_event.clear()
+        self._threads = [threading.Thread(target=self._scheduler_loop, daemon=True, name="ProbeScheduler")]
+        self._threads += [threading.Thread(target=self._worker_loop, daemon=True, name=f"ProbeWorker-{i}")
+                          for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    # --- Scheduling ---
+
+    def _next_hostname(self) -> Optional[str]:
+        if TOP_REFRESH_EVERY and self.probes % TOP_REFRESH_EVERY == TOP_REFRESH_EVERY - 1:
+            top = self.ranking.best(TOP_REFRESH_SIZE)
+            if top:
+                stalest = min(top, key=lambda e: e["last_probe"] or 0.0)
+                if time.time() - (stalest["last_probe"] or 0.0) >= TOP_REFRESH_MIN_AGE_SEC:
+                    return stalest["hostname"]
+        with self._order_lock:
+            if not self._order:
+                return None
+            hostname = self._order[0]
+            self._order.rotate(-1)
+            self._sweep_position += 1
+            if self._sweep_position >= len(self._order):
+                self._sweep_position = 0
+                self.sweeps += 1
+                logger.info("Probe sweep %d complete (%d probes so far)", self.sweeps, self.probes)
+        return hostname
+
+    def _maybe_reload_catalog(self):
+        if not self.catalog_loader or time.monotonic() - self._catalog_loaded_at < self.reload_interval_sec:
+            return
+        self._catalog_loaded_at = time.monotonic() # Also throttles retries after a failure
+        try:
+            catalog = self.catalog_loader()
+        except Exception as e:
+            logger.warning(f"Relay catalog reload failed: {e}")
+            return
+        if catalog is not None and len(catalog):
+            self.set_catalog(catalog)
+
+    def _scheduler_loop(self):
+        interval = 1.0 / self.rate_per_sec
+        next_at = time.monotonic()
+        while not self.stop_event.is_set():
+            self._maybe_reload_catalog()
+            hostname = self._next_hostname()
+            if hostname:
+                # Blocks while all workers are busy (e.g. a run of timeouts) instead of piling up probes
+                while not self.stop_event.is_set():
+                    try:
+                        self._queue.put(hostname, timeout=0.5)
+                        break
+                    except Full:
+                        continue
+            next_at = max(next_at + interval, time.monotonic() - interval)
+            self.stop_event.wait(max(0.0, next_at - time.monotonic()))
+
+    def _worker_loop(self):
+        from server_manager import get_server_latency
+        while not self.stop_event.is_set():
+            try:
+                hostname = self._queue.get(timeout=0.5)
+            except Empty:
+                continue
+            relay = self.ranking.relay(hostname)
+            if relay is None: # Dropped by a catalog reload
+                continue
+            try:
+                latency = get_server_latency(relay, self.ping_count, self.timeout_sec).get("latency")
+            except Exception as e:
+                logger.exception("Probe of %s failed: %s", hostname, e)
+                continue
+            self.ranking.add_sample(hostname, latency)
+            with self._count_lock:
+                self.probes += 1
+            if self.history is not None:
+                self.history.record_ping(relay, latency)
+            self.ranking.rebuild()
+
+    def status(self) -> Dict[str, Any]:
+        status = self.ranking.stats()
+        status.update({
+            "pid": os.getpid(),
+            "uptime_sec": round(time.time() - self.started_at, 1),
+            "probes": self.probes,
+            "sweeps": self.sweeps,
+            "rate_per_sec": self.rate_per_sec,
+            "workers": self.workers,
+            "window": self.ranking.window,
+        })
+        return status
+
+
+# --- Query API ---
+#
+# http.server (and with it http.client/email) is imported only by the daemon
+# process when it starts serving; DaemonClient speaks HTTP/1.0 over a plain
+# socket, so attaching from the GUI or CLI stays cheap to import.
+
+def _public(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in entry.items() if key != "score"}
+
+def _request_handler_class() -> type:
+    import http.server
+
+    class DaemonRequestHandler(http.server.BaseHTTPRequestHandler):
+        """
+        GET /best?n=5&country=se,de&protocol=wireguard&city=got&all=1
+        GET /relay/<hostname>
+        GET /status
+        """
+        server_version = "MullvadFinderDaemon/1"
+        protocol_version = "HTTP/1.1" # Keep-alive for HTTP/1.1 clients issuing several queries
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            probe_daemon: ProbeDaemon = self.server.probe_daemon
+            try:
+                if url.path == "/best":
+                    countries = [c for c in params.get("country", "").split(",") if c]
+                    relays = probe_daemon.ranking.best(
+                        int(params.get("n", DEFAULT_RESULT_COUNT)), countries, params.get("protocol"),
+                        params.get("city"), params.get("all", "0") not in ("", "0", "false"))
+                    self._send_json(200, {"generated_at": probe_daemon.ranking.generated_at,
+                                          "relays": [_public(e) for e in relays]})
+                elif url.path.startswith("/relay/"):
+                    entry = probe_daemon.ranking.get(unquote(url.path[len("/relay/"):]))
+                    if entry is None:
+                        self._send_json(404, {"error": "relay not ranked"})
+                    else:
+                        self._send_json(200, _public(entry))
+                elif url.path == "/status":
+                    self._send_json(200, probe_daemon.status())
+                else:
+                    self._send_json(404, {"error": f"unknown endpoint {url.path}"})
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+
+        def _send_json(self, status: int, payload: Any):
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self) -> str:
+            # Unix socket peers have no (host, port) address
+            return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "local"
+
+        def log_message(self, format: str, *args: Any):
+            logger.debug("%s - " + format, self.address_string(), *args)
+
+    return DaemonRequestHandler
+
+def _remove_stale_socket(socket_path: str):
+    """Remove a socket file left by a crashed daemon; refuse if one is still listening."""
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+    raise DaemonError(f"A daemon is already listening on {socket_path}")
+
+def start_server(probe_daemon: ProbeDaemon, socket_path: Optional[str] = None,
+                 port: Optional[int] = None) -> Any:
+    """
+    Serve the query API on a Unix socket (owner-only permissions) or, when
+    `port` is given or AF_UNIX is unavailable, on 127.0.0.1:port. The server
+    runs on a background thread; stop it with stop_server().
+    """
+    import http.server
+    import socketserver
+    handler = _request_handler_class()
+    if port is None and socket_path and hasattr(socket, "AF_UNIX"):
+        class UnixDaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        _remove_stale_socket(socket_path)
+        server = UnixDaemonServer(socket_path, handler)
+        os.chmod(socket_path, 0o600)
+        address = socket_path
+    else:
+        try:
+            server = http.server.ThreadingHTTPServer(("127.0.0.1", port or DEFAULT_DAEMON_PORT), handler)
+        except OSError as e:
+            raise DaemonError(f"Cannot listen on 127.0.0.1:{port or DEFAULT_DAEMON_PORT}: {e}")
+        address = f"http://127.0.0.1:{server.server_address[1]}"
+    server.probe_daemon = probe_daemon
+    threading.Thread(target=server.serve_forever, daemon=True, name="DaemonAPI").start()
+    logger.info(f"Probe daemon API listening on {address}")
+    return server
+
+def stop_server(server: Any):
+    server.shutdown()
+    server.server_close()
+    if hasattr(socket, "AF_UNIX") and server.address_family == socket.AF_UNIX:
+        try:
+            os.unlink(server.server_address)
+        except OSError:
+            pass
+
+
+# --- Client ---
+
+class DaemonClient:
+    """
+    Query a running probe daemon. Uses the Unix socket when AF_UNIX is
+    available (and no port is given), otherwise 127.0.0.1:port. Raises
+    DaemonError when the daemon is not running or a request fails.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, port: Optional[int] = None,
+                 timeout: float = CLIENT_TIMEOUT_SEC):
+        if socket_path is None and port is None:
+            from config import get_daemon_socket_path
+            socket_path = get_daemon_socket_path()
+        self.use_unix = port is None and bool(socket_path) and hasattr(socket, "AF_UNIX")
+        self.socket_path = socket_path
+        self.port = port or DEFAULT_DAEMON_PORT
+        self.timeout = timeout
+
+    def _connect(self) -> socket.socket:
+        if not self.use_unix:
+            return socket.create_connection(("127.0.0.1", self.port), timeout=self.timeout)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _get(self, path: str, **params: Any) -> Any:
+        query = urlencode({k: v for k, v in params.items() if v is not None and v != ""})
+        request = f"GET {path}{'?' + query if query else ''} HTTP/1.0\r\nHost: localhost\r\n\r\n"
+        try:
+            with self._connect() as sock:
+                sock.sendall(request.encode("ascii"))
+                chunks = []
+                while True: # HTTP/1.0: the daemon closes the connection after the response
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+            head, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+            status = int(head.split(b" ", 2)[1])
+            payload = json.loads(body.decode("utf-8"))
+        except (OSError, IndexError, ValueError) as e:
+            raise DaemonError(f"Probe daemon not reachable: {e}")
+        if status != 200:
+            raise DaemonError(payload.get("error") if isinstance(payload, dict) else f"HTTP {status}")
+        return payload
+
+    def is_running(self) -> bool:
+        try:
+            self.status()
+            return True
+        except DaemonError:
+            return False
+
+    def status(self) -> Dict[str, Any]:
+        return self._get("/status")
+
+    def best(self, n: int = DEFAULT_RESULT_COUNT, countries: Optional[List[str]] = None,
+             protocol: Optional[str] = None, city: Optional[str] = None,
+             include_unreachable: bool = False) -> List[Dict[str, Any]]:
+        """Best ranked relays (n=0 for all), best first."""
+        payload = self._get("/best", n=n, country=",".join(countries or []), protocol=protocol,
+                            city=city, all=1 if include_unreachable else None)
+        return payload["relays"]
+
+    def relay(self, hostname: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self._get(f"/relay/{quote(hostname)}")
+        except DaemonError as e:
+            if "not ranked" in str(e):
+                return None
+            raise
+
+    def latencies(self, max_age_sec: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Median latency (None if all recent pings failed) of every ranked relay probed within max_age_sec."""
+        cutoff = time.time() - max_age_sec if max_age_sec else 0.0
+        return {entry["hostname"]: entry["latency_ms"] for entry in self.best(0, include_unreachable=True)
+                if (entry.get("last_probe") or 0.0) >= cutoff}
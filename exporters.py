@@ -0,0 +1,240 @@
+import csv
+import gzip
+import json
+import os
+import statistics
+import tempfile
+import logging
+from itertools import chain
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple, TextIO
+
+from catalog import relay_protocol
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+# --- Export Pipeline ---
+#
+# Exports are generator pipelines: a source yields one record dict at a time
+# (result model rows, legacy server dicts or stored probes), optional stages
+# enrich them (distributions from the probe history) and a sink writes each
+# record as it arrives. Nothing builds the full export in memory, so history
+# exports of millions of probes run in constant memory.
+
+EXPORT_FORMATS = ("csv", "ndjson")
+GZIP_LEVEL = 6 # zlib default; level 9 is much slower for little gain on this data
+
+RESULT_FIELDS = [
+    "hostname", "country", "city", "protocol", "latency_ms", "download_mbps", "upload_mbps",
+    "country_code", "city_code", "ipv4_addr_in", "ipv6_addr_in", "active", "owned", "provider",
+]
+DISTRIBUTION_FIELDS = [
+    "latency_samples", "latency_timeouts", "latency_min", "latency_median", "latency_p90", "latency_max",
+    "latency_stdev", "download_samples", "download_median", "upload_samples", "upload_median",
+]
+# Column names of the original server_manager.export_to_csv, kept for its existing consumers
+LEGACY_RESULT_FIELDS = [
+    "hostname", "country", "city", "protocol", "latency", "download_speed", "upload_speed",
+    "country_code", "city_code", "ipv4_addr_in", "ipv6_addr_in", "active", "owned", "provider",
+]
+PROBE_FIELDS = ["ts", "hostname", "country_code", "city", "protocol", "kind",
+                "latency_ms", "download_mbps", "upload_mbps", "ok"]
+
+_RELAY_FIELDS = ("country_code", "city_code", "ipv4_addr_in", "ipv6_addr_in", "active", "owned", "provider")
+
+class ExportError(Exception):
+    """Custom exception for unsupported export formats or failed exports."""
+    pass
+
+def detect_format(path: str) -> Tuple[str, bool]:
+    """Return (format, gzip) from a file name such as results.csv or history.ndjson.gz."""
+    name = path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    if name.endswith(".csv"):
+        return "csv", compressed
+    if name.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson", compressed
+    raise ExportError(f"Cannot determine export format from file name: {os.path.basename(path)}")
+
+
+# --- Sources ---
+
+def _strip_flag(country_display: str) -> str:
+    parts = country_display.split(" ", 1)
+    return parts[-1] if len(parts) > 1 else country_display
+
+def model_records(rows: Iterable[Any], catalog: Optional[Any] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Records from result model rows (ServerRow.snapshot() copies, in display order),
+    enriched with relay details from the catalog when available.
+    """
+    for row in rows:
+        relay = catalog.get(row.hostname) if catalog is not None else None
+        record = {
+            "hostname": row.hostname,
+            "country": relay.get("country") if relay else _strip_flag(row.country),
+            "city": row.city,
+            "protocol": row.protocol,
+            "latency_ms": row.latency,
+            "download_mbps": row.download,
+            "upload_mbps": row.upload,
+        }
+        if relay:
+            for field in _RELAY_FIELDS:
+                record[field] = relay.get(field)
+        yield record
+
+def server_records(servers: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Records from server dicts carrying 'latency'/'download_speed'/'upload_speed' results."""
+    for server in servers:
+        protocol = server.get("protocol")
+        if not isinstance(protocol, str) or not protocol:
+            protocol = relay_protocol(server)
+        record = {
+            "hostname": server.get("hostname", ""),
+            "country": _strip_flag(str(server.get("country", ""))),
+            "city": server.get("city", ""),
+            "protocol": protocol,
+            "latency_ms": server.get("latency"),
+            "download_mbps": server.get("download_speed"),
+            "upload_mbps": server.get("upload_speed"),
+        }
+        for field in _RELAY_FIELDS:
+            record[field] = server.get(field)
+        yield record
+
+def legacy_server_records(servers: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Rows of the original server_manager.export_to_csv: the LEGACY_RESULT_FIELDS
+    values as stored in the server dicts (country with its flag, floats at full
+    precision) and a WireGuard/OpenVPN label where no protocol string is set.
+    """
+    for server in servers:
+        record = {field: server.get(field, "") for field in LEGACY_RESULT_FIELDS}
+        if not isinstance(server.get("protocol"), str):
+            record["protocol"] = "WireGuard" if relay_protocol(server) == "wireguard" else "OpenVPN"
+        # repr() strings, as csv.DictWriter wrote them; _csv_value would round to 2 decimals
+        yield {field: repr(value) if isinstance(value, float) else value for field, value in record.items()}
+
+def history_records(store: Any, days: Optional[float] = None, kind: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Every stored probe (optionally within the last `days` / of one kind), oldest first."""
+    for probe in store.iter_probes(days=days, kind=kind):
+        yield probe._asdict()
+
+
+# --- Stages ---
+
+def _percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def with_distributions(records: Iterable[Dict[str, Any]], store: Any, days: float = 7,
+                       hostnames: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Add the latency/speed distributions from the probe history to each record:
+    the raw samples plus min/median/p90/max/stdev summaries. Samples are loaded
+    once for the given hostnames (all relays if None) and the window of `days`.
+    """
+    samples = store.samples_by_relay(days, hostnames)
+    for record in records:
+        entry = samples.get(record.get("hostname"))
+        if entry:
+            latency = sorted(entry["latency"])
+            record["latency_samples"] = latency
+            record["latency_timeouts"] = entry["timeouts"]
+            record["latency_min"] = latency[0] if latency else None
+            record["latency_median"] = statistics.median(latency) if latency else None
+            record["latency_p90"] = _percentile(latency, 0.9)
+            record["latency_max"] = latency[-1] if latency else None
+            record["latency_stdev"] = statistics.pstdev(latency) if len(latency) > 1 else None
+            for column in ("download", "upload"):
+                values = entry[column]
+                record[f"{column}_samples"] = values
+                record[f"{column}_median"] = statistics.median(values) if values else None
+        yield record
+
+
+# --- Sinks ---
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(f"{v:.2f}" if isinstance(v, float) else str(v) for v in value)
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return value
+
+def write_csv(records: Iterable[Dict[str, Any]], stream: TextIO, fields: Optional[List[str]] = None) -> int:
+    """Write records as CSV (lists become space separated values). Returns the row count."""
+    records = iter(records)
+    if fields is None:
+        first = next(records, None)
+        if first is None:
+            return 0
+        fields = list(first)
+        records = chain([first], records)
+    writer = csv.writer(stream)
+    writer.writerow(fields)
+    count = 0
+    for record in records:
+        writer.writerow([_csv_value(record.get(field)) for field in fields])
+        count += 1
+    return count
+
+def write_ndjson(records: Iterable[Dict[str, Any]], stream: TextIO, fields: Optional[List[str]] = None) -> int:
+    """Write one JSON object per line. Returns the record count."""
+    count = 0
+    for record in records:
+        if fields is not None:
+            record = {field: record.get(field) for field in fields if field in record}
+        stream.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        stream.write("\n")
+        count += 1
+    return count
+
+_WRITERS = {"csv": write_csv, "ndjson": write_ndjson}
+
+def export_records(records: Iterable[Dict[str, Any]], path: str, fields: Optional[List[str]] = None,
+                   fmt: Optional[str] = None, compress: Optional[bool] = None) -> int:
+    """
+    Stream records to a CSV or NDJSON file, gzip compressed for *.gz names.
+    The file is written to a temporary name and renamed when complete.
+
+    Args:
+        records: Record dicts (any iterable, consumed once).
+        path: Destination; format and compression are taken from the extension unless given.
+        fields: Columns to write (CSV defaults to the first record's keys; NDJSON writes all keys).
+
+    Returns:
+        Number of records written.
+    """
+    if fmt is None or compress is None:
+        detected_fmt, detected_compress = detect_format(path)
+        fmt = fmt or detected_fmt
+        compress = detected_compress if compress is None else compress
+    writer = _WRITERS.get(fmt)
+    if writer is None:
+        raise ExportError(f"Unsupported export format: {fmt}")
+
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-export-", dir=directory)
+    try:
+        if compress:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", compresslevel=GZIP_LEVEL, encoding="utf-8", newline="") as stream:
+                count = writer(records, stream, fields)
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as stream:
+                count = writer(records, stream, fields)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    logger.info(f"Exported {count} records to {path} ({fmt}{', gzip' if compress else ''})")
+    return count
@@ -0,0 +1,327 @@
+import threading
+import time
+import logging
+from collections import deque
+from threading import Event
+from typing import Optional, List, Dict, Any, Deque, Callable, Iterable, NamedTuple
+
+from server_manager import ping_test
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+# --- Failover Policy ---
+
+class FailoverPolicy(NamedTuple):
+    """
+    When the connected relay counts as degraded and when to switch away.
+
+    A check is bad when latency, loss or jitter exceed their max_* limit and
+    good again only once all are below limit * recover_ratio; in between the
+    bad-check streak is kept (hysteresis). A failover needs bad_checks
+    consecutive bad checks, an alternative whose score beats the current
+    relay by min_improvement_ms, and cooldown_sec since the last decision
+    (a switch, a failed switch or no better alternative).
+    """
+    max_latency_ms: float = 150.0
+    max_loss: float = 0.2 # Fraction of lost pings in the window
+    max_jitter_ms: float = 40.0 # Mean difference between consecutive pings
+    recover_ratio: float = 0.8
+    bad_checks: int = 3
+    min_improvement_ms: float = 20.0
+    cooldown_sec: float = 300.0
+    interval_sec: float = 5.0 # One ping per relay per interval
+    window: int = 12 # Pings kept per relay (one minute at the default interval)
+    min_samples: int = 6 # Pings required before a relay is judged
+    shortlist_size: int = 3
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "FailoverPolicy":
+        defaults = cls()
+        return cls(
+            max_latency_ms=float(config.get("failover_max_latency_ms", defaults.max_latency_ms)),
+            max_loss=float(config.get("failover_max_loss", defaults.max_loss)),
+            max_jitter_ms=float(config.get("failover_max_jitter_ms", defaults.max_jitter_ms)),
+            cooldown_sec=float(config.get("failover_cooldown_sec", defaults.cooldown_sec)),
+        )
+
+LOSS_PENALTY_MS = 200.0 # Score = latency + jitter + loss * penalty
+
+class LinkQuality(NamedTuple):
+    """Summary of the ping window of one relay."""
+    latency_ms: Optional[float] # Median of the successful pings
+    loss: float
+    jitter_ms: Optional[float]
+    samples: int
+
+    @property
+    def score(self) -> float:
+        if self.latency_ms is None:
+            return float("inf")
+        return self.latency_ms + (self.jitter_ms or 0.0) + self.loss * LOSS_PENALTY_MS
+
+    def describe(self) -> str:
+        latency = f"{self.latency_ms:.1f} ms" if self.latency_ms is not None else "n/a"
+        jitter = f"{self.jitter_ms:.1f} ms" if self.jitter_ms is not None else "n/a"
+        return f"latency {latency}, loss {self.loss:.0%}, jitter {jitter} ({self.samples} pings)"
+
+class FailoverDecision(NamedTuple):
+    """Outcome of a failover attempt, for logging and the UI."""
+    ts: float
+    from_hostname: str
+    to_hostname: Optional[str] # None if no alternative was good enough
+    reason: str
+    current: LinkQuality
+    candidate: Optional[LinkQuality]
+    switched: bool
+
+
+def measure_quality(samples: Iterable[Optional[float]]) -> LinkQuality:
+    """Median latency, loss ratio and jitter (mean absolute difference of consecutive replies)."""
+    samples = list(samples)
+    ok = [s for s in samples if s is not None]
+    if not samples:
+        return LinkQuality(None, 0.0, None, 0)
+    ordered = sorted(ok)
+    median = None
+    if ordered:
+        mid = len(ordered) // 2
+        median = ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+    jitter = None
+    if len(ok) > 1:
+        jitter = sum(abs(b - a) for a, b in zip(ok, ok[1:])) / (len(ok) - 1)
+    return LinkQuality(median, 1.0 - len(ok) / len(samples), jitter, len(samples))
+
+def degradation_reasons(quality: LinkQuality, policy: FailoverPolicy, factor: float = 1.0) -> List[str]:
+    """Limits exceeded by `quality` (each limit scaled by factor)."""
+    reasons = []
+    if quality.latency_ms is None:
+        reasons.append("no replies")
+    elif quality.latency_ms > policy.max_latency_ms * factor:
+        reasons.append(f"latency {quality.latency_ms:.1f} > {policy.max_latency_ms * factor:.0f} ms")
+    if quality.loss > policy.max_loss * factor:
+        reasons.append(f"loss {quality.loss:.0%} > {policy.max_loss * factor:.0%}")
+    if quality.jitter_ms is not None and quality.jitter_ms > policy.max_jitter_ms * factor:
+        reasons.append(f"jitter {quality.jitter_ms:.1f} > {policy.max_jitter_ms * factor:.0f} ms")
+    return reasons
+
+
+def switch_relay(relay: Dict[str, Any], previous: Optional[Dict[str, Any]] = None):
+    """
+    Move the tunnel to `relay` (a location change with the relay's tunnel
+    protocol, plus `mullvad connect` if the tunnel went down) and wait for it
+    to come up. If it does not, the location of `previous` is restored (so a
+    failed switch does not leave the tunnel blocked) and MullvadCLIError is
+    raised.
+    """
+    from mullvad_api import MullvadCLIError, get_mullvad_status
+    from connection import connect_relay, is_tunnel_up
+    from catalog import relay_protocol
+    try:
+        result = connect_relay(relay.get("hostname"), relay.get("country_code"), relay.get("city_code"),
+                               relay_protocol(relay), tunnel_up=is_tunnel_up(get_mullvad_status()))
+        error = None if result.connected else \
+            f"not connected after {result.elapsed_ms / 1000:.0f}s ({result.status or 'no status'})"
+    except MullvadCLIError as e:
+        error = str(e)
+    if error is None:
+        return
+    if previous is not None and previous.get("hostname"):
+        logger.warning(f"Switch to {relay.get('hostname')} failed ({error}); restoring {previous['hostname']}")
+        try:
+            restored = connect_relay(previous["hostname"], previous.get("country_code"), previous.get("city_code"),
+                                     relay_protocol(previous), tunnel_up=is_tunnel_up(get_mullvad_status()))
+            if not restored.connected:
+                logger.error(f"Could not restore {previous['hostname']}: {restored.status or 'no status'}")
+        except MullvadCLIError as e:
+            logger.error(f"Could not restore {previous['hostname']}: {e}")
+    raise MullvadCLIError(error)
+
+
+# --- Failover Monitor ---
+
+class FailoverMonitor:
+    """
+    Watches the connected relay on a background thread and fails over to the
+    best alternative when it degrades.
+
+    Every policy.interval_sec the connected relay and a shortlist of
+    alternatives (from `shortlist`, re-queried each check) are pinged once;
+    each relay keeps the last policy.window results. Every failover decision
+    is logged with the measurements of both relays and passed to on_decision.
+
+    Note that while the tunnel is up, pings to the alternatives travel
+    through it. Their latency is therefore compared after subtracting the
+    connected relay's median latency, which approximates a direct measurement.
+    """
+
+    def __init__(self, relay: Dict[str, Any], shortlist: Callable[[Dict[str, Any], int], List[Dict[str, Any]]],
+                 policy: Optional[FailoverPolicy] = None,
+                 switch: Callable[[Dict[str, Any], Dict[str, Any]], Any] = switch_relay,
+                 on_decision: Optional[Callable[[FailoverDecision], None]] = None,
+                 ping: Optional[Callable[[Dict[str, Any]], Optional[float]]] = None):
+        self.policy = policy or FailoverPolicy()
+        self.shortlist = shortlist
+        self.switch = switch
+        self.on_decision = on_decision
+        self.ping = ping or self._ping_once
+        self.decisions: Deque[FailoverDecision] = deque(maxlen=50)
+        self._lock = threading.Lock()
+        self._stop_event = Event()
+        self._thread: Optional[threading.Thread] = None
+        self._windows: Dict[str, Deque[Optional[float]]] = {}
+        self._alternatives: List[Dict[str, Any]] = []
+        self._bad_streak = 0
+        self._last_switch = 0.0
+        self.set_current(relay)
+
+    @staticmethod
+    def _ping_once(relay: Dict[str, Any]) -> Optional[float]:
+        ip_address = relay.get("ipv4_addr_in")
+        return ping_test(ip_address, count=1, timeout_sec=2) if ip_address else None
+
+    @property
+    def current(self) -> Dict[str, Any]:
+        return self._current
+
+    def set_current(self, relay: Dict[str, Any], switched: bool = True):
+        """Monitor a newly connected relay (also starts the cooldown)."""
+        with self._lock:
+            self._current = relay
+            self._windows = {}
+            self._bad_streak = 0
+            if switched:
+                self._last_switch = time.monotonic()
+        logger.info(f"Failover monitor watching {relay.get('hostname')}")
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="FailoverMonitor")
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.policy.interval_sec + 5)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_event.wait(self.policy.interval_sec):
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception(f"Failover check failed: {e}")
+
+    # --- Checks ---
+
+    def _record(self, relay: Dict[str, Any], latency: Optional[float]):
+        window = self._windows.get(relay["hostname"])
+        if window is None:
+            window = self._windows[relay["hostname"]] = deque(maxlen=self.policy.window)
+        window.append(latency)
+
+    def quality(self, hostname: str) -> LinkQuality:
+        return measure_quality(self._windows.get(hostname, ()))
+
+    def check(self) -> Optional[FailoverDecision]:
+        """Ping once, update the windows and fail over if needed. Returns the decision, if any."""
+        policy = self.policy
+        current = self._current
+        hostname = current.get("hostname")
+        alternatives = [r for r in self.shortlist(current, policy.shortlist_size)
+                        if r.get("hostname") and r.get("hostname") != hostname][:policy.shortlist_size]
+
+        current_latency = self.ping(current)
+        alternative_latencies = [(relay, self.ping(relay)) for relay in alternatives]
+        with self._lock:
+            if current is not self._current: # Switched meanwhile (e.g. a manual connect)
+                return None
+            self._record(current, current_latency)
+            tunnel_ms = self.quality(hostname).latency_ms or 0.0 # Median, so one slow reply does not skew the alternatives
+            for relay, latency in alternative_latencies:
+                self._record(relay, max(0.0, latency - tunnel_ms) if latency is not None else None)
+            keep = {hostname} | {r["hostname"] for r in alternatives}
+            self._windows = {h: w for h, w in self._windows.items() if h in keep}
+            self._alternatives = alternatives
+
+            quality = self.quality(hostname)
+            if quality.samples < policy.min_samples:
+                return None
+            reasons = degradation_reasons(quality, policy)
+            if reasons:
+                self._bad_streak += 1
+                logger.debug("Connected relay %s degraded (%s), streak %d", hostname, ", ".join(reasons), self._bad_streak)
+            elif not degradation_reasons(quality, policy, policy.recover_ratio):
+                self._bad_streak = 0
+            if self._bad_streak < policy.bad_checks:
+                return None
+            cooldown_left = policy.cooldown_sec - (time.monotonic() - self._last_switch)
+            if cooldown_left > 0:
+                logger.debug("Failover for %s held back by cooldown (%.0fs left)", hostname, cooldown_left)
+                return None
+
+            reason = ", ".join(reasons) or "degraded"
+            candidates = [(self.quality(r["hostname"]), r) for r in alternatives]
+            candidates = [(q, r) for q, r in candidates
+                          if q.samples >= policy.min_samples and not degradation_reasons(q, policy)]
+            best = min(candidates, key=lambda c: c[0].score, default=None)
+
+        if best is None or best[0].score > quality.score - policy.min_improvement_ms:
+            decision = FailoverDecision(time.time(), hostname, best[1]["hostname"] if best else None, reason,
+                                        quality, best[0] if best else None, switched=False)
+            logger.warning(f"Failover: {hostname} degraded ({reason}; {quality.describe()}) but no alternative is "
+                           f"better by {policy.min_improvement_ms:.0f} ms"
+                           + (f" (best {decision.to_hostname}: {best[0].describe()})" if best else ""))
+            with self._lock:
+                self._bad_streak = 0 # Re-evaluate after another full streak
+                self._last_switch = time.monotonic() # ... and a cooldown, so a lasting degradation is not re-reported every streak
+            self._publish(decision)
+            return decision
+
+        candidate_quality, target = best
+        logger.warning(f"Failover: switching {hostname} -> {target['hostname']}. Current: {reason}; "
+                       f"{quality.describe()}. Candidate: {candidate_quality.describe()} (tunnel-adjusted).")
+        try:
+            self.switch(target, current) # Restores `current` if the target does not come up
+        except Exception as e:
+            logger.error(f"Failover to {target['hostname']} failed: {e}")
+            with self._lock:
+                self._bad_streak = 0
+                self._last_switch = time.monotonic() # Back off for a cooldown before trying again
+            decision = FailoverDecision(time.time(), hostname, target["hostname"], f"{reason}; switch failed: {e}",
+                                        quality, candidate_quality, switched=False)
+            self._publish(decision)
+            return decision
+
+        decision = FailoverDecision(time.time(), hostname, target["hostname"], reason,
+                                    quality, candidate_quality, switched=True)
+        self.set_current(target)
+        self._publish(decision)
+        return decision
+
+    def _publish(self, decision: FailoverDecision):
+        self.decisions.append(decision)
+        if self.on_decision:
+            try:
+                self.on_decision(decision)
+            except Exception as e:
+                logger.error(f"Error in failover decision callback: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        """Current relay, its quality, the shortlist and the bad-check streak."""
+        with self._lock:
+            hostname = self._current.get("hostname")
+            return {
+                "hostname": hostname,
+                "quality": self.quality(hostname),
+                "alternatives": {r["hostname"]: self.quality(r["hostname"]) for r in self._alternatives},
+                "bad_streak": self._bad_streak,
+            }
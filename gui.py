@@ -1,17 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import threading
 import time
 import platform
 import os
-import csv
-import json
-import pickle
-import itertools
+import heapq
 import logging
 from threading import Event
-from typing import Optional, List, Dict, Any, Set, Tuple
-import subprocess
+from typing import Optional, List, Dict, Any, Set, Tuple, Callable, TYPE_CHECKING
 
 # --- SV-TTK Import ---
 try:
@@ -29,17 +24,21 @@ logger = logging.getLogger(__name__)
 
 # Import API and Server Manager functions
 try:
-    from mullvad_api import (load_cached_servers, set_mullvad_location,
-                             set_mullvad_protocol, connect_mullvad,
-                             disconnect_mullvad, get_mullvad_status, MullvadCLIError)
-    from server_manager import (get_all_servers, get_servers_by_country,
-                               test_servers, filter_servers_by_protocol,
-                               export_to_csv, calculate_latency_color,
-                               calculate_speed_color, run_socket_ping_pong_test)
+    from mullvad_api import (load_relay_data, disconnect_mullvad, get_mullvad_status,
+                             MullvadCLIError, MullvadStatusListener)
+    from server_manager import (test_servers, LATENCY_PALETTE, SPEED_PALETTE,
+                               run_socket_ping_pong_test)
+    from catalog import RelayCatalog, RelayQueryError, FilterResultCache, relay_protocol
+    from virtual_grid import VirtualGrid
+    from ui_bus import UIUpdateBus, UIUpdateBatch
+    from result_model import ResultModel
+    # results_io, history, exporters, daemon, failover and connection are imported where first used
+    # (see benchmarks/import_budget.py)
+    from task_pool import TaskPool, PRIORITY_HIGH, PRIORITY_NORMAL
     # --- MODIFIED IMPORT ---
     from config import (load_config, save_config, add_favorite_server,
                        remove_favorite_server, get_cache_path, get_log_path, # Added get_log_path
-                       get_default_cache_path) # Added get_default_cache_path
+                       get_default_cache_path, get_relay_list_cache_path, get_history_db_path)
     # --- END MODIFIED IMPORT ---
 except ImportError as e:
     logger.exception("Failed to import necessary modules. Ensure all files are present.")
@@ -49,10 +48,18 @@ except ImportError as e:
     messagebox.showerror("Import Error", f"Failed to import modules: {e}\nPlease ensure all script files are in the same directory.")
     exit() # Exit if core components are missing
 
+if TYPE_CHECKING:
+    from history import HistoryStore
+    from failover import FailoverMonitor, FailoverDecision
+
 
 # --- Constants ---
 CHECKBOX_UNCHECKED = "☐"
 CHECKBOX_CHECKED = "☑"
+RESULTS_LOAD_CHUNK_ROWS = 2000 # Rows inserted per UI tick when loading a results file
+EXPORT_DISTRIBUTION_DAYS = 7 # History window for the result distributions in exports
+EXPORT_FILETYPES = [("CSV Files", "*.csv"), ("CSV Files (gzip)", "*.csv.gz"),
+                    ("NDJSON Files", "*.ndjson"), ("NDJSON Files (gzip)", "*.ndjson.gz"), ("All Files", "*.*")]
 
 # --- Helper Functions ---
 def get_flag_emoji(country_code: str) -> str:
@@ -149,8 +156,9 @@ class LoadingAnimation:
 # --- Main Application Class ---
 
 class MullvadFinderApp:
-    def __init__(self, root: tk.Tk):
+    def __init__(self, root: tk.Tk, started_at: Optional[float] = None):
         self.root = root
+        self.started_at = started_at if started_at is not None else time.perf_counter() # For startup timings
         self.root.title("Mullvad Server Finder")
         self.root.geometry("950x650") # Slightly larger default size
 
@@ -164,9 +172,14 @@ class MullvadFinderApp:
 
         # --- State Variables ---
         self.server_data: Optional[Dict[str, Any]] = None
+        self.server_data_loading = False
+        self.catalog: Optional[RelayCatalog] = None
+        self.filter_cache = FilterResultCache(maxsize=16) # (country, protocol, query) -> (servers, rows)
         self.countries: List[Dict[str, str]] = []
         self.current_country_var = tk.StringVar()
         self.protocol_var = tk.StringVar(value=self.config.get("last_protocol", "wireguard"))
+        self.query_var = tk.StringVar(value=self.config.get("last_query", ""))
+        self.search_var = tk.StringVar() # Type-ahead search over hostname/city/country
         self.status_var = tk.StringVar(value="Initializing...")
         self.test_type_var = tk.StringVar(value=self.config.get("test_type", "ping"))
         self.current_operation = tk.StringVar(value="Ready")
@@ -175,15 +188,17 @@ class MullvadFinderApp:
         self.sort_column = self.config.get("default_sort_column", "latency")
         self.sort_order = self.config.get("default_sort_order", "ascending")
         self.selected_server_items: Set[str] = set() # Stores item IDs of checked servers
+        self.result_model = ResultModel() # Typed rows + cached sort keys, mirrors the grid
         self.theme_var = tk.StringVar(value=self.config.get("theme_mode", "system")) # Initialize theme_var here
 
         # --- Thread Control ---
         self.stop_event = Event()
         self.pause_event = Event()
+        self.task_pool = TaskPool() # All background work runs here (see task_pool.DEFAULT_LANES)
 
         # --- UI Elements (placeholders, created in create_ui) ---
         # Initialize all UI widget variables to None first
-        self.server_tree: Optional[ttk.Treeview] = None
+        self.server_tree: Optional[VirtualGrid] = None
         self.test_button: Optional[ttk.Button] = None
         self.connect_button: Optional[ttk.Button] = None
         self.country_combo: Optional[ttk.Combobox] = None
@@ -197,8 +212,19 @@ class MullvadFinderApp:
 
         # --- Other ---
         self.loading_animation = LoadingAnimation(self.current_operation, "Ready")
-        self.created_cell_tags: Set[str] = set() # Track dynamic tags for cell colors
-        self.status_update_after_id: Optional[str] = None
+        self.status_listener: Optional[MullvadStatusListener] = None
+        self.first_status_received = False
+        self.results_load_task = None # Task streaming a results file into the list
+        self.history: Optional["HistoryStore"] = None # Probe history, opened in the background
+        self.failover_monitor: Optional["FailoverMonitor"] = None # Watches the connected relay (Connection > Automatic Failover)
+        self.failover_candidates: List[str] = [] # Best tested relays when the connection was requested
+        self.connected_hostname: Optional[str] = None
+        self.last_status = "" # Latest status text, readable from worker threads
+        # Ranking penalty in ms per relay from its median time-to-connected (probe history)
+        self.connect_penalties: Dict[str, float] = {}
+        self.default_connect_penalty = 0.0
+        self.auto_failover_var = tk.BooleanVar(value=self.config.get("auto_failover", False))
+        self.ui_bus = UIUpdateBus() # Worker threads post here; drained on the Tk thread
 
         # --- Build UI First ---
         self.create_menu()
@@ -206,14 +232,74 @@ class MullvadFinderApp:
 
         # --- Apply Theme *After* UI is Built ---
         self.apply_theme() # <-- Moved the call here
+        self.ui_bus.start(self.root, self._apply_ui_updates)
 
         # --- Post-UI Setup ---
-        self.load_server_data() # Initial data load
-        self.update_status()    # Start status polling
+        # Slow work (CLI check, relay data, status) is started by start_background_tasks()
+        # once the window is visible, so construction only builds widgets.
+        self.status_var.set("Checking status...")
         self._update_run_test_button_text() # Set initial button text
 
+        self._log_startup_stage("UI constructed")
         logger.info("MullvadFinderApp initialization complete.")
 
+    # --- Staged Startup ---
+
+    def _log_startup_stage(self, stage: str):
+        """Log the time since application start for a startup milestone."""
+        logger.info(f"Startup: {stage} after {(time.perf_counter() - self.started_at) * 1000:.0f} ms")
+
+    def start_background_tasks(self, dependency_check: Optional[Callable[[], bool]] = None):
+        """
+        Run the startup work in parallel on background threads: the Mullvad CLI
+        check, relay data/catalog load and the first status fetch. Each result
+        is streamed into the UI through the update bus as it completes.
+        """
+        self.load_server_data()
+        self.start_status_listener() # First fetch and the status stream run on the listener thread
+        self.task_pool.submit("Open probe history", self._open_history, lane="data")
+        if dependency_check:
+            self.task_pool.submit("Mullvad CLI check", self._run_dependency_check, dependency_check, lane="data")
+
+    def _run_dependency_check(self, dependency_check: Callable[[], bool]):
+        """Background CLI check; shows the fatal error dialog and exits if the CLI is missing."""
+        ok = dependency_check()
+        self._log_startup_stage(f"Mullvad CLI check {'passed' if ok else 'failed'}")
+        if not ok:
+            self.ui_bus.post_call(self._on_dependency_check_failed)
+
+    def _open_history(self):
+        """Open (and prune) the probe history database off the Tk thread."""
+        try:
+            from history import HistoryStore
+            history = HistoryStore(get_history_db_path())
+            retention_days = self.config.get("history_retention_days", 90)
+            if retention_days:
+                history.prune(retention_days)
+            self.history = history
+            self._load_connect_penalties()
+        except Exception as e:
+            logger.error(f"Could not open probe history database: {e}")
+
+    def _load_connect_penalties(self):
+        """Refresh the time-to-connected ranking penalties from the history (worker thread)."""
+        from history import connect_penalties
+        self.connect_penalties, self.default_connect_penalty = connect_penalties(self.history.connect_times())
+
+    def _recording_history(self) -> bool:
+        return self.history is not None and self.config.get("record_history", True)
+
+    def _on_dependency_check_failed(self):
+        logger.critical("Mullvad CLI dependency check failed. Application cannot continue.")
+        messagebox.showerror(
+            "Dependency Error",
+            "Mullvad CLI ('mullvad') not found or not working.\n\n"
+            "Please ensure the Mullvad VPN client is installed correctly "
+            "and the 'mullvad' command is accessible in your system's PATH.",
+            parent=self.root
+        )
+        self.root.quit()
+
     # --- UI Creation Helpers ---
 
     def _setup_icon(self):
@@ -261,7 +347,8 @@ class MullvadFinderApp:
         # File Menu
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="Reload Server Data", command=self.load_server_data, accelerator="Ctrl+R")
-        file_menu.add_command(label="Export to CSV...", command=self.export_to_csv, accelerator="Ctrl+E")
+        file_menu.add_command(label="Export Results...", command=self.export_results, accelerator="Ctrl+E")
+        file_menu.add_command(label="Export Probe History...", command=self.export_history)
         file_menu.add_separator()
         file_menu.add_command(label="Save Test Results...", command=self.save_test_results, accelerator="Ctrl+S")
         file_menu.add_command(label="Load Test Results...", command=self.load_test_results, accelerator="Ctrl+L")
@@ -273,7 +360,7 @@ class MullvadFinderApp:
         menubar.add_cascade(label="File", menu=file_menu)
         # Bind accelerators
         self.root.bind_all("<Control-r>", lambda e: self.load_server_data())
-        self.root.bind_all("<Control-e>", lambda e: self.export_to_csv())
+        self.root.bind_all("<Control-e>", lambda e: self.export_results())
         self.root.bind_all("<Control-s>", lambda e: self.save_test_results())
         self.root.bind_all("<Control-l>", lambda e: self.load_test_results())
 
@@ -283,6 +370,9 @@ class MullvadFinderApp:
         connection_menu.add_command(label="Connect to Selected", command=self.connect_selected, accelerator="Ctrl+C")
         connection_menu.add_command(label="Connect to Fastest", command=self.connect_to_fastest)
         connection_menu.add_separator()
+        connection_menu.add_checkbutton(label="Automatic Failover", variable=self.auto_failover_var,
+                                        command=self._on_auto_failover_toggled)
+        connection_menu.add_separator()
         connection_menu.add_command(label="Disconnect", command=self.disconnect, accelerator="Ctrl+D")
         menubar.add_cascade(label="Connection", menu=connection_menu)
         self.root.bind_all("<Control-c>", lambda e: self.connect_selected())
@@ -320,10 +410,14 @@ class MullvadFinderApp:
         view_menu.add_cascade(label="Theme", menu=theme_menu)
         # Sort Submenu (removed commands, handled by clicking headers)
         view_menu.add_command(label="Sort by...", command=lambda: messagebox.showinfo("Sort", "Click column headers to sort."))
+        view_menu.add_separator()
+        view_menu.add_command(label="Probe History...", command=self.show_history_window)
         menubar.add_cascade(label="View", menu=view_menu)
 
         # Help Menu
         help_menu = tk.Menu(menubar, tearoff=0)
+        help_menu.add_command(label="Background Tasks...", command=self.show_task_window)
+        help_menu.add_separator()
         help_menu.add_command(label="About", command=self.show_about)
         menubar.add_cascade(label="Help", menu=help_menu)
 
@@ -346,6 +440,19 @@ class MullvadFinderApp:
         protocol_combo.pack(side=tk.LEFT, padx=(0, 10))
         protocol_combo.bind("<<ComboboxSelected>>", self.on_protocol_selected)
 
+        # Relay query filter (e.g. "owned country:de,se -provider:M247")
+        ttk.Label(top_frame, text="Filter:").pack(side=tk.LEFT, padx=(0, 5))
+        query_entry = ttk.Entry(top_frame, textvariable=self.query_var, width=22)
+        query_entry.pack(side=tk.LEFT, padx=(0, 10))
+        query_entry.bind("<Return>", self.on_query_submitted)
+
+        # Type-ahead search (filters the current list on every keystroke)
+        ttk.Label(top_frame, text="Search:").pack(side=tk.LEFT, padx=(0, 5))
+        search_entry = ttk.Entry(top_frame, textvariable=self.search_var, width=16)
+        search_entry.pack(side=tk.LEFT, padx=(0, 10))
+        search_entry.bind("<Escape>", lambda e: self.search_var.set(""))
+        self.search_var.trace_add("write", lambda *args: self.on_search_changed())
+
         # Test type selection
         ttk.Label(top_frame, text="Test Type:").pack(side=tk.LEFT, padx=(0, 5))
         test_type_combo = ttk.Combobox(top_frame, textvariable=self.test_type_var,
@@ -371,13 +478,14 @@ class MullvadFinderApp:
         self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
     def _create_middle_frame(self, parent: ttk.Frame):
-        """Creates the middle frame with the server list Treeview."""
+        """Creates the middle frame with the virtualized server list grid."""
         middle_frame = ttk.Frame(parent)
         middle_frame.pack(fill=tk.BOTH, expand=True, pady=5)
 
         # Define columns including the new checkbox column
         columns = ("selected", "hostname", "city", "country", "protocol", "latency", "download", "upload")
-        self.server_tree = ttk.Treeview(middle_frame, columns=columns, show="headings")
+        # Only the visible rows are rendered, so large lists stay responsive
+        self.server_tree = VirtualGrid(middle_frame, columns=columns)
 
         # Define headings with sort commands
         self.server_tree.heading("selected", text=CHECKBOX_UNCHECKED, anchor=tk.CENTER,
@@ -417,6 +525,7 @@ class MullvadFinderApp:
         # Configure tags for row colors (will be applied/overridden by theme)
         self.server_tree.tag_configure('odd_row', background=self.theme_colors.get("row_odd", "#F8F8F8"))
         self.server_tree.tag_configure('even_row', background=self.theme_colors.get("row_even", "#FFFFFF"))
+        self._configure_color_tags() # Fixed palette tags for latency/speed cells
 
         # Bind click event for checkbox toggling
         self.server_tree.bind("<Button-1>", self._on_tree_click)
@@ -478,6 +587,7 @@ class MullvadFinderApp:
          current_value = self.server_tree.set(item_id, "#1")
          new_value = CHECKBOX_CHECKED if current_value == CHECKBOX_UNCHECKED else CHECKBOX_UNCHECKED
          self.server_tree.set(item_id, "#1", new_value)
+         self.result_model.set_selected(item_id, new_value == CHECKBOX_CHECKED)
 
          # Update the selection set
          if new_value == CHECKBOX_CHECKED:
@@ -504,6 +614,7 @@ class MullvadFinderApp:
 
         for item_id in all_items:
             self.server_tree.set(item_id, "#1", target_state)
+            self.result_model.set_selected(item_id, target_state == CHECKBOX_CHECKED)
             if target_state == CHECKBOX_CHECKED:
                 self.selected_server_items.add(item_id)
 
@@ -545,6 +656,47 @@ class MullvadFinderApp:
         save_config(self.config)
         self.load_servers_by_country() # Reload servers with the new protocol filter
 
+    def on_query_submitted(self, event=None):
+        """Handle a new relay query typed into the filter bar."""
+        query = self.query_var.get().strip()
+        logger.info(f"Relay query submitted: '{query}'")
+        self.config["last_query"] = query
+        self.load_servers_by_country()
+
+
+    def on_search_changed(self):
+        """Re-filter the displayed rows for the current search text."""
+        if not self.server_tree: return
+        started = time.perf_counter()
+        self._apply_search_filter()
+        self._push_display_order()
+        if logger.isEnabledFor(logging.DEBUG): # Runs per keystroke; skip building the message otherwise
+            logger.debug("Search '%s' shows %d rows (%.1f ms)", self.search_var.get(),
+                         len(self.server_tree.get_children()), (time.perf_counter() - started) * 1000)
+
+    def _apply_search_filter(self):
+        """Restrict the result model to rows matching the search box (catalog prefix/trigram index)."""
+        text = self.search_var.get()
+        if not text.strip() or not self.catalog:
+            self.result_model.set_visible(None)
+            return
+        hostnames = self.catalog.search_index.search_hostnames(text) or set()
+        by_hostname = self.result_model.by_hostname
+        self.result_model.set_visible({by_hostname[h] for h in hostnames if h in by_hostname})
+
+    def _push_display_order(self):
+        """Send the model's visible order to the grid if it differs from what is shown."""
+        if not self.server_tree: return
+        order = self.result_model.visible_order()
+        if self.server_tree.get_children() != tuple(order):
+            self.server_tree.reorder(order)
+
+    def _clear_server_list(self):
+        """Remove all rows, including rows currently hidden by the search filter."""
+        if not self.server_tree: return
+        self.server_tree.delete(*set(self.server_tree.get_children()) | set(self.result_model.order))
+        self.result_model.clear()
+
     def on_test_type_selected(self, event=None):
         """Handle test type selection change."""
         test_type = self.test_type_var.get()
@@ -557,22 +709,49 @@ class MullvadFinderApp:
     # --- Data Loading and Display ---
 
     def load_server_data(self):
-        """Load Mullvad server data from cache and populate countries."""
+        """Load Mullvad server data on a background thread; the UI is populated when it arrives."""
+        if self.server_data_loading:
+            logger.info("Server data is already loading, ignoring reload request.")
+            return
+        self.server_data_loading = True
         self.loading_animation.update_text("Loading server data...")
         self.loading_animation.start(self.root)
-        self.root.update_idletasks() # Ensure UI updates
 
+        cache_path = get_cache_path(self.config)
+        logger.info(f"Using cache path: {cache_path}")
+        self.task_pool.submit("Load relay data", self._load_server_data_worker, cache_path,
+                              lane="data", priority=PRIORITY_HIGH)
+
+    def _load_server_data_worker(self, cache_path: str):
+        """Parse relay data and build the catalog off the Tk thread."""
+        try:
+            # Falls back to `mullvad relay list` when relays.json is missing
+            data = load_relay_data(cache_path, get_relay_list_cache_path())
+            catalog = RelayCatalog(data) if data else None
+            self.ui_bus.post_call(lambda: self._apply_server_data(cache_path, data, catalog))
+        except Exception as e:
+            logger.exception("An error occurred while loading server data in the background.")
+            self.ui_bus.post_call(lambda err=e: self._apply_server_data(cache_path, None, None, err))
+
+    def _apply_server_data(self, cache_path: str, data: Optional[Dict[str, Any]],
+                           catalog: Optional[RelayCatalog], error: Optional[Exception] = None):
+        """Populate countries and the server list from freshly loaded data (Tk thread)."""
+        self.server_data_loading = False
         try:
-            cache_path = get_cache_path(self.config)
-            logger.info(f"Using cache path: {cache_path}")
-            self.server_data = load_cached_servers(cache_path)
+            if error is not None:
+                raise error
+            self.server_data = data
 
             if not self.server_data:
-                messagebox.showerror("Error", f"Failed to load server data from {cache_path}.\nCheck path in Settings or logs for details.", parent=self.root)
+                messagebox.showerror("Error", f"Failed to load server data from {cache_path} or the Mullvad CLI.\nCheck path in Settings or logs for details.", parent=self.root)
                 self.loading_animation.update_text("Error loading data")
                 self.loading_animation.stop() # Stop animation on error
                 return
 
+            # Indexed relay catalog used for all filtering (built by the worker)
+            self.catalog = catalog
+            self.filter_cache.clear() # Cached rows refer to the previous catalog
+
             # Extract and sort countries
             self.countries = [
                 {"code": country.get("code", ""), "name": country.get("name", "Unknown")}
@@ -608,6 +787,7 @@ class MullvadFinderApp:
             # Load servers for the initially selected country
             self.load_servers_by_country()
             self.loading_animation.update_text("Server data loaded")
+            self._log_startup_stage("server list populated")
 
         except Exception as e:
             logger.exception("An error occurred during server data loading.")
@@ -620,7 +800,7 @@ class MullvadFinderApp:
 
     def load_servers_by_country(self):
         """Load servers for the selected country/protocol into the Treeview."""
-        if not self.server_data or not self.server_tree:
+        if not self.server_data or not self.catalog or not self.server_tree:
             logger.warning("load_servers_by_country called before data or UI ready.")
             return
 
@@ -630,7 +810,7 @@ class MullvadFinderApp:
         self.root.update_idletasks()
 
         # Clear current treeview items and selection
-        self.server_tree.delete(*self.server_tree.get_children())
+        self._clear_server_list()
         self.selected_server_items.clear()
         self.server_tree.heading("selected", text=CHECKBOX_UNCHECKED) # Reset header checkbox
 
@@ -647,68 +827,40 @@ class MullvadFinderApp:
             protocol_filter = None # Pass None to server manager
 
         servers: List[Dict[str, Any]] = []
+        rows: List[Tuple[str, ...]] = []
+        country_code: Optional[str] = None
         if country_name == "All Countries":
-            servers = get_all_servers(self.server_data, protocol_filter)
             self.config["last_country"] = "" # Clear last country if 'All' is selected
         else:
             # Find country code based on name without flag
             country_code = next((c["code"] for c in self.countries if c["name"] == country_name), None)
             if country_code:
                 self.config["last_country"] = country_code
-                servers = get_servers_by_country(self.server_data, country_code, protocol_filter)
             else:
                 logger.error(f"Could not find country code for selected name: {country_name}")
 
+        cache_key = FilterResultCache.make_key(country_code, protocol_filter, self.query_var.get())
+        cached = self.filter_cache.get(cache_key)
+        if cached is not None:
+            servers, rows = cached
+            logger.debug(f"Filter cache hit for {cache_key}.")
+        elif country_name == "All Countries" or country_code:
+            try:
+                # Inactive relays are dropped by the catalog unless the query asks for them
+                servers = self.catalog.select(country_code, protocol_filter, self.query_var.get())
+                rows = [self._build_server_row(server) for server in servers]
+                self.filter_cache.put(cache_key, (servers, rows))
+            except RelayQueryError as e:
+                logger.warning(f"Invalid relay query '{self.query_var.get()}': {e}")
+                messagebox.showerror("Invalid Filter", f"Could not apply filter:\n{e}", parent=self.root)
+
         save_config(self.config) # Save potential last_country change
 
-        # Populate treeview
-        use_alt_colors = self.config.get("alternating_row_colors", True)
-        for i, server in enumerate(servers):
-            hostname = server.get("hostname", "N/A")
-            city = server.get("city", "N/A")
-            country_name_only = server.get("country", "N/A")
-            # Get country code directly from server data if available (might need adjustment in server_manager)
-            country_code = server.get("country_code", "")
-            # If not directly available, look it up (less efficient)
-            if not country_code:
-                 country_code = next((c["code"] for c in self.countries if c["name"] == country_name_only), "")
-
-            country_display = f"{get_flag_emoji(country_code)} {country_name_only}" if country_code else country_name_only
-
-            # --- CORRECTED PROTOCOL DISPLAY LOGIC ---
-            endpoint_data = server.get("endpoint_data")
-            if isinstance(endpoint_data, dict) and "wireguard" in endpoint_data:
-                protocol_str = "WireGuard"
-            elif isinstance(endpoint_data, str) and endpoint_data == "openvpn":
-                protocol_str = "OpenVPN"
-            elif isinstance(endpoint_data, str) and endpoint_data == "bridge":
-                 protocol_str = "Bridge" # Display Bridge type too
-            else:
-                 # Fallback based on hostname if endpoint_data is weird/missing
-                 hn_lower = hostname.lower()
-                 protocol_str = "WireGuard" if (hn_lower.endswith("-wg") or ".wg." in hn_lower) else "OpenVPN"
-                 logger.warning(f"Using hostname fallback for protocol display for {hostname}. endpoint_data: {endpoint_data}")
-            # --- END CORRECTION ---
-
-            # Assign alternating row tag if enabled
-            tags = []
-            if use_alt_colors:
-                 tags.append('odd_row' if i % 2 else 'even_row')
-
-            # Insert item with checkbox unchecked initially
-            # Make sure the indices match the column order:
-            # ("selected", "hostname", "city", "country", "protocol", "latency", "download", "upload")
-            # Index 0: Checkbox
-            # Index 1: Hostname
-            # Index 2: City
-            # Index 3: Country (with flag)
-            # Index 4: Protocol
-            # Index 5: Latency
-            # Index 6: Download
-            # Index 7: Upload
-            self.server_tree.insert("", tk.END, values=(
-                CHECKBOX_UNCHECKED, hostname, city, country_display, protocol_str, "", "", ""
-            ), tags=tags)
+        # Populate the grid model from the pre-built row tuples (stripes are drawn by position)
+        self.server_tree.set_striped(self.config.get("alternating_row_colors", True))
+        for row in rows:
+            self.result_model.add(self.server_tree.insert("", tk.END, values=row), row)
+        self._apply_search_filter() # Keep the search box applied across country/protocol changes
 
         logger.info(f"Displayed {len(servers)} servers in the list.")
 
@@ -719,6 +871,36 @@ class MullvadFinderApp:
         self.loading_animation.update_text(f"{len(servers)} servers loaded")
         self.root.after(500, self.loading_animation.stop)
 
+    def _build_server_row(self, server: Dict[str, Any]) -> Tuple[str, ...]:
+        """Build the Treeview values tuple for a server (results columns empty)."""
+        hostname = server.get("hostname", "N/A")
+        city = server.get("city", "N/A")
+        country_name_only = server.get("country", "N/A")
+        # Get country code directly from server data if available
+        country_code = server.get("country_code", "")
+        # If not directly available, look it up (less efficient)
+        if not country_code:
+             country_code = next((c["code"] for c in self.countries if c["name"] == country_name_only), "")
+
+        country_display = f"{get_flag_emoji(country_code)} {country_name_only}" if country_code else country_name_only
+
+        endpoint_data = server.get("endpoint_data")
+        if isinstance(endpoint_data, dict) and "wireguard" in endpoint_data:
+            protocol_str = "WireGuard"
+        elif isinstance(endpoint_data, str) and endpoint_data == "openvpn":
+            protocol_str = "OpenVPN"
+        elif isinstance(endpoint_data, str) and endpoint_data == "bridge":
+             protocol_str = "Bridge" # Display Bridge type too
+        else:
+             # Fallback based on hostname if endpoint_data is weird/missing
+             hn_lower = hostname.lower()
+             protocol_str = "WireGuard" if (hn_lower.endswith("-wg") or ".wg." in hn_lower) else "OpenVPN"
+             logger.warning(f"Using hostname fallback for protocol display for {hostname}. endpoint_data: {endpoint_data}")
+
+        # Column order:
+        # ("selected", "hostname", "city", "country", "protocol", "latency", "download", "upload")
+        return (CHECKBOX_UNCHECKED, hostname, city, country_display, protocol_str, "", "", "")
+
     def sort_treeview(self, column: str, force_order: Optional[str] = None):
         """Sort the treeview by the specified column."""
         if not self.server_tree: return
@@ -737,49 +919,11 @@ class MullvadFinderApp:
         # No need to save config on every sort, maybe save on exit? For now, keep it simple.
         # save_config(self.config)
 
-        items = [(self.server_tree.set(item_id, column), item_id) for item_id in self.server_tree.get_children('')]
-
-        # Define conversion logic for different columns
-        def get_sort_key(value_str: str) -> Any:
-            if column in ['latency', 'download', 'upload']:
-                if not value_str or value_str == "Timeout":
-                    return float('inf') # Place timeouts/empty values last
-                try:
-                    return float(value_str)
-                except ValueError:
-                    return float('inf') # Treat non-numeric as infinite
-            elif column == 'selected':
-                 return 0 if value_str == CHECKBOX_CHECKED else 1 # Checked items first
-            else: # String columns (strip flag for country sort)
-                if column == 'country' and len(value_str.split(" ", 1)) > 1:
-                     value_str = value_str.split(" ", 1)[-1]
-                return str(value_str).lower() # Case-insensitive string sort
-
-        # Sort items using the key function
-        try:
-             items.sort(key=lambda x: get_sort_key(x[0]), reverse=(self.sort_order == "descending"))
-        except Exception as e:
-             logger.exception(f"Error during sorting prep for column {column}: {e}")
-             return # Abort sort if conversion fails
-
-        # Rearrange items in the treeview
-        use_alt_colors = self.config.get("alternating_row_colors", True)
-        for index, (_, item_id) in enumerate(items):
-            self.server_tree.move(item_id, '', index)
+        # Sort the Python-side model using its cached keys (no cell reads or string parsing)
+        self.result_model.sort(column, descending=(self.sort_order == "descending"))
 
-            # Update row tags for alternating colors if enabled
-            if use_alt_colors:
-                try:
-                    current_tags = list(self.server_tree.item(item_id, "tags"))
-                    # Keep only non-row-color tags (and potentially cell tags)
-                    filtered_tags = [tag for tag in current_tags if not tag.startswith(('odd_row', 'even_row'))]
-                    # Add back the correct row color tag
-                    row_tag = 'odd_row' if index % 2 else 'even_row'
-                    filtered_tags.append(row_tag)
-                    self.server_tree.item(item_id, tags=tuple(filtered_tags)) # Use tuple for tags
-                except tk.TclError:
-                    logger.warning(f"TCL error updating tags for item {item_id} during sort (item might be gone).")
-                    continue # Skip to next item
+        # Only touch the grid if the (search filtered) display order actually changed
+        self._push_display_order()
 
         logger.debug(f"Treeview sorted by {self.sort_column} {self.sort_order}.")
 
@@ -798,7 +942,8 @@ class MullvadFinderApp:
 
         # Determine which servers to test
         if not self.server_tree: return
-        target_item_ids = list(self.selected_server_items)
+        # Checked rows hidden by the search box are not tested
+        target_item_ids = [item_id for item_id in self.selected_server_items if self.result_model.is_visible(item_id)]
         if not target_item_ids: # If nothing selected, test all visible
              target_item_ids = list(self.server_tree.get_children(''))
              logger.info("No servers selected via checkbox, testing all visible servers.")
@@ -815,6 +960,9 @@ class MullvadFinderApp:
         for item_id in target_item_ids:
             server_details = self._get_server_details_from_item_id(item_id)
             if server_details:
+                 if server_details.get("active", True) is False:
+                     logger.info(f"Skipping inactive server {server_details.get('hostname')}.")
+                     continue
                  server_details["treeview_item"] = item_id # Store item ID for UI updates
                  servers_to_test.append(server_details)
             else:
@@ -846,13 +994,23 @@ class MullvadFinderApp:
         self.loading_animation.update_text(operation_text)
         self.loading_animation.start(self.root)
 
+        # Order the list by the metric being measured; results are then inserted
+        # at their sorted position as they arrive, keeping the best relays on top
+        if effective_test_type in ["ping", "both"]:
+            self.sort_treeview("latency", force_order="ascending")
+        elif effective_test_type == "speed":
+            self.sort_treeview("download", force_order="descending")
+
         # Launch the appropriate test thread
         if effective_test_type in ["ping", "both"]:
             self.ping_in_progress = True
-            threading.Thread(target=self.run_ping_test, args=(servers_to_test, effective_test_type), daemon=True).start()
+            self.task_pool.submit(f"{effective_test_type.capitalize()} test ({len(servers_to_test)} servers)",
+                                  self.run_ping_test, servers_to_test, effective_test_type,
+                                  lane="test", cancel_event=self.stop_event)
         elif effective_test_type == "speed":
             self.speed_in_progress = True
-            threading.Thread(target=self.run_speed_test, args=(servers_to_test,), daemon=True).start()
+            self.task_pool.submit(f"Speed test ({len(servers_to_test)} servers)", self.run_speed_test, servers_to_test,
+                                  lane="test", cancel_event=self.stop_event)
         else:
              logger.error(f"Invalid test type requested: {effective_test_type}")
              self._test_cleanup() # Cleanup UI state
@@ -906,59 +1064,76 @@ class MullvadFinderApp:
         if self.stop_button: self.stop_button.configure(state=tk.NORMAL)
 
 
+    def _apply_ui_updates(self, batch: UIUpdateBatch):
+        """Apply one coalesced batch of worker updates (runs on the Tk thread)."""
+        if batch.rows and self.server_tree:
+            order_changed = False
+            for item_id, updates in batch.rows.items():
+                try:
+                    if not self.server_tree.exists(item_id): continue # Item may be gone after a reload
+                    if "latency" in updates:
+                        latency = updates["latency"]
+                        self.server_tree.set(item_id, "latency", f"{latency:.1f}" if latency is not None else "Timeout")
+                        order_changed |= self.result_model.set_result(item_id, "latency", latency)
+                        self.apply_cell_color(item_id, "latency", latency)
+                    for column_key in ("download", "upload"):
+                        if column_key in updates:
+                            speed = updates[column_key]
+                            self.server_tree.set(item_id, column_key, f"{speed:.1f}" if speed is not None else "")
+                            order_changed |= self.result_model.set_result(item_id, column_key, speed)
+                            self.apply_cell_color(item_id, column_key, speed)
+                except tk.TclError:
+                    logger.warning(f"TCL error updating item {item_id} (item might be gone).")
+                except Exception as e:
+                    logger.exception(f"Error applying result update for item {item_id}: {e}")
+            if order_changed:
+                # Rows were bisected into place by the model; push the order once per batch
+                self._push_display_order()
+
+        if batch.progress is not None:
+            self.progress_var.set(batch.progress)
+        if batch.status is not None:
+            self.loading_animation.update_text(batch.status)
+
+        for callback, delay_ms in batch.calls:
+            if delay_ms > 0:
+                self.root.after(delay_ms, callback)
+                continue
+            try:
+                callback()
+            except Exception as e:
+                logger.exception(f"Error running queued UI callback: {e}")
+
+
+    def _configure_color_tags(self):
+        """Create the fixed set of cell color tags (one per palette step) once."""
+        if not self.server_tree: return
+        for palette in (LATENCY_PALETTE, SPEED_PALETTE):
+            for tag, color, text_color in zip(palette.tags, palette.colors, palette.text_colors):
+                self.server_tree.tag_configure(tag, background=color, foreground=text_color)
+        logger.debug(f"Configured {LATENCY_PALETTE.steps + SPEED_PALETTE.steps} cell color tags.")
+
     def apply_cell_color(self, item_id: str, column_key: str, value: Any):
-        """Apply Excel-style background color to a specific cell."""
+        """Apply Excel-style background color to a specific cell (palette table lookup)."""
         if not self.server_tree: return
         if value is None or value == "" or value == "Timeout" or value == float('inf'):
             # Optionally remove existing color tag for this cell?
             return
 
-        color = "#FFFFFF" # Default white
         try:
             numeric_value = float(value)
             if column_key == "latency":
-                 if self.config.get("color_latency", True):
-                     color = calculate_latency_color(numeric_value)
-                 else: return # Coloring disabled
+                 if not self.config.get("color_latency", True): return # Coloring disabled
+                 cell_tag = LATENCY_PALETTE.tag_for(numeric_value)
             elif column_key in ["download", "upload"]:
-                 if self.config.get("color_speed", True):
-                     # Adjust max speed for color calculation if needed, e.g., based on results
-                     color = calculate_speed_color(numeric_value, max_expected_speed=200.0)
-                 else: return # Coloring disabled
+                 if not self.config.get("color_speed", True): return # Coloring disabled
+                 cell_tag = SPEED_PALETTE.tag_for(numeric_value)
             else:
                 return # Not a colorable column
 
-            # Skip if color is default or gray (no need for tag)
-            if color.upper() in ["#FFFFFF", "#AAAAAA"]:
-                 # TODO: Remove existing tag if needed
-                 return
-
-            # Create or reuse tag
-            cell_tag = f"cell_{column_key}_{color.replace('#', '')}"
-            if cell_tag not in self.created_cell_tags:
-                # Use foreground color that contrasts with background
-                # Simple check: dark background -> white text, light background -> black text
-                r, g, b = int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
-                text_color = "#FFFFFF" if (r*0.299 + g*0.587 + b*0.114) < 140 else "#000000"
-                self.server_tree.tag_configure(cell_tag, background=color, foreground=text_color)
-                self.created_cell_tags.add(cell_tag)
-
-            # Apply tag (thread-safe via root.after)
-            def _apply_tag():
-                try:
-                    if not self.server_tree or not self.server_tree.exists(item_id): return # Check if item still exists
-                    current_tags = list(self.server_tree.item(item_id, "tags"))
-                    # Remove previous color tag for this specific column
-                    prefix = f"cell_{column_key}_"
-                    filtered_tags = [tag for tag in current_tags if not tag.startswith(prefix)]
-                    filtered_tags.append(cell_tag)
-                    self.server_tree.item(item_id, tags=tuple(filtered_tags))
-                except tk.TclError:
-                     logger.warning(f"TCL error applying tag {cell_tag} to item {item_id} (item might be gone).")
-                except Exception as e:
-                    logger.exception(f"Error applying cell tag {cell_tag} to {item_id}: {e}")
-
-            self.root.after(0, _apply_tag)
+            # The grid colors just this cell; callers already run on the Tk thread
+            if self.server_tree.exists(item_id):
+                self.server_tree.set_cell_tag(item_id, column_key, cell_tag)
 
         except (ValueError, TypeError) as e:
             logger.debug(f"Cannot apply color: Value '{value}' for column '{column_key}' is not numeric. Error: {e}")
@@ -971,40 +1146,35 @@ class MullvadFinderApp:
         logger.info(f"Ping test thread started for {len(servers)} servers.")
         start_time = time.time()
         try:
+            # Relays a running probe daemon measured recently are taken from its ranking
+            daemon_latencies = self._latencies_from_daemon(servers)
+            if daemon_latencies:
+                for server in servers:
+                    if server.get("hostname") in daemon_latencies:
+                        self.ui_bus.post_row(server["treeview_item"], latency=daemon_latencies[server["hostname"]])
+                logger.info(f"Took {len(daemon_latencies)} of {len(servers)} latencies from the probe daemon.")
+                servers_to_ping = [s for s in servers if s.get("hostname") not in daemon_latencies]
+            else:
+                servers_to_ping = servers
+            done_fraction = 1 - len(servers_to_ping) / len(servers)
+            self.ui_bus.post_progress(done_fraction * 100)
+
             def update_progress(percentage: float):
-                 # Schedule UI update on the main thread
-                 self.root.after(0, lambda p=percentage: self.progress_var.set(p))
-                 # self.root.after(0, lambda p=percentage: self.loading_animation.update_text(
-                 #    f"Pinging servers... {int(p)}%")) # Can be too verbose
+                 # Coalesced by the UI bus: only the latest percentage is applied per tick
+                 self.ui_bus.post_progress(done_fraction * 100 + percentage * (1 - done_fraction))
 
             def update_result(result: Dict[str, Any]):
                 server = result.get("server")
-                latency = result.get("latency")
                 if not server: return
                 item_id = server.get("treeview_item")
                 if not item_id: return
-
-                latency_str = f"{latency:.1f}" if latency is not None else "Timeout"
-
-                # Schedule UI update on the main thread
-                def _update_ui():
-                    try:
-                        if not self.server_tree or not self.server_tree.exists(item_id): return # Check if item still exists
-                        # Get current values, careful if item deleted
-                        values = list(self.server_tree.item(item_id, "values"))
-                        values[5] = latency_str # Latency is index 5 now
-                        self.server_tree.item(item_id, values=tuple(values))
-                        self.apply_cell_color(item_id, "latency", latency)
-                    except tk.TclError:
-                         logger.warning(f"TCL error updating item {item_id} (item might be gone).")
-                    except Exception as e:
-                        logger.exception(f"Error updating UI for ping result of item {item_id}: {e}")
-
-                self.root.after(0, _update_ui)
+                self.ui_bus.post_row(item_id, latency=result.get("latency"))
+                if self._recording_history():
+                    self.history.record_ping(server, result.get("latency"))
 
             # Run the tests
             results = test_servers(
-                servers,
+                servers_to_ping,
                 progress_callback=update_progress,
                 result_callback=update_result,
                 max_workers=self.config.get("max_workers", 10),
@@ -1019,7 +1189,8 @@ class MullvadFinderApp:
 
             # If test was not stopped and it's "both", start speed test
             if not self.stop_event.is_set() and test_type == "both":
-                 self.root.after(0, lambda: self.loading_animation.update_text("Ping complete. Starting speed test..."))
+                 self.ui_bus.post_status("Ping complete. Starting speed test...")
+                 self.ui_bus.post_call(lambda: self.sort_treeview("download", force_order="descending"))
                  # Directly call speed test (it will run in this same thread sequentially)
                  # This might block UI updates if speed tests are long. Consider a new thread.
                  # For now, keep it simple:
@@ -1030,51 +1201,54 @@ class MullvadFinderApp:
 
             # --- Ping test only or stopped ---
             if not self.stop_event.is_set():
-                self.root.after(0, lambda: self.sort_treeview("latency"))
-                self.root.after(0, self._highlight_fastest_server) # Select best result
+                self.ui_bus.post_call(self._highlight_fastest_server) # Select best result
                 final_text = f"Ping test completed in {elapsed:.1f}s"
                 if self.config.get("auto_connect_fastest", False):
-                    self.root.after(100, self.connect_to_fastest) # Connect after slight delay
+                    self.ui_bus.post_call(self.connect_to_fastest, delay_ms=100) # Connect after slight delay
             else:
                  final_text = "Ping test stopped"
 
-            self.root.after(0, lambda t=final_text: self.loading_animation.update_text(t))
-            self.root.after(1000, self._test_cleanup) # Delay cleanup slightly
+            self.ui_bus.post_status(final_text)
+            self.ui_bus.post_call(self._test_cleanup, delay_ms=1000) # Delay cleanup slightly
 
 
         except Exception as e:
             logger.exception("Error occurred within ping test thread.")
-            self.root.after(0, lambda: messagebox.showerror("Ping Test Error", f"An error occurred: {e}", parent=self.root))
-            self.root.after(0, lambda: self.loading_animation.update_text("Ping test failed"))
-            self.root.after(500, self._test_cleanup) # Ensure cleanup happens on error
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Ping Test Error", f"An error occurred: {err}", parent=self.root))
+            self.ui_bus.post_status("Ping test failed")
+            self.ui_bus.post_call(self._test_cleanup, delay_ms=500) # Ensure cleanup happens on error
         finally:
             # Final check: if only ping was running, ensure cleanup happens
              if not self.speed_in_progress: # Only cleanup if speed test isn't taking over
-                 self.root.after(0, self._test_cleanup)
+                 self.ui_bus.post_call(self._test_cleanup)
+
+
+    def _latencies_from_daemon(self, servers: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+        """Recent daemon results for the given servers (empty if disabled or no daemon is running)."""
+        if not self.config.get("use_daemon", True):
+            return {}
+        from daemon import DaemonClient, DaemonError
+        try:
+            latencies = DaemonClient(timeout=1.0).latencies(self.config.get("daemon_max_age_sec", 900))
+        except DaemonError as e:
+            logger.debug("Probe daemon not used: %s", e)
+            return {}
+        return {s["hostname"]: latencies[s["hostname"]] for s in servers if s.get("hostname") in latencies}
 
 
     def _highlight_fastest_server(self):
         """Finds and selects the server with the lowest latency in the Treeview."""
         if not self.server_tree: return
-        fastest_item_id: Optional[str] = None
-        lowest_latency = float('inf')
-
-        for item_id in self.server_tree.get_children(''):
-            try:
-                if not self.server_tree.exists(item_id): continue # Check if item still exists
-                latency_str = self.server_tree.set(item_id, "latency")
-                if latency_str and latency_str != "Timeout":
-                    latency = float(latency_str)
-                    if latency < lowest_latency:
-                        lowest_latency = latency
-                        fastest_item_id = item_id
-            except (ValueError, tk.TclError):
-                continue # Ignore conversion errors or missing items
+        if self.connect_penalties:
+            best_row = self._best_ranked_row()
+        else:
+            best_row = self.result_model.best("latency") # Uses the model's cached latency keys
+        fastest_item_id: Optional[str] = best_row.item_id if best_row else None
 
         if fastest_item_id:
             try:
                 if self.server_tree.exists(fastest_item_id): # Check again before using
-                    logger.info(f"Highlighting fastest server: {self.server_tree.set(fastest_item_id, 'hostname')} ({lowest_latency:.1f} ms)")
+                    logger.info(f"Highlighting fastest server: {best_row.hostname} ({best_row.latency:.1f} ms)")
                     self.server_tree.selection_set(fastest_item_id)
                     self.server_tree.focus(fastest_item_id)
                     self.server_tree.see(fastest_item_id)
@@ -1084,6 +1258,15 @@ class MullvadFinderApp:
              logger.info("Could not find a fastest server with valid latency to highlight.")
 
 
+    def _ranking_score(self, row) -> float:
+        """Latency plus the penalty for the relay's median time-to-connected."""
+        return row.latency + self.connect_penalties.get(row.hostname, self.default_connect_penalty)
+
+    def _best_ranked_row(self):
+        rows = self.result_model.rows
+        candidates = rows.values() if self.result_model.visible is None else (rows[i] for i in self.result_model.visible)
+        return min((row for row in candidates if row.latency is not None), key=self._ranking_score, default=None)
+
     def run_speed_test(self, servers: List[Dict[str, Any]]):
         """Run Socket Ping-Pong speed tests in background thread."""
         logger.info(f"Socket Ping-Pong test thread started for {len(servers)} servers.")
@@ -1098,8 +1281,8 @@ class MullvadFinderApp:
         # ---
 
         try:
-            self.root.after(0, lambda: self.progress_var.set(0))
-            self.root.after(0, lambda: self.loading_animation.update_text(f"Starting socket speed test ({test_duration}s) for {total} servers..."))
+            self.ui_bus.post_progress(0)
+            self.ui_bus.post_status(f"Starting socket speed test ({test_duration}s) for {total} servers...")
 
             for i, server in enumerate(servers):
                 # Pause Check
@@ -1116,12 +1299,12 @@ class MullvadFinderApp:
                 if not item_id or not self.server_tree or not self.server_tree.exists(item_id):
                     logger.warning(f"Skipping speed test for {hostname} - item not found in tree.")
                     completed += 1 # Count as completed for progress bar
-                    self.root.after(0, lambda c=completed, t=total: self.progress_var.set(c / t * 100))
+                    self.ui_bus.post_progress(completed / total * 100)
                     continue
 
                 # Update status before starting test for this server
                 status_text = f"Sock Speed Test: {hostname} ({i+1}/{total})..."
-                self.root.after(0, lambda txt=status_text: self.loading_animation.update_text(txt))
+                self.ui_bus.post_status(status_text)
 
                 # --- CORRECTED CALL TO THE PING-PONG TEST FUNCTION ---
                 # Pass the fetched test_duration to the 'duration' argument
@@ -1138,49 +1321,34 @@ class MullvadFinderApp:
                 # Check stop event again immediately after blocking call
                 if self.stop_event.is_set(): break
 
-                # Schedule UI update for this result
-                def _update_ui(it=item_id, dl=download_mbps, ul=upload_mbps):
-                    try:
-                        if not self.server_tree or not self.server_tree.exists(it): return # Check if item still exists
-                        values = list(self.server_tree.item(it, "values"))
-                        values[6] = f"{dl:.1f}" if dl is not None else "" # Download is index 6
-                        values[7] = f"{ul:.1f}" if ul is not None else "" # Upload is index 7
-                        self.server_tree.item(it, values=tuple(values))
-
-                        # Apply coloring
-                        self.apply_cell_color(it, "download", dl)
-                        self.apply_cell_color(it, "upload", ul)
-                    except tk.TclError:
-                        logger.warning(f"TCL error updating speed for item {it} (item might be gone).")
-                    except Exception as e:
-                         logger.exception(f"Error updating UI for speed result of item {it}: {e}")
-
-                self.root.after(0, _update_ui)
+                # Queue the result; the UI bus applies it with the next batch
+                self.ui_bus.post_row(item_id, download=download_mbps, upload=upload_mbps)
+                if self._recording_history():
+                    self.history.record_speed(server, download_mbps, upload_mbps)
 
                 # Update overall progress
                 completed += 1
-                self.root.after(0, lambda c=completed, t=total: self.progress_var.set(c / t * 100))
+                self.ui_bus.post_progress(completed / total * 100)
 
             # --- Speed Test Loop Finished ---
             elapsed = time.time() - start_time
             logger.info(f"Speed test thread finished in {elapsed:.2f}s. Stop signaled: {self.stop_event.is_set()}")
 
             if not self.stop_event.is_set():
-                 self.root.after(0, lambda: self.sort_treeview("download")) # Sort by download speed
-                 self.root.after(0, lambda: self.loading_animation.update_text(f"Speed test completed in {elapsed:.1f}s"))
+                 self.ui_bus.post_status(f"Speed test completed in {elapsed:.1f}s")
             else:
-                 self.root.after(0, lambda: self.loading_animation.update_text("Speed test stopped"))
+                 self.ui_bus.post_status("Speed test stopped")
 
-            self.root.after(1000, self._test_cleanup) # Delay cleanup
+            self.ui_bus.post_call(self._test_cleanup, delay_ms=1000) # Delay cleanup
 
         except Exception as e:
             logger.exception("Error occurred within speed test thread.")
-            self.root.after(0, lambda: messagebox.showerror("Speed Test Error", f"An error occurred: {e}", parent=self.root))
-            self.root.after(0, lambda: self.loading_animation.update_text("Speed test failed"))
-            self.root.after(500, self._test_cleanup)
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Speed Test Error", f"An error occurred: {err}", parent=self.root))
+            self.ui_bus.post_status("Speed test failed")
+            self.ui_bus.post_call(self._test_cleanup, delay_ms=500)
         finally:
              # Final cleanup check
-             self.root.after(0, self._test_cleanup)
+             self.ui_bus.post_call(self._test_cleanup)
 
 
     # --- Connection Logic ---
@@ -1198,6 +1366,13 @@ class MullvadFinderApp:
              # Strip flag for lookup
              country_name_only = country_display.split(" ", 1)[-1] if len(country_display.split(" ", 1)) > 1 else country_display
 
+             # Fast path: hostname index of the relay catalog
+             relay = self.catalog.get(hostname) if self.catalog else None
+             if relay:
+                 server_copy = relay.copy()
+                 server_copy["treeview_item"] = item_id
+                 return server_copy
+
              # Search through server_data (can be slow for 'All Countries')
              for country_obj in self.server_data.get("countries", []):
                   if country_obj.get("name") == country_name_only: # Use name without flag
@@ -1253,13 +1428,18 @@ class MullvadFinderApp:
         protocol = "wireguard" if protocol_str == "WireGuard" else "openvpn"
 
         logger.info(f"Attempting connection to: {hostname} ({country_code}/{city_code}) using {protocol}")
-        # Run connection in a separate thread
-        threading.Thread(
-            target=self._connect_to_server,
-            args=(protocol, country_code, city_code, hostname),
-            daemon=True
-        ).start()
+        # Connections are serialized on their own lane
+        self._submit_connect(protocol, country_code, city_code, hostname)
+
 
+    def _submit_connect(self, protocol: str, country_code: str, city_code: str, hostname: str):
+        requested_at = time.monotonic() # Time-to-connected includes waiting for the connection lane
+        # Failover alternatives: snapshot of the best tested relays, taken here on the Tk thread
+        tested = [row for row in self.result_model.rows.values() if row.latency is not None]
+        self.failover_candidates = [row.hostname for row in heapq.nsmallest(10, tested, key=self._ranking_score)]
+        self.task_pool.submit(f"Connect to {hostname}", self._connect_to_server,
+                              protocol, country_code, city_code, hostname, requested_at,
+                              lane="connection", priority=PRIORITY_NORMAL)
 
     def connect_to_fastest(self):
         """Connect to the server with the lowest latency result."""
@@ -1277,199 +1457,262 @@ class MullvadFinderApp:
         self.connect_selected()
 
 
-    def _connect_to_server(self, protocol: str, country_code: str, city_code: str, hostname: str):
+    def _connect_to_server(self, protocol: str, country_code: str, city_code: str, hostname: str,
+                           requested_at: Optional[float] = None):
         """Internal method to handle connection process in a thread."""
-        self.root.after(0, lambda: self.loading_animation.update_text(f"Setting up connection to {hostname}..."))
-        self.root.after(0, lambda: self.loading_animation.start(self.root))
-        self.root.after(0, lambda: self.connect_button.configure(state=tk.DISABLED) if self.connect_button else None) # Disable while connecting
+        self.ui_bus.post_status(f"Setting up connection to {hostname}...")
+        self.ui_bus.post_call(lambda: self.loading_animation.start(self.root))
+        self.ui_bus.post_call(lambda: self.connect_button.configure(state=tk.DISABLED) if self.connect_button else None) # Disable while connecting
 
         try:
-            logger.info(f"Setting protocol to {protocol}...")
-            set_mullvad_protocol(protocol)
-            time.sleep(0.5) # Small delay after setting protocol
-
-            logger.info(f"Setting location to {country_code} {city_code} {hostname}...")
-            set_mullvad_location(country_code, city_code, hostname)
-            time.sleep(0.5) # Small delay after setting location
-
-            logger.info("Initiating Mullvad connect command...")
-            connect_mullvad()
-
-            # Update UI upon success
-            self.root.after(0, lambda h=hostname: self.loading_animation.update_text(f"Successfully connected to {h}"))
-            logger.info(f"Connection to {hostname} successful.")
-            self.root.after(1500, self.loading_animation.stop) # Stop animation after showing success
+            from connection import connect_relay, is_tunnel_up
+            # Waits for the Connected state on the status stream, not just for the CLI calls to return
+            result = connect_relay(hostname, country_code, city_code, protocol,
+                                   tunnel_up=is_tunnel_up(self.last_status), started_at=requested_at)
+            if self._recording_history():
+                relay = (self.catalog.get(hostname) if self.catalog else None) or {"hostname": hostname, "country_code": country_code}
+                self.history.record_connect(relay, result.elapsed_ms if result.connected else None)
+                if result.connected and self.history.flush():
+                    self._load_connect_penalties()
+
+            if result.connected:
+                self.ui_bus.post_status(f"Connected to {hostname} in {result.elapsed_ms / 1000:.1f}s")
+                self.connected_hostname = hostname
+                self._update_failover_monitor()
+            else:
+                detail = result.status.splitlines()[0] if result.status else "no Connected state received"
+                self.ui_bus.post_status(f"Connection to {hostname} did not come up ({detail})")
+                self.ui_bus.post_call(lambda: messagebox.showwarning(
+                    "Connection Failed", f"{hostname} did not connect within "
+                    f"{result.elapsed_ms / 1000:.0f}s.\n\nLast status: {detail}", parent=self.root))
+            self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1500) # Stop animation after showing the outcome
 
 
         except MullvadCLIError as e:
             logger.error(f"Mullvad CLI error during connection: {e}")
-            self.root.after(0, lambda err=e: messagebox.showerror("Connection Failed", f"Mullvad command failed:\n{err}", parent=self.root))
-            self.root.after(0, lambda: self.loading_animation.update_text("Connection failed"))
-            self.root.after(1500, self.loading_animation.stop)
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Connection Failed", f"Mullvad command failed:\n{err}", parent=self.root))
+            self.ui_bus.post_status("Connection failed")
+            self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1500)
         except ValueError as e: # e.g., invalid protocol
              logger.error(f"Value error during connection setup: {e}")
-             self.root.after(0, lambda err=e: messagebox.showerror("Connection Error", f"Configuration error:\n{err}", parent=self.root))
-             self.root.after(0, lambda: self.loading_animation.update_text("Connection setup failed"))
-             self.root.after(1500, self.loading_animation.stop)
+             self.ui_bus.post_call(lambda err=e: messagebox.showerror("Connection Error", f"Configuration error:\n{err}", parent=self.root))
+             self.ui_bus.post_status("Connection setup failed")
+             self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1500)
         except Exception as e:
             logger.exception("Unexpected error during connection process.")
-            self.root.after(0, lambda err=e: messagebox.showerror("Connection Error", f"An unexpected error occurred:\n{err}", parent=self.root))
-            self.root.after(0, lambda: self.loading_animation.update_text("Connection error"))
-            self.root.after(1500, self.loading_animation.stop)
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Connection Error", f"An unexpected error occurred:\n{err}", parent=self.root))
+            self.ui_bus.post_status("Connection error")
+            self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1500)
         finally:
+             self.refresh_status()
              # Re-enable connect button regardless of outcome
-             self.root.after(0, lambda: self.connect_button.configure(state=tk.NORMAL) if self.connect_button else None)
+             self.ui_bus.post_call(lambda: self.connect_button.configure(state=tk.NORMAL) if self.connect_button else None)
 
 
     def disconnect(self):
         """Disconnect from Mullvad VPN."""
         logger.info("Disconnect requested.")
-        threading.Thread(target=self._disconnect, daemon=True).start()
+        self.task_pool.submit("Disconnect", self._disconnect, lane="connection", priority=PRIORITY_HIGH)
 
     def _disconnect(self):
         """Internal method to handle disconnection in a thread."""
-        self.root.after(0, lambda: self.loading_animation.update_text("Disconnecting..."))
-        self.root.after(0, lambda: self.loading_animation.start(self.root))
-        self.root.after(0, lambda: self.connect_button.configure(state=tk.DISABLED) if self.connect_button else None) # Disable connect during disconnect
+        self.ui_bus.post_status("Disconnecting...")
+        self.ui_bus.post_call(lambda: self.loading_animation.start(self.root))
+        self.ui_bus.post_call(lambda: self.connect_button.configure(state=tk.DISABLED) if self.connect_button else None) # Disable connect during disconnect
 
+        self.connected_hostname = None
+        self._update_failover_monitor() # Stops the monitor
         try:
             disconnect_mullvad()
-            self.root.after(0, lambda: self.loading_animation.update_text("Disconnected successfully"))
+            self.ui_bus.post_status("Disconnected successfully")
             logger.info("Disconnection successful.")
-            self.root.after(1500, self.loading_animation.stop)
+            self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1500)
 
         except MullvadCLIError as e:
             logger.error(f"Mullvad CLI error during disconnection: {e}")
             # Check if already disconnected
             status = get_mullvad_status()
             if "Disconnected" in status:
-                 self.root.after(0, lambda: self.loading_animation.update_text("Already disconnected"))
-                 self.root.after(1500, self.loading_animation.stop)
+                 self.ui_bus.post_status("Already disconnected")
+                 self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1500)
             else:
-                 self.root.after(0, lambda err=e: messagebox.showerror("Disconnect Failed", f"Mullvad command failed:\n{err}", parent=self.root))
-                 self.root.after(0, lambda: self.loading_animation.update_text("Disconnect failed"))
-                 self.root.after(1500, self.loading_animation.stop)
+                 self.ui_bus.post_call(lambda err=e: messagebox.showerror("Disconnect Failed", f"Mullvad command failed:\n{err}", parent=self.root))
+                 self.ui_bus.post_status("Disconnect failed")
+                 self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1500)
         except Exception as e:
             logger.exception("Unexpected error during disconnection process.")
-            self.root.after(0, lambda err=e: messagebox.showerror("Disconnect Error", f"An unexpected error occurred:\n{err}", parent=self.root))
-            self.root.after(0, lambda: self.loading_animation.update_text("Disconnect error"))
-            self.root.after(1500, self.loading_animation.stop)
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Disconnect Error", f"An unexpected error occurred:\n{err}", parent=self.root))
+            self.ui_bus.post_status("Disconnect error")
+            self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1500)
         finally:
+             self.refresh_status()
              # Re-enable connect button
-             self.root.after(0, lambda: self.connect_button.configure(state=tk.NORMAL) if self.connect_button else None)
+             self.ui_bus.post_call(lambda: self.connect_button.configure(state=tk.NORMAL) if self.connect_button else None)
 
 
-    # --- Status Update ---
+    # --- Automatic Failover ---
 
-    def update_status(self):
-        """Update the connection status periodically."""
-        # Stop scheduling new updates if root window is closed
-        try:
-            if not self.root.winfo_exists():
-                logger.info("Root window closed, stopping status updates.")
-                if self.status_update_after_id:
-                    self.root.after_cancel(self.status_update_after_id)
-                return
-        except tk.TclError:
-             logger.info("Root window seems closed (TclError), stopping status updates.")
-             return # Window destroyed
+    def _on_auto_failover_toggled(self):
+        self.config["auto_failover"] = self.auto_failover_var.get()
+        self.task_pool.submit("Update failover monitor", self._update_failover_monitor, lane="connection")
 
-        try:
-            # Run get_mullvad_status in a separate thread to avoid brief UI hangs
-            def _fetch_status():
-                try:
-                    status = get_mullvad_status()
-                    # Schedule the UI update back on the main thread
-                    self.root.after(0, lambda s=status: self.status_var.set(s))
-                except Exception as fetch_e:
-                     logger.error(f"Error fetching Mullvad status in thread: {fetch_e}")
-                     self.root.after(0, lambda: self.status_var.set("Status Error"))
+    def _update_failover_monitor(self):
+        """Start, retarget or stop the failover monitor to match the connection and the setting."""
+        relay = self.catalog.get(self.connected_hostname) if self.catalog and self.connected_hostname else None
+        if not self.config.get("auto_failover", False) or relay is None:
+            if self.failover_monitor:
+                self.failover_monitor.stop()
+                self.failover_monitor = None
+            return
+        if self.failover_monitor:
+            self.failover_monitor.set_current(relay)
+            return
+        from failover import FailoverMonitor, FailoverPolicy
+        self.failover_monitor = FailoverMonitor(relay, self._failover_shortlist,
+                                                policy=FailoverPolicy.from_config(self.config),
+                                                on_decision=self._on_failover_decision)
+        self.failover_monitor.start()
+
+    def _failover_shortlist(self, current: Dict[str, Any], size: int) -> List[Dict[str, Any]]:
+        """
+        Alternatives of the connected relay's protocol (the tunnel protocol is
+        kept across a failover): the best tested relays, then relays of the
+        same city and country.
+        """
+        hostname = current.get("hostname")
+        protocol, country_code = relay_protocol(current), current.get("country_code")
+        shortlist: List[Dict[str, Any]] = []
+        relays = [r for r in map(self.catalog.get, self.failover_candidates)
+                  if r and relay_protocol(r) == protocol] if self.catalog else []
+        if self.catalog and len(relays) < size:
+            relays += self.catalog.select(country_code, protocol, f"city:{current.get('city_code')}")
+            relays += self.catalog.select(country_code, protocol)
+        for relay in relays:
+            if relay and relay.get("hostname") != hostname and relay not in shortlist:
+                shortlist.append(relay)
+                if len(shortlist) >= size:
+                    break
+        return shortlist
+
+    def _on_failover_decision(self, decision: "FailoverDecision"):
+        """Called on the monitor thread; the decision itself is already logged with its measurements."""
+        if decision.switched:
+            self.connected_hostname = decision.to_hostname
+            self.ui_bus.post_status(f"Failover: {decision.from_hostname} degraded ({decision.reason}), "
+                                    f"switched to {decision.to_hostname}")
+            self.refresh_status()
+        else:
+            self.ui_bus.post_status(f"{decision.from_hostname} degraded ({decision.reason}), no better relay found")
 
-            threading.Thread(target=_fetch_status, daemon=True).start()
 
-        except Exception as e:
-            # Catch errors scheduling the thread itself
-            logger.exception(f"Error scheduling status update thread: {e}")
-            self.status_var.set("Status Error") # Update UI immediately with error
+    # --- Status Update ---
 
-        # Schedule the next update
-        self.status_update_after_id = self.root.after(5000, self.update_status) # Check every 5 seconds
+    def start_status_listener(self):
+        """Follow connection status changes from the Mullvad CLI (stream, or adaptive polling fallback)."""
+        if self.status_listener is None:
+            self.status_listener = MullvadStatusListener(self._on_status_changed)
+        self.status_listener.start()
+
+    def _on_status_changed(self, status: str):
+        """Status listener callback (listener thread): forward the new status to the UI."""
+        self.last_status = status
+        if not self.first_status_received:
+            self.first_status_received = True
+            self._log_startup_stage("first status fetched")
+        self.ui_bus.post_call(lambda s=status: self.status_var.set(s))
+
+    def refresh_status(self):
+        """Request a prompt status update (used after connect/disconnect when polling)."""
+        if self.status_listener:
+            self.status_listener.refresh()
+
+    def shutdown(self):
+        """Stop background helpers (status stream subprocess, UI bus) on exit."""
+        logger.info("Shutting down background tasks.")
+        if self.failover_monitor:
+            self.failover_monitor.stop()
+        if self.status_listener:
+            self.status_listener.stop()
+        self.task_pool.shutdown()
+        from mullvad_client import close_client
+        close_client() # Stops the event loop thread running Mullvad CLI commands
+        self.ui_bus.stop()
+        if self.history:
+            self.history.close() # Write queued probes
+        self.config.flush() # Write any pending (debounced) config changes
 
 
     # --- File Operations ---
 
-    def export_to_csv(self):
-        """Export the current server list with results to a CSV file."""
+    def export_results(self):
+        """Export the visible server list with results (CSV or NDJSON, optionally gzip compressed)."""
         if not self.server_tree: return
-        items = self.server_tree.get_children()
-        if not items:
+        # Copies taken here on the Tk thread: set_result/clear_results change the rows in place
+        rows = [self.result_model.rows[item_id].snapshot() for item_id in self.result_model.visible_order()]
+        if not rows:
             messagebox.showinfo("Export", "No server data to export.", parent=self.root)
             return
 
         file_path = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV Files", "*.csv"), ("All Files", "*.*")],
-            title="Export Server List to CSV",
+            filetypes=EXPORT_FILETYPES,
+            title="Export Server List",
             parent=self.root
         )
         if not file_path: return # User cancelled
 
-        self.loading_animation.update_text("Exporting to CSV...")
+        self.loading_animation.update_text("Exporting results...")
         self.loading_animation.start(self.root)
-        self.root.update_idletasks()
+        # The records are built lazily from the snapshots on the worker
+        from exporters import model_records, with_distributions, RESULT_FIELDS, DISTRIBUTION_FIELDS
+        records = model_records(rows, self.catalog)
+        fields = RESULT_FIELDS
+        if self.history:
+            # Attach the latency/speed distributions recorded for these relays
+            records = with_distributions(records, self.history, EXPORT_DISTRIBUTION_DAYS, [row.hostname for row in rows])
+            fields = RESULT_FIELDS + DISTRIBUTION_FIELDS
+        self.task_pool.submit("Export results", self._export_worker, records, file_path, fields, lane="data")
+
+    def export_history(self):
+        """Export every stored probe from the history database."""
+        if not self.history:
+            messagebox.showinfo("Export", "The probe history database is not available.", parent=self.root)
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".ndjson.gz",
+            filetypes=EXPORT_FILETYPES,
+            title="Export Probe History",
+            parent=self.root
+        )
+        if not file_path: return
 
-        try:
-            servers_data: List[Dict[str, Any]] = []
-            for item_id in items:
-                 # Get full data if possible, otherwise just tree values
-                 server_details = self._get_server_details_from_item_id(item_id)
-                 if server_details:
-                      # Add latency/speed results from treeview to the dict
-                      try:
-                          if self.server_tree.exists(item_id):
-                              values = self.server_tree.item(item_id, "values")
-                              server_details['latency'] = values[5] if values[5] else None
-                              server_details['download_speed'] = values[6] if values[6] else None
-                              server_details['upload_speed'] = values[7] if values[7] else None
-                              server_details['protocol'] = values[4] # Get protocol from tree display
-                          else: continue # Skip if item disappeared
-                      except (tk.TclError, IndexError):
-                           logger.warning(f"Could not get values for item {item_id} during export.")
-                           continue # Skip this item
-                      servers_data.append(server_details)
-                 else: # Fallback if server data lookup failed
-                      try:
-                          if self.server_tree.exists(item_id):
-                              values = self.server_tree.item(item_id, "values")
-                              servers_data.append({
-                                   "hostname": values[1], "city": values[2], "country": values[3],
-                                   "protocol": values[4], "latency": values[5],
-                                   "download_speed": values[6], "upload_speed": values[7]
-                              })
-                          else: continue # Skip if item disappeared
-                      except (tk.TclError, IndexError):
-                           logger.warning(f"Could not get fallback values for item {item_id} during export.")
-                           continue # Skip this item
-
-
-            success = export_to_csv(servers_data, file_path)
-            if success:
-                 messagebox.showinfo("Export Successful", f"Server list exported to:\n{file_path}", parent=self.root)
-                 self.loading_animation.update_text("Export successful")
-            else:
-                 messagebox.showerror("Export Failed", "Failed to export server list to CSV. Check logs.", parent=self.root)
-                 self.loading_animation.update_text("Export failed")
+        self.loading_animation.update_text("Exporting probe history...")
+        self.loading_animation.start(self.root)
+        from exporters import history_records, PROBE_FIELDS
+        self.task_pool.submit("Export probe history", self._export_worker, history_records(self.history),
+                              file_path, PROBE_FIELDS, lane="data")
 
+    def _export_worker(self, records, file_path: str, fields: List[str]):
+        """Stream records to file_path on a worker thread and report the outcome on the Tk thread."""
+        from exporters import export_records, ExportError
+        try:
+            count = export_records(records, file_path, fields=fields)
+            self.ui_bus.post_call(lambda: messagebox.showinfo("Export Successful", f"Exported {count} records to:\n{file_path}", parent=self.root))
+            self.ui_bus.post_status("Export successful")
+        except ExportError as e:
+            logger.error(f"Export failed: {e}")
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Export Failed", str(err), parent=self.root))
+            self.ui_bus.post_status("Export failed")
         except Exception as e:
-            logger.exception("Error during CSV export.")
-            messagebox.showerror("Export Error", f"An unexpected error occurred:\n{e}", parent=self.root)
-            self.loading_animation.update_text("Export error")
+            logger.exception("Error during export.")
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Export Error", f"An unexpected error occurred:\n{err}", parent=self.root))
+            self.ui_bus.post_status("Export error")
         finally:
-             self.root.after(1000, self.loading_animation.stop)
+            self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1000)
 
 
     def save_test_results(self):
-        """Save the current Treeview state (including results and selection) to a file."""
+        """Save the current list (results and selection) to a versioned .msf results file."""
         if not self.server_tree: return
         items = self.server_tree.get_children()
         if not items:
@@ -1486,73 +1729,57 @@ class MullvadFinderApp:
 
         self.loading_animation.update_text("Saving results...")
         self.loading_animation.start(self.root)
-        self.root.update_idletasks()
 
+        # Snapshot the rows on the Tk thread; the file is written by a worker
+        records: List[Dict[str, Any]] = []
+        for item_id in items:
+            try:
+                values = self.server_tree.item(item_id, "values")
+                records.append({
+                    "hostname": values[1],
+                    "city": values[2],
+                    "country": values[3], # Display value with flag
+                    "protocol": values[4],
+                    "latency": values[5],
+                    "download": values[6],
+                    "upload": values[7],
+                    "selected": values[0] == CHECKBOX_CHECKED,
+                })
+            except (tk.TclError, IndexError):
+                logger.warning(f"Could not get data for item {item_id} during save.")
+                continue # Skip this item
+
+        metadata = {
+            "timestamp": time.time(),
+            "config_summary": { # Key settings used for this test
+                "country": self.current_country_var.get(),
+                "protocol_filter": self.protocol_var.get(),
+                "ping_count": self.config.get("ping_count"),
+                "test_type_run": self.test_type_var.get(),
+            },
+            "view_state": {
+                "sort_column": self.sort_column,
+                "sort_order": self.sort_order,
+            },
+        }
+        self.task_pool.submit("Save results", self._save_results_worker, file_path, records, metadata, lane="data")
+
+    def _save_results_worker(self, file_path: str, records: List[Dict[str, Any]], metadata: Dict[str, Any]):
+        from results_io import write_results
         try:
-            results_data: List[Dict[str, Any]] = []
-            selected_hostnames: List[str] = []
-            for item_id in items:
-                 try:
-                     if not self.server_tree.exists(item_id): continue # Skip if item disappeared
-                     values = self.server_tree.item(item_id, "values")
-                     tags = self.server_tree.item(item_id, "tags")
-                     hostname = values[1]
-
-                     result = {
-                         "hostname": hostname,
-                         "city": values[2],
-                         "country": values[3], # Save display value with flag
-                         "protocol": values[4],
-                         "latency": values[5] or None,
-                         "download_speed": values[6] or None,
-                         "upload_speed": values[7] or None,
-                         "tags": list(tags) # Save tags for potential color restoration
-                     }
-                     results_data.append(result)
-
-                     # Check if selected
-                     if self.server_tree.set(item_id, "#1") == CHECKBOX_CHECKED:
-                          selected_hostnames.append(hostname)
-                 except (tk.TclError, IndexError):
-                      logger.warning(f"Could not get data for item {item_id} during save.")
-                      continue # Skip this item
-
-
-            # Data structure to save
-            save_data = {
-                "version": "1.1", # Add version for future compatibility
-                "timestamp": time.time(),
-                "config_summary": { # Save key config settings used for this test
-                     "country": self.current_country_var.get(), # Save display value with flag
-                     "protocol_filter": self.protocol_var.get(),
-                     "ping_count": self.config.get("ping_count"),
-                     "test_type_run": self.test_type_var.get(), # What test was run?
-                },
-                "results": results_data,
-                "selected_hostnames": selected_hostnames,
-                "view_state": { # Save view settings
-                     "sort_column": self.sort_column,
-                     "sort_order": self.sort_order,
-                },
-                "cell_color_tags": list(self.created_cell_tags) # Save created color tags
-            }
-
-            with open(file_path, 'wb') as f:
-                pickle.dump(save_data, f)
-
-            messagebox.showinfo("Save Successful", f"Test results saved to:\n{file_path}", parent=self.root)
-            self.loading_animation.update_text("Results saved")
-
+            count = write_results(file_path, records, metadata)
+            self.ui_bus.post_call(lambda: messagebox.showinfo("Save Successful", f"Saved {count} results to:\n{file_path}", parent=self.root))
+            self.ui_bus.post_status("Results saved")
         except Exception as e:
             logger.exception("Error saving test results.")
-            messagebox.showerror("Save Error", f"An unexpected error occurred:\n{e}", parent=self.root)
-            self.loading_animation.update_text("Save error")
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Save Error", f"An unexpected error occurred:\n{err}", parent=self.root))
+            self.ui_bus.post_status("Save error")
         finally:
-             self.root.after(1000, self.loading_animation.stop)
+            self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1000)
 
 
     def load_test_results(self):
-        """Load test results from a .msf file into the Treeview."""
+        """Load a .msf results file (current or legacy format), streaming rows into the list."""
         if not self.server_tree: return
 
         file_path = filedialog.askopenfilename(
@@ -1562,110 +1789,109 @@ class MullvadFinderApp:
         )
         if not file_path: return
 
+        if self.results_load_task and self.results_load_task.state in ("queued", "running"):
+            self.results_load_task.cancel() # Superseded by this load
+
         self.loading_animation.update_text("Loading results...")
         self.loading_animation.start(self.root)
-        self.root.update_idletasks()
 
+        # Clear current view; rows arrive in chunks from the worker
+        self._clear_server_list()
+        self.selected_server_items.clear()
+        self.server_tree.heading("selected", text=CHECKBOX_UNCHECKED)
+        self.server_tree.set_striped(self.config.get("alternating_row_colors", True))
+        cancel_event = Event()
+        self.results_load_task = self.task_pool.submit("Load results", self._load_results_worker, file_path, cancel_event,
+                                                       lane="data", priority=PRIORITY_HIGH, cancel_event=cancel_event)
+
+    def _load_results_worker(self, file_path: str, cancel_event: Event):
+        """Read results in chunks and hand each chunk to the Tk thread, waiting until it is applied."""
+        import pickle # Already loaded by results_io; only needed for the legacy format's error type
+        from results_io import open_results, format_result_value, ResultsFormatError
         try:
-            with open(file_path, 'rb') as f:
-                loaded_data = pickle.load(f)
-
-            # Basic validation
-            if not isinstance(loaded_data, dict) or "results" not in loaded_data:
-                raise ValueError("Invalid or unrecognized file format.")
-
-            # --- Restore UI State ---
-            # Clear current view
-            self.server_tree.delete(*self.server_tree.get_children())
-            self.selected_server_items.clear()
-            self.created_cell_tags.clear() # Clear old dynamic tags
-            self.server_tree.heading("selected", text=CHECKBOX_UNCHECKED)
-
-            # Restore config summary (optional, could just display it)
-            config_summary = loaded_data.get("config_summary", {})
-            country_display_name = config_summary.get("country", "All Countries")
-            protocol_filter = config_summary.get("protocol_filter", "wireguard")
-            # self.current_country_var.set(country_display_name) # Avoid triggering reload
-            # self.protocol_var.set(protocol_filter) # Avoid triggering reload
-            logger.info(f"Loaded results for Country: {country_display_name}, Protocol: {protocol_filter}")
-
-
-            # Restore cell color tags
-            saved_tags = loaded_data.get("cell_color_tags", [])
-            for tag_name in saved_tags:
-                 if tag_name.startswith("cell_"):
-                     try:
-                         parts = tag_name.split('_') # cell_latency_63BE7B
-                         if len(parts) == 3:
-                             color_code = f"#{parts[2]}"
-                             # Reconfigure tag with appropriate foreground
-                             r, g, b = int(color_code[1:3], 16), int(color_code[3:5], 16), int(color_code[5:7], 16)
-                             text_color = "#FFFFFF" if (r*0.299 + g*0.587 + b*0.114) < 140 else "#000000"
-                             self.server_tree.tag_configure(tag_name, background=color_code, foreground=text_color)
-                             self.created_cell_tags.add(tag_name)
-                     except Exception as e:
-                         logger.warning(f"Could not restore cell tag '{tag_name}': {e}")
-
-
-            # Populate Treeview
-            results_list = loaded_data.get("results", [])
-            item_id_map: Dict[str, str] = {} # Map hostname to item_id for selection restore
-            use_alt_colors = self.config.get("alternating_row_colors", True)
-
-            for i, result in enumerate(results_list):
-                hostname = result.get("hostname", "N/A")
-                tags_to_apply = []
-                # Restore row color tag
-                if use_alt_colors:
-                    tags_to_apply.append('odd_row' if i % 2 else 'even_row')
-                # Restore valid cell color tags found in the result's saved tags
-                for saved_tag in result.get("tags", []):
-                     if saved_tag in self.created_cell_tags: # Only apply tags we successfully restored
-                         tags_to_apply.append(saved_tag)
-
-                item_id = self.server_tree.insert("", tk.END, values=(
-                    CHECKBOX_UNCHECKED, # Start unchecked
-                    hostname,
-                    result.get("city", ""),
-                    result.get("country", ""), # Use saved display value (with flag)
-                    result.get("protocol", ""),
-                    result.get("latency", ""),
-                    result.get("download_speed", ""),
-                    result.get("upload_speed", "")
-                ), tags=tuple(tags_to_apply))
-                item_id_map[hostname] = item_id
-
-            # Restore selection state
-            selected_hostnames = loaded_data.get("selected_hostnames", [])
-            for hostname in selected_hostnames:
-                 item_id = item_id_map.get(hostname)
-                 if item_id:
-                     self._toggle_checkbox(item_id) # Toggle to checked state and update set
-            self._update_run_test_button_text()
-
-
-            # Restore sort order
-            view_state = loaded_data.get("view_state", {})
-            self.sort_column = view_state.get("sort_column", self.config["default_sort_column"])
-            self.sort_order = view_state.get("sort_order", self.config["default_sort_order"])
-            self.sort_treeview(self.sort_column, force_order=self.sort_order)
-
-            # Display info
-            timestamp = loaded_data.get("timestamp")
-            time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)) if timestamp else "N/A"
-            messagebox.showinfo("Load Successful", f"Loaded {len(results_list)} results from:\n{file_path}\nSaved: {time_str}", parent=self.root)
-            self.loading_animation.update_text("Results loaded")
-
-        except (FileNotFoundError, pickle.UnpicklingError, ValueError, TypeError) as e:
+            header, records = open_results(file_path)
+            total = header.get("count") or 0
+            config_summary = header.get("config_summary", {})
+            logger.info(f"Loading {total} results for Country: {config_summary.get('country', 'All Countries')}, "
+                        f"Protocol: {config_summary.get('protocol_filter', 'wireguard')}")
+
+            loaded = 0
+            chunk: List[Tuple[Tuple[str, ...], bool]] = []
+            applied = Event()
+            for record in records:
+                if cancel_event.is_set():
+                    return
+                selected = bool(record.get("selected"))
+                chunk.append(((
+                    CHECKBOX_CHECKED if selected else CHECKBOX_UNCHECKED,
+                    record.get("hostname") or "N/A",
+                    record.get("city") or "",
+                    record.get("country") or "", # Saved display value (with flag)
+                    record.get("protocol") or "",
+                    format_result_value(record.get("latency")),
+                    format_result_value(record.get("download")),
+                    format_result_value(record.get("upload")),
+                ), selected))
+                if len(chunk) >= RESULTS_LOAD_CHUNK_ROWS:
+                    loaded += len(chunk)
+                    self._post_loaded_rows(chunk, applied, cancel_event)
+                    self.ui_bus.post_status(f"Loading results... {loaded}/{total}")
+                    chunk = []
+            if chunk and not cancel_event.is_set():
+                loaded += len(chunk)
+                self._post_loaded_rows(chunk, applied, cancel_event)
+            if not cancel_event.is_set():
+                self.ui_bus.post_call(lambda: self._finish_loading_results(file_path, header, loaded))
+        except (FileNotFoundError, ResultsFormatError, pickle.UnpicklingError, ValueError, TypeError) as e:
             logger.exception(f"Error loading results file: {file_path}")
-            messagebox.showerror("Load Error", f"Failed to load results:\n{e}", parent=self.root)
-            self.loading_animation.update_text("Load failed")
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Load Error", f"Failed to load results:\n{err}", parent=self.root))
+            self.ui_bus.post_status("Load failed")
+            self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1000)
         except Exception as e:
             logger.exception(f"Unexpected error loading results file: {file_path}")
-            messagebox.showerror("Load Error", f"An unexpected error occurred:\n{e}", parent=self.root)
-            self.loading_animation.update_text("Load error")
+            self.ui_bus.post_call(lambda err=e: messagebox.showerror("Load Error", f"An unexpected error occurred:\n{err}", parent=self.root))
+            self.ui_bus.post_status("Load error")
+            self.ui_bus.post_call(self.loading_animation.stop, delay_ms=1000)
+
+    def _post_loaded_rows(self, chunk: List[Tuple[Tuple[str, ...], bool]], applied: Event, cancel_event: Event):
+        """Queue one chunk for insertion and block until the Tk thread took it (keeps the UI responsive)."""
+        applied.clear()
+        self.ui_bus.post_call(lambda: self._insert_loaded_rows(chunk, applied, cancel_event))
+        while not applied.wait(0.2):
+            if cancel_event.is_set():
+                return
+
+    def _insert_loaded_rows(self, chunk: List[Tuple[Tuple[str, ...], bool]], applied: Event, cancel_event: Event):
+        try:
+            if cancel_event.is_set() or not self.server_tree: return
+            for row, selected in chunk:
+                item_id = self.server_tree.insert("", tk.END, values=row)
+                self.result_model.add(item_id, row, selected)
+                if selected:
+                    self.selected_server_items.add(item_id)
+                # Recolor from the values (palette tags are configured once)
+                self.apply_cell_color(item_id, "latency", row[5])
+                self.apply_cell_color(item_id, "download", row[6])
+                self.apply_cell_color(item_id, "upload", row[7])
         finally:
-             self.root.after(1000, self.loading_animation.stop)
+            applied.set()
+
+    def _finish_loading_results(self, file_path: str, header: Dict[str, Any], count: int):
+        """Apply search filter, selection and sort once all loaded rows are in the list."""
+        self._apply_search_filter()
+        self._update_run_test_button_text()
+
+        view_state = header.get("view_state", {})
+        self.sort_column = view_state.get("sort_column", self.config["default_sort_column"])
+        self.sort_order = view_state.get("sort_order", self.config["default_sort_order"])
+        self.sort_treeview(self.sort_column, force_order=self.sort_order)
+
+        timestamp = header.get("timestamp")
+        time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)) if timestamp else "N/A"
+        legacy_note = "\n(Imported from a legacy results file)" if header.get("version", 0) < 2 else ""
+        self.loading_animation.update_text("Results loaded")
+        self.root.after(1000, self.loading_animation.stop)
+        messagebox.showinfo("Load Successful", f"Loaded {count} results from:\n{file_path}\nSaved: {time_str}{legacy_note}", parent=self.root)
 
 
     def clear_all_results(self):
@@ -1688,17 +1914,13 @@ class MullvadFinderApp:
                  values[5] = ""
                  values[6] = ""
                  values[7] = ""
-
-                 # Remove cell color tags, keep row color tags
-                 current_tags = list(self.server_tree.item(item_id, "tags"))
-                 filtered_tags = [tag for tag in current_tags if tag.startswith(('odd_row', 'even_row'))]
-
-                 self.server_tree.item(item_id, values=tuple(values), tags=tuple(filtered_tags))
+                 self.server_tree.item(item_id, values=tuple(values))
              except (tk.TclError, IndexError):
                   logger.warning(f"Could not clear results for item {item_id} (may be invalid).")
                   continue
 
-        self.created_cell_tags.clear() # All color tags are now invalid
+        self.result_model.clear_results()
+        self.server_tree.clear_cell_tags() # Remove all cell colors
         self.loading_animation.update_text("Results cleared")
         self.root.after(500, self.loading_animation.stop)
 
@@ -1801,7 +2023,7 @@ class MullvadFinderApp:
             protocol = "wireguard" if "-wg" in hostname.lower() or ".wg." in hostname.lower() else "openvpn"
 
             logger.info(f"Connecting to favorite: {hostname}")
-            threading.Thread(target=self._connect_to_server, args=(protocol, country_code, city_code, hostname), daemon=True).start()
+            self._submit_connect(protocol, country_code, city_code, hostname)
             favorites_window.destroy()
 
         def on_remove_fav():
@@ -1863,6 +2085,16 @@ class MullvadFinderApp:
         ttk.Checkbutton(tab, text="Use alternating row colors in list", variable=alt_rows_var).grid(row=3, column=0, columnspan=3, sticky=tk.W, pady=5)
         tab.alt_rows_var = alt_rows_var
 
+        # Probe History
+        record_history_var = tk.BooleanVar(value=self.config.get("record_history", True))
+        ttk.Checkbutton(tab, text="Record test results in probe history (View > Probe History)", variable=record_history_var).grid(row=4, column=0, columnspan=3, sticky=tk.W, pady=5)
+        tab.record_history_var = record_history_var
+
+        # Probe Daemon
+        use_daemon_var = tk.BooleanVar(value=self.config.get("use_daemon", True))
+        ttk.Checkbutton(tab, text="Use recent results of a running probe daemon instead of pinging", variable=use_daemon_var).grid(row=5, column=0, columnspan=3, sticky=tk.W, pady=5)
+        tab.use_daemon_var = use_daemon_var
+
         return tab
 
     def _create_testing_settings_tab(self, notebook: ttk.Notebook) -> ttk.Frame:
@@ -1976,6 +2208,8 @@ class MullvadFinderApp:
             new_config["auto_connect_fastest"] = tab_general.auto_connect_var.get()
             new_config["theme_mode"] = self.theme_var.get() # Get from self.theme_var
             new_config["alternating_row_colors"] = tab_general.alt_rows_var.get()
+            new_config["record_history"] = tab_general.record_history_var.get()
+            new_config["use_daemon"] = tab_general.use_daemon_var.get()
 
             # Testing
             new_config["ping_count"] = tab_testing.ping_count_var.get()
@@ -1990,14 +2224,15 @@ class MullvadFinderApp:
             new_config["default_sort_column"] = tab_display.sort_col_var.get()
             new_config["default_sort_order"] = tab_display.sort_ord_var.get()
 
-            if save_config(new_config):
-                 self.config = new_config # Update in-memory config
+            old_cache_path = get_cache_path(self.config)
+            self.config.update(new_config) # Only keys that actually changed become dirty
+            if save_config(self.config, immediate=True):
                  # Apply relevant immediate changes
                  self.test_type_var.set(self.config["test_type"])
                  self.on_test_type_selected() # Update UI based on new default test type
                  self.apply_theme() # Re-apply theme in case alt colors changed
                  # Reload server data if cache path changed effectively
-                 if get_cache_path(self.config) != get_cache_path(load_config()): # Compare effective paths
+                 if get_cache_path(self.config) != old_cache_path: # Compare effective paths
                      self.load_server_data()
 
                  messagebox.showinfo("Settings Saved", "Settings saved successfully.", parent=settings_window)
@@ -2014,6 +2249,136 @@ class MullvadFinderApp:
 
     # --- Miscellaneous ---
 
+    def show_task_window(self):
+        """Debug window listing queued, running and recent background tasks."""
+        task_window = tk.Toplevel(self.root)
+        task_window.title("Background Tasks")
+        task_window.geometry("640x320")
+        task_window.transient(self.root)
+
+        frame = ttk.Frame(task_window, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        columns = ("id", "name", "lane", "priority", "state", "runtime")
+        task_tree = ttk.Treeview(frame, columns=columns, show="headings", selectmode="browse")
+        for column, text, width in (("id", "#", 40), ("name", "Task", 240), ("lane", "Lane", 90),
+                                    ("priority", "Priority", 60), ("state", "State", 80), ("runtime", "Runtime", 70)):
+            task_tree.heading(column, text=text, anchor=tk.W)
+            task_tree.column(column, width=width, stretch=(column == "name"))
+        scroll_y = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=task_tree.yview)
+        task_tree.configure(yscrollcommand=scroll_y.set)
+
+        frame.grid_rowconfigure(0, weight=1)
+        frame.grid_columnconfigure(0, weight=1)
+        task_tree.grid(row=0, column=0, sticky='nsew', pady=(0, 10))
+        scroll_y.grid(row=0, column=1, sticky='ns', pady=(0, 10))
+
+        limits = ", ".join(f"{lane}: {n}" for lane, n in self.task_pool.lane_limits().items())
+        ttk.Label(frame, text=f"Workers per lane - {limits}").grid(row=1, column=0, sticky='w')
+
+        def refresh():
+            if not task_window.winfo_exists(): return
+            selected = task_tree.selection()
+            task_tree.delete(*task_tree.get_children())
+            for task in self.task_pool.tasks():
+                runtime = f"{task.runtime:.1f}s" if task.runtime is not None else ""
+                task_tree.insert("", tk.END, iid=str(task.id),
+                                 values=(task.id, task.name, task.lane, task.priority, task.state, runtime))
+            if selected and task_tree.exists(selected[0]):
+                task_tree.selection_set(selected[0])
+            task_window.after(500, refresh)
+
+        def on_cancel():
+            selection = task_tree.selection()
+            if selection:
+                self.task_pool.cancel(int(selection[0]))
+
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=2, column=0, columnspan=2, sticky='ew', pady=(10, 0))
+        ttk.Button(button_frame, text="Close", command=task_window.destroy).pack(side=tk.RIGHT)
+        ttk.Button(button_frame, text="Cancel Task", command=on_cancel).pack(side=tk.RIGHT, padx=5)
+
+        refresh()
+
+    def show_history_window(self):
+        """Window with aggregates from the probe history (median latency per relay, best relay per city by hour)."""
+        if not self.history:
+            messagebox.showinfo("Probe History", "The probe history database is not available.", parent=self.root)
+            return
+        history_window = tk.Toplevel(self.root)
+        history_window.title("Probe History")
+        history_window.geometry("720x420")
+        history_window.transient(self.root)
+
+        frame = ttk.Frame(history_window, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        top = ttk.Frame(frame)
+        top.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(top, text="Period:").pack(side=tk.LEFT, padx=(0, 5))
+        period_var = tk.StringVar(value="7 days")
+        period_combo = ttk.Combobox(top, textvariable=period_var, values=["1 day", "7 days", "30 days", "90 days"],
+                                    width=10, state="readonly")
+        period_combo.pack(side=tk.LEFT)
+        summary_label = ttk.Label(top, text="")
+        summary_label.pack(side=tk.RIGHT)
+
+        notebook = ttk.Notebook(frame)
+        notebook.pack(fill=tk.BOTH, expand=True)
+
+        def make_tree(title: str, columns: Tuple[Tuple[str, str, int], ...]) -> ttk.Treeview:
+            tab = ttk.Frame(notebook)
+            notebook.add(tab, text=title)
+            tree = ttk.Treeview(tab, columns=[c[0] for c in columns], show="headings")
+            for column, text, width in columns:
+                tree.heading(column, text=text, anchor=tk.W)
+                tree.column(column, width=width, stretch=(column == "hostname"))
+            scroll_y = ttk.Scrollbar(tab, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scroll_y.set)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+            return tree
+
+        median_tree = make_tree("Median Latency per Relay", (
+            ("hostname", "Hostname", 200), ("city", "City", 120), ("median", "Median (ms)", 90),
+            ("best", "Best (ms)", 80), ("samples", "Samples", 70), ("failures", "Timeouts", 70)))
+        hourly_tree = make_tree("Best Relay per City by Hour", (
+            ("city", "City", 150), ("hour", "Hour", 60), ("hostname", "Hostname", 200),
+            ("median", "Median (ms)", 90), ("samples", "Samples", 70)))
+
+        def show(median_stats, hourly_best, total: int):
+            if not history_window.winfo_exists(): return
+            median_tree.delete(*median_tree.get_children())
+            for s in median_stats:
+                median_tree.insert("", tk.END, values=(
+                    s.hostname, s.city or "", f"{s.median_ms:.1f}" if s.median_ms is not None else "",
+                    f"{s.best_ms:.1f}" if s.best_ms is not None else "", s.samples, s.failures))
+            hourly_tree.delete(*hourly_tree.get_children())
+            for b in hourly_best:
+                hourly_tree.insert("", tk.END, values=(
+                    f"{b.city or ''} ({(b.country_code or '').upper()})", f"{b.hour:02d}:00", b.hostname,
+                    f"{b.median_ms:.1f}", b.samples))
+            summary_label.config(text=f"{total} probes stored")
+
+        def query(days: float):
+            median_stats = self.history.median_latency(days)
+            hourly_best = self.history.best_relay_by_hour(days)
+            total = self.history.count()
+            self.ui_bus.post_call(lambda: show(median_stats, hourly_best, total))
+
+        def refresh(event=None):
+            summary_label.config(text="Loading...")
+            days = float(period_var.get().split()[0])
+            self.task_pool.submit("Query probe history", query, days, lane="data")
+
+        period_combo.bind("<<ComboboxSelected>>", refresh)
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(button_frame, text="Close", command=history_window.destroy).pack(side=tk.RIGHT)
+        ttk.Button(button_frame, text="Refresh", command=refresh).pack(side=tk.RIGHT, padx=5)
+
+        refresh()
+
     def show_about(self):
         """Show the about dialog."""
         about_text = (
@@ -2099,11 +2464,12 @@ class MullvadFinderApp:
                 if self.server_tree:
                     self.server_tree.tag_configure('odd_row', background=self.theme_colors["row_odd"], foreground=self.theme_colors["foreground"])
                     self.server_tree.tag_configure('even_row', background=self.theme_colors["row_even"], foreground=self.theme_colors["foreground"])
-                    # Update selection colors via style map
-                    style = ttk.Style()
-                    style.map('Treeview',
-                              background=[('selected', self.theme_colors["select_bg"])],
-                              foreground=[('selected', self.theme_colors["select_fg"])])
+                    self.server_tree.set_striped(self.config.get("alternating_row_colors", True))
+                    # Selection and heading colors are drawn by the grid itself
+                    self.server_tree.set_colors(
+                        background=self.theme_colors["background"], foreground=self.theme_colors["foreground"],
+                        select_bg=self.theme_colors["select_bg"], select_fg=self.theme_colors["select_fg"],
+                        header_bg=self.theme_colors["background"], header_fg=self.theme_colors["foreground"])
 
                 # Update status label color if needed (sv-ttk might handle this)
                 if self.status_label:
@@ -2112,9 +2478,6 @@ class MullvadFinderApp:
 
                 # Force redraw/update of elements
                 self.root.update_idletasks()
-                if self.server_tree:
-                    # Reloading data is heavy, try just updating tags on existing items
-                    self.sort_treeview(self.sort_column, force_order=self.sort_order) # Re-sort applies row tags
 
                 return # Successfully applied sv-ttk
 
@@ -2211,8 +2574,11 @@ class MullvadFinderApp:
         if self.server_tree:
             self.server_tree.tag_configure('odd_row', background=self.theme_colors["row_odd"], foreground=self.theme_colors["foreground"])
             self.server_tree.tag_configure('even_row', background=self.theme_colors["row_even"], foreground=self.theme_colors["foreground"])
-            # Reload/resort to apply
-            self.sort_treeview(self.sort_column, force_order=self.sort_order)
+            self.server_tree.set_striped(self.config.get("alternating_row_colors", True))
+            self.server_tree.set_colors(
+                background=self.theme_colors["entry_bg"], foreground=self.theme_colors["foreground"],
+                select_bg=self.theme_colors["select_bg"], select_fg=self.theme_colors["select_fg"],
+                header_bg=self.theme_colors["header_bg"], header_fg=self.theme_colors["header_fg"])
 
         # Update status label color
         if self.status_label:
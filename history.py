@@ -0,0 +1,410 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from typing import Optional, List, Dict, Any, Iterable, Iterator, NamedTuple, Tuple
+
+from catalog import relay_protocol
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+# --- Probe Kinds ---
+KIND_PING = "ping"
+KIND_SPEED = "speed"
+KIND_CONNECT = "connect" # latency_ms holds the time from the connect request to the tunnel being up
+
+SCHEMA_VERSION = 1
+DEFAULT_BATCH_SIZE = 500 # Max rows per insert transaction
+DEFAULT_FLUSH_INTERVAL_SEC = 1.0 # Max time a probe waits in the writer queue
+SECONDS_PER_DAY = 86400
+CONNECT_TIME_WEIGHT = 0.01 # Ranking: 1 s of median time-to-connected counts like 10 ms of latency
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,            -- Unix time of the measurement
+    hostname TEXT NOT NULL,
+    country_code TEXT,
+    city TEXT,
+    protocol TEXT,
+    kind TEXT NOT NULL,          -- 'ping', 'speed' or 'connect'
+    latency_ms REAL,             -- Ping RTT, or time-to-connected for 'connect'
+    download_mbps REAL,
+    upload_mbps REAL,
+    ok INTEGER NOT NULL          -- 0 for timeouts/failed tests
+);
+-- Per-relay time series
+CREATE INDEX IF NOT EXISTS idx_probes_host_ts ON probes(hostname, ts);
+-- Time windows for aggregates and pruning (append-mostly, so cheap to maintain)
+CREATE INDEX IF NOT EXISTS idx_probes_ts ON probes(ts);
+"""
+
+_INSERT_SQL = ("INSERT INTO probes (ts, hostname, country_code, city, protocol, kind, "
+               "latency_ms, download_mbps, upload_mbps, ok) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+class ProbeRecord(NamedTuple):
+    """One stored measurement."""
+    ts: float
+    hostname: str
+    country_code: Optional[str]
+    city: Optional[str]
+    protocol: Optional[str]
+    kind: str
+    latency_ms: Optional[float]
+    download_mbps: Optional[float]
+    upload_mbps: Optional[float]
+    ok: bool
+
+class RelayLatencyStats(NamedTuple):
+    """Latency summary of one relay over a time window."""
+    hostname: str
+    country_code: Optional[str]
+    city: Optional[str]
+    samples: int # Successful pings
+    failures: int # Timeouts
+    median_ms: Optional[float]
+    best_ms: Optional[float]
+
+class HourlyBest(NamedTuple):
+    """Relay with the lowest median latency in a city for one hour of the day (local time)."""
+    country_code: Optional[str]
+    city: Optional[str]
+    hour: int
+    hostname: str
+    median_ms: float
+    samples: int
+
+
+def _median(sorted_values: List[float]) -> Optional[float]:
+    n = len(sorted_values)
+    if n == 0:
+        return None
+    mid = n // 2
+    return sorted_values[mid] if n % 2 else (sorted_values[mid - 1] + sorted_values[mid]) / 2.0
+
+def connect_penalties(connect_times: Dict[str, float],
+                      weight: float = CONNECT_TIME_WEIGHT) -> Tuple[Dict[str, float], float]:
+    """
+    Ranking penalty in ms per relay from median connect times (see
+    HistoryStore.connect_times), and the penalty for relays without one
+    (the median penalty, so never-used relays are neither favored nor buried).
+    """
+    penalties = {hostname: connect_ms * weight for hostname, connect_ms in connect_times.items()}
+    return penalties, _median(sorted(penalties.values())) or 0.0
+
+def _protocol_of(server: Dict[str, Any]) -> Optional[str]:
+    protocol = server.get("protocol")
+    if isinstance(protocol, str) and protocol:
+        return protocol.lower()
+    protocol = relay_protocol(server)
+    return None if protocol == "unknown" else protocol
+
+
+class HistoryStore:
+    """
+    Append-only probe history in a local SQLite database (WAL mode).
+
+    record_ping()/record_speed() only enqueue; a single writer thread inserts
+    queued probes in batches (one transaction per batch), so test workers and
+    the Tk thread never wait on disk. Queries open their own short-lived
+    connection, which WAL lets run while the writer is busy.
+    """
+
+    def __init__(self, path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval_sec: float = DEFAULT_FLUSH_INTERVAL_SEC):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval_sec = flush_interval_sec
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.rows_written = 0
+        self._init_db()
+
+    # --- Setup ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # Safe with WAL; a crash can only lose the last batch
+        return conn
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                logger.warning(f"History database {self.path} has newer schema version {version}.")
+            conn.executescript(_SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        finally:
+            conn.close()
+        logger.info(f"Probe history database: {self.path}")
+
+    # --- Recording (any thread) ---
+
+    def record(self, probe: ProbeRecord):
+        """Queue one probe for the writer thread."""
+        if self._closed:
+            return
+        self._queue.put(probe)
+        if self._writer is None:
+            self._start_writer()
+
+    def record_ping(self, server: Dict[str, Any], latency_ms: Optional[float], ts: Optional[float] = None):
+        """Queue a ping result for a relay (None latency is stored as a timeout)."""
+        self.record(ProbeRecord(
+            ts or time.time(), server.get("hostname", ""), server.get("country_code"), server.get("city"),
+            _protocol_of(server), KIND_PING, latency_ms, None, None, latency_ms is not None))
+
+    def record_speed(self, server: Dict[str, Any], download_mbps: Optional[float], upload_mbps: Optional[float],
+                     ts: Optional[float] = None):
+        """Queue a speed test result for a relay."""
+        self.record(ProbeRecord(
+            ts or time.time(), server.get("hostname", ""), server.get("country_code"), server.get("city"),
+            _protocol_of(server), KIND_SPEED, None, download_mbps, upload_mbps,
+            bool(download_mbps or upload_mbps)))
+
+    def record_connect(self, server: Dict[str, Any], connect_ms: Optional[float], ts: Optional[float] = None):
+        """Queue the time-to-connected of a connection attempt (None if it never came up)."""
+        self.record(ProbeRecord(
+            ts or time.time(), server.get("hostname", ""), server.get("country_code"), server.get("city"),
+            _protocol_of(server), KIND_CONNECT, connect_ms, None, None, connect_ms is not None))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is written. Returns False on timeout."""
+        if self._writer is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Write pending probes and stop the writer thread."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join(timeout)
+        logger.info(f"Probe history closed ({self.rows_written} rows written this session).")
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, daemon=True, name="history-writer")
+                self._writer.start()
+
+    def _writer_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                batch: List[ProbeRecord] = []
+                waiters: List[threading.Event] = []
+                stop = False
+                deadline = time.monotonic() + self.flush_interval_sec
+                while True:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        batch.append(item)
+                    if stop or waiters or len(batch) >= self.batch_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._write_batch(conn, batch)
+                for waiter in waiters:
+                    waiter.set()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[ProbeRecord]):
+        try:
+            with conn:
+                conn.executemany(_INSERT_SQL, [(p.ts, p.hostname, p.country_code, p.city, p.protocol, p.kind,
+                                                p.latency_ms, p.download_mbps, p.upload_mbps, int(p.ok))
+                                               for p in batch])
+            self.rows_written += len(batch)
+            logger.debug(f"Wrote {len(batch)} probes to history.")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(batch)} probes to history: {e}")
+
+    # --- Queries (any thread) ---
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> Iterator[tuple]:
+        conn = self._connect()
+        try:
+            yield from conn.execute(sql, tuple(params))
+        finally:
+            conn.close()
+
+    def median_latency(self, days: float = 7, hostnames: Optional[Iterable[str]] = None,
+                       limit: Optional[int] = None) -> List[RelayLatencyStats]:
+        """Median ping latency per relay over the last `days`, best median first."""
+        params: List[Any] = [time.time() - days * SECONDS_PER_DAY, KIND_PING]
+        host_filter = ""
+        if hostnames is not None:
+            hostnames = list(hostnames)
+            if not hostnames:
+                return []
+            host_filter = f" AND hostname IN ({','.join('?' * len(hostnames))})"
+            params.extend(hostnames)
+
+        latencies: Dict[str, List[float]] = {}
+        failures: Dict[str, int] = {}
+        location: Dict[str, tuple] = {}
+        for hostname, latency, ok, country_code, city in self._query(
+                "SELECT hostname, latency_ms, ok, country_code, city FROM probes "
+                f"WHERE ts >= ? AND kind = ?{host_filter}", params):
+            samples = latencies.get(hostname)
+            if samples is None:
+                samples = latencies[hostname] = []
+                failures[hostname] = 0
+                location[hostname] = (country_code, city)
+            if ok and latency is not None:
+                samples.append(latency)
+            else:
+                failures[hostname] += 1
+
+        stats: List[RelayLatencyStats] = []
+        for hostname, samples in latencies.items():
+            samples.sort()
+            stats.append(RelayLatencyStats(hostname, *location[hostname], len(samples), failures[hostname],
+                                           _median(samples), samples[0] if samples else None))
+        stats.sort(key=lambda s: (s.median_ms is None, s.median_ms or 0.0, s.hostname))
+        return stats[:limit] if limit else stats
+
+    def best_relay_by_hour(self, days: float = 7, country_code: Optional[str] = None,
+                           min_samples: int = 1) -> List[HourlyBest]:
+        """For every city and local hour of day, the relay with the lowest median latency."""
+        params: List[Any] = [time.time() - days * SECONDS_PER_DAY, KIND_PING]
+        country_filter = ""
+        if country_code:
+            country_filter = " AND country_code = ?"
+            params.append(country_code.lower())
+
+        # (country_code, city, hour) -> hostname -> latencies
+        slots: Dict[tuple, Dict[str, List[float]]] = {}
+        for country, city, hour, hostname, latency in self._query(
+                "SELECT country_code, city, CAST(strftime('%H', ts, 'unixepoch', 'localtime') AS INTEGER), "
+                "hostname, latency_ms FROM probes "
+                f"WHERE ts >= ? AND kind = ? AND ok = 1{country_filter}", params):
+            slots.setdefault((country, city, hour), {}).setdefault(hostname, []).append(latency)
+
+        results: List[HourlyBest] = []
+        for (country, city, hour), hosts in slots.items():
+            best: Optional[HourlyBest] = None
+            for hostname, samples in hosts.items():
+                if len(samples) < min_samples:
+                    continue
+                samples.sort()
+                median = _median(samples)
+                if best is None or median < best.median_ms:
+                    best = HourlyBest(country, city, hour, hostname, median, len(samples))
+            if best is not None:
+                results.append(best)
+        results.sort(key=lambda b: (b.country_code or "", b.city or "", b.hour))
+        return results
+
+    def relay_series(self, hostname: str, days: float = 7, kind: Optional[str] = None) -> List[ProbeRecord]:
+        """All probes of one relay over the last `days`, oldest first."""
+        params: List[Any] = [hostname, time.time() - days * SECONDS_PER_DAY]
+        kind_filter = ""
+        if kind:
+            kind_filter = " AND kind = ?"
+            params.append(kind)
+        return [ProbeRecord(row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], bool(row[9]))
+                for row in self._query(
+                    "SELECT ts, hostname, country_code, city, protocol, kind, latency_ms, download_mbps, "
+                    f"upload_mbps, ok FROM probes WHERE hostname = ? AND ts >= ?{kind_filter} ORDER BY ts", params)]
+
+    def iter_probes(self, days: Optional[float] = None, kind: Optional[str] = None) -> Iterator[ProbeRecord]:
+        """Stream stored probes oldest first (rows are fetched lazily from the cursor)."""
+        clauses: List[str] = []
+        params: List[Any] = []
+        if days is not None:
+            clauses.append("ts >= ?")
+            params.append(time.time() - days * SECONDS_PER_DAY)
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        for row in self._query(
+                "SELECT ts, hostname, country_code, city, protocol, kind, latency_ms, download_mbps, "
+                f"upload_mbps, ok FROM probes{where} ORDER BY ts", params):
+            yield ProbeRecord(row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], bool(row[9]))
+
+    def samples_by_relay(self, days: float = 7, hostnames: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Raw result samples per relay over the last `days`:
+        {hostname: {"latency": [...], "download": [...], "upload": [...], "timeouts": n}}.
+        """
+        wanted = set(hostnames) if hostnames is not None else None
+        samples: Dict[str, Dict[str, Any]] = {}
+        for hostname, kind, latency, download, upload, ok in self._query(
+                "SELECT hostname, kind, latency_ms, download_mbps, upload_mbps, ok FROM probes "
+                "WHERE ts >= ? ORDER BY ts", (time.time() - days * SECONDS_PER_DAY,)):
+            if wanted is not None and hostname not in wanted:
+                continue
+            entry = samples.get(hostname)
+            if entry is None:
+                entry = samples[hostname] = {"latency": [], "download": [], "upload": [], "timeouts": 0}
+            if kind == KIND_PING:
+                if ok and latency is not None:
+                    entry["latency"].append(latency)
+                else:
+                    entry["timeouts"] += 1
+            elif kind == KIND_SPEED and ok:
+                if download is not None:
+                    entry["download"].append(download)
+                if upload is not None:
+                    entry["upload"].append(upload)
+        return samples
+
+    def connect_times(self, days: float = 30, hostnames: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Median time-to-connected in ms per relay over the last `days` (successful connects only)."""
+        wanted = set(hostnames) if hostnames is not None else None
+        times: Dict[str, List[float]] = {}
+        for hostname, connect_ms in self._query(
+                "SELECT hostname, latency_ms FROM probes WHERE ts >= ? AND kind = ? AND ok = 1",
+                (time.time() - days * SECONDS_PER_DAY, KIND_CONNECT)):
+            if wanted is None or hostname in wanted:
+                times.setdefault(hostname, []).append(connect_ms)
+        return {hostname: _median(sorted(samples)) for hostname, samples in times.items()}
+
+    def count(self) -> int:
+        return next(self._query("SELECT COUNT(*) FROM probes"))[0]
+
+    def prune(self, older_than_days: float) -> int:
+        """Delete probes older than the given age. Returns the number of deleted rows."""
+        conn = self._connect()
+        try:
+            with conn:
+                deleted = conn.execute("DELETE FROM probes WHERE ts < ?",
+                                       (time.time() - older_than_days * SECONDS_PER_DAY,)).rowcount
+        finally:
+            conn.close()
+        if deleted:
+            logger.info(f"Pruned {deleted} probes older than {older_than_days} days from history.")
+        return deleted
@@ -0,0 +1,131 @@
+import atexit
+import queue
+import sys
+import threading
+import time
+import logging
+import logging.handlers
+from typing import Optional, List, Dict, Any, Tuple
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_MAX_BYTES = 2 * 1024 * 1024
+LOG_BACKUP_COUNT = 1
+
+# --- Asynchronous Logging Pipeline ---
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(log_file_path: Optional[str], level: int = logging.INFO,
+                  console: bool = True) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a QueueHandler; a QueueListener thread does the
+    formatting and the file/console I/O. Logging calls on the Tk thread and
+    test workers only enqueue the record, so a burst of warnings never blocks
+    them on disk or terminal writes.
+
+    Args:
+        log_file_path: Rotating log file (None to skip the file).
+        level: Root logger level.
+        console: Also log to stdout.
+
+    Returns:
+        The started QueueListener (stopped automatically at exit).
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers: List[logging.Handler] = []
+    if log_file_path:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Flush queued records and stop the listener thread (safe to call twice)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# --- Rate-Limited Warnings ---
+
+class RateLimitedLog:
+    """
+    Drop repeated warnings for the same key (e.g. a relay hostname) and cap the
+    total rate across keys, so a sweep where hundreds of relays time out logs
+    a handful of lines instead of hundreds. Suppressed messages are counted
+    and reported with the next message that gets through.
+
+    Messages use lazy %-style arguments like the logging module; nothing is
+    formatted for suppressed calls.
+    """
+
+    def __init__(self, logger: logging.Logger, per_key_interval_sec: float = 300.0,
+                 max_per_window: int = 10, window_sec: float = 10.0):
+        self.logger = logger
+        self.per_key_interval_sec = per_key_interval_sec
+        self.max_per_window = max_per_window
+        self.window_sec = window_sec
+        self._lock = threading.Lock()
+        self._last_by_key: Dict[Any, float] = {}
+        self._window_start = 0.0
+        self._window_count = 0
+        self.suppressed = 0 # Suppressed since the last emitted message
+
+    def _allow(self, key: Any) -> Tuple[bool, int]:
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_by_key.get(key)
+            if last is not None and now - last < self.per_key_interval_sec:
+                self.suppressed += 1
+                return False, 0
+            if now - self._window_start >= self.window_sec:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count >= self.max_per_window:
+                self.suppressed += 1
+                return False, 0
+            self._window_count += 1
+            self._last_by_key[key] = now
+            if len(self._last_by_key) > 4096: # Forget stale keys
+                cutoff = now - self.per_key_interval_sec
+                self._last_by_key = {k: t for k, t in self._last_by_key.items() if t >= cutoff}
+            suppressed, self.suppressed = self.suppressed, 0
+            return True, suppressed
+
+    def log(self, level: int, key: Any, msg: str, *args: Any):
+        if not self.logger.isEnabledFor(level):
+            return
+        allowed, suppressed = self._allow(key)
+        if not allowed:
+            return
+        if suppressed:
+            self.logger.log(level, msg + " (%d similar messages suppressed)", *args, suppressed)
+        else:
+            self.logger.log(level, msg, *args)
+
+    def warning(self, key: Any, msg: str, *args: Any):
+        self.log(logging.WARNING, key, msg, *args)
+
+    def error(self, key: Any, msg: str, *args: Any):
+        self.log(logging.ERROR, key, msg, *args)
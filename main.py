@@ -1,13 +1,12 @@
+import time
+
+_STARTED_AT = time.perf_counter() # Reference point for startup timings
 
-import tkinter as tk
-from tkinter import ttk, messagebox
 import sys
 import os
 import platform
-import threading
 import logging
-import logging.handlers
-import subprocess
+# tkinter is imported with the GUI (gui.py) once logging is up; see benchmarks/import_budget.py
 
 # --- Setup Logging ---
 try:
@@ -16,22 +15,10 @@ try:
     os.makedirs(config_dir, exist_ok=True)
     log_file_path = os.path.expanduser("~/mullvad_finder.log") # Log in home dir
 
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    # Use rotating file handler to limit log file size
-    log_handler = logging.handlers.RotatingFileHandler(
-        log_file_path, maxBytes=2*1024*1024, backupCount=1, encoding='utf-8'
-    )
-    log_handler.setFormatter(logging.Formatter(log_format))
-
-    logging.basicConfig(
-        level=logging.INFO, # Default level, can be changed
-        # level=logging.DEBUG, # Uncomment for more detailed logs
-        format=log_format,
-        handlers=[
-            log_handler,
-            logging.StreamHandler(sys.stdout) # Also log to console
-        ]
-    )
+    # Records are queued by the calling thread; a listener thread writes the
+    # rotating log file and the console, so workers never block on log I/O
+    from log_utils import setup_logging
+    setup_logging(log_file_path, level=logging.INFO) # logging.DEBUG for more detailed logs
     logger = logging.getLogger(__name__)
     logger.info(f"Logging initialized. Log file: {log_file_path}")
 
@@ -43,6 +30,15 @@ except Exception as e:
      logger.error(f"Logging setup failed: {e}")
 
 
+def show_fatal_error(title: str, message: str):
+    """Error dialog for failures before the main window exists (stderr if Tk is unavailable)."""
+    try:
+        from tkinter import messagebox
+        messagebox.showerror(title, message)
+    except Exception:
+        print(f"{title}: {message}", file=sys.stderr)
+
+
 # --- Add project root to path ---
 # This ensures modules can be imported correctly, especially when run directly
 try:
@@ -55,11 +51,11 @@ try:
     from gui import MullvadFinderApp
 except ImportError as e:
      logger.exception("Failed to import MullvadFinderApp. Critical dependency missing?")
-     messagebox.showerror("Startup Error", f"Failed to load application components:\n{e}\n\nPlease ensure all files are present.")
+     show_fatal_error("Startup Error", f"Failed to load application components:\n{e}\n\nPlease ensure all files are present.")
      sys.exit(1)
 except Exception as e:
      logger.exception("An unexpected error occurred during initial imports.")
-     messagebox.showerror("Startup Error", f"An unexpected error occurred on startup:\n{e}")
+     show_fatal_error("Startup Error", f"An unexpected error occurred on startup:\n{e}")
      sys.exit(1)
 
 
@@ -99,30 +95,28 @@ def set_dpi_awareness():
 def check_dependencies() -> bool:
     """Check if the Mullvad CLI is installed and accessible."""
     logger.info("Checking for Mullvad CLI dependency...")
+    from mullvad_client import get_client, MullvadCLINotFoundError, MullvadCommandTimeoutError
     try:
-        # Use 'mullvad version' as a simple check command
-        # Set encoding explicitly for subprocess output
-        result = subprocess.run(
-            ['mullvad', 'version'],
-            capture_output=True, text=True, check=False, timeout=5, encoding='utf-8'
-        )
+        # Use 'mullvad version' as a simple check command (through the configured backend, see mullvad_client)
+        client = get_client()
+        result = client.call(client.execute(['version'], timeout=5))
         # --- MODIFIED CONDITION ---
         # If return code is 0, consider the CLI present and functional enough.
         if result.returncode == 0:
             # Log the actual version output for debugging if needed
-            version_output = result.stdout.strip()
+            version_output = result.stdout
             logger.info(f"Mullvad CLI check successful. Output: '{version_output}'")
             return True
         # --- END MODIFIED CONDITION ---
         else:
             # Log error if return code is non-zero
-            stderr_output = result.stderr.strip()
+            stderr_output = result.stderr
             logger.error(f"Mullvad CLI check command failed. Return code: {result.returncode}, Stderr: '{stderr_output}'")
             return False
-    except FileNotFoundError:
+    except MullvadCLINotFoundError:
         logger.error("Mullvad CLI command ('mullvad') not found in PATH.")
         return False
-    except subprocess.TimeoutExpired:
+    except MullvadCommandTimeoutError:
         logger.error("Mullvad CLI check command timed out.")
         return False
     except Exception as e:
@@ -137,19 +131,13 @@ def main():
     logger.info("--- Mullvad Server Finder Application Starting ---")
     set_dpi_awareness()
 
-    # Check critical dependencies
-    if not check_dependencies():
-        logger.critical("Mullvad CLI dependency check failed. Application cannot continue.")
-        messagebox.showerror(
-            "Dependency Error",
-            "Mullvad CLI ('mullvad') not found or not working.\n\n"
-            "Please ensure the Mullvad VPN client is installed correctly "
-            "and the 'mullvad' command is accessible in your system's PATH."
-        )
-        sys.exit(1)
+    # The Mullvad CLI check runs in the background once the window is shown
+    # (see MullvadFinderApp.start_background_tasks)
 
 
     # --- Initialize Tkinter Root ---
+    import tkinter as tk # Already loaded by gui
+    from tkinter import messagebox
     root = tk.Tk()
     root.withdraw() # Hide the window initially
 
@@ -160,11 +148,15 @@ def main():
 
     # --- Initialize and Run Application ---
     try:
-        app = MullvadFinderApp(root)
+        app = MullvadFinderApp(root, started_at=_STARTED_AT)
         root.deiconify() # Show the window after initialization
+        # Idle callbacks run after the pending map/draw work, i.e. once the first frame is up
+        root.after_idle(lambda: logger.info(f"Time to first frame: {(time.perf_counter() - _STARTED_AT) * 1000:.0f} ms"))
+        root.after_idle(lambda: app.start_background_tasks(dependency_check=check_dependencies))
         logger.info("Starting Tkinter main loop...")
         root.mainloop()
         logger.info("Tkinter main loop finished.")
+        app.shutdown()
 
     except Exception as e:
          logger.exception("An unhandled exception occurred during application execution.")
@@ -1,9 +1,14 @@
 
-import subprocess
+import threading
 import json
 import os
+import re
+import time
+import hashlib
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+from config import write_json_atomic
 
 # Setup logger for this module
 logger = logging.getLogger(__name__)
@@ -30,48 +35,182 @@ def load_cached_servers(cache_path: str) -> Optional[Dict[str, Any]]:
         logger.exception(f"Error loading cached servers from {cache_path}: {e}")
         return None
 
+# --- Relay List from the Mullvad CLI ---
+
+# Regexes for `mullvad relay list` output, e.g.:
+#   Sweden (se)
+#   \tGothenburg (got) @ 57.70887°N, 11.97456°E
+#   \t\tse-got-wg-001 (185.213.154.66, 2a03:1b20:5:f011::a01f) - WireGuard, hosted by 31173 (Mullvad-owned)
+_COUNTRY_LINE_RE = re.compile(r'^(?P<name>.+?) \((?P<code>[\w-]+)\)$')
+_CITY_LINE_RE = re.compile(
+    r'^(?P<name>.+?) \((?P<code>[\w-]+)\)'
+    r'(?: @ (?P<lat>[\d.]+)°(?P<ns>[NS]), (?P<lon>[\d.]+)°(?P<ew>[EW]))?$'
+)
+_RELAY_LINE_RE = re.compile(
+    r'^(?P<hostname>\S+) \((?P<ipv4>[^,)]+)(?:, (?P<ipv6>[^)]+))?\) - (?P<type>[\w-]+)'
+    r'(?:, hosted by (?P<provider>.+?))?(?: \((?P<ownership>Mullvad-owned|rented)\))?$'
+)
+
+def _endpoint_data_for(relay_type: str) -> Any:
+    """Map a CLI relay type to the 'endpoint_data' shape used in relays.json."""
+    relay_type = relay_type.lower()
+    if relay_type == "wireguard":
+        return {"wireguard": {}}
+    if relay_type == "openvpn":
+        return "openvpn"
+    return "bridge"
+
+def parse_relay_list(output: str) -> Dict[str, Any]:
+    """
+    Parse `mullvad relay list` output into the relays.json structure
+    ({"countries": [{"name", "code", "cities": [{"name", "code", "relays": [...]}]}]}).
+    Lines that don't match any known format are skipped.
+    """
+    countries: List[Dict[str, Any]] = []
+    country: Optional[Dict[str, Any]] = None
+    city: Optional[Dict[str, Any]] = None
+
+    for raw_line in output.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        indented = raw_line[:1].isspace()
+
+        if not indented:
+            match = _COUNTRY_LINE_RE.match(line)
+            if match:
+                country = {"name": match.group("name"), "code": match.group("code"), "cities": []}
+                countries.append(country)
+                city = None
+            continue
+
+        relay_match = _RELAY_LINE_RE.match(line)
+        if relay_match and city is not None:
+            city["relays"].append({
+                "hostname": relay_match.group("hostname"),
+                "ipv4_addr_in": relay_match.group("ipv4"),
+                "ipv6_addr_in": relay_match.group("ipv6"),
+                "provider": relay_match.group("provider") or "",
+                "owned": relay_match.group("ownership") == "Mullvad-owned",
+                "active": True, # The CLI only lists usable relays
+                "endpoint_data": _endpoint_data_for(relay_match.group("type")),
+            })
+            continue
+
+        city_match = _CITY_LINE_RE.match(line)
+        if city_match and country is not None:
+            city = {"name": city_match.group("name"), "code": city_match.group("code"), "relays": []}
+            if city_match.group("lat"):
+                lat = float(city_match.group("lat"))
+                lon = float(city_match.group("lon"))
+                city["latitude"] = -lat if city_match.group("ns") == "S" else lat
+                city["longitude"] = -lon if city_match.group("ew") == "W" else lon
+            country["cities"].append(city)
+
+    return {"countries": countries}
+
+def _load_relay_list_cache(cache_path: str) -> Optional[Dict[str, Any]]:
+    """Load the cached CLI relay list envelope ({"fingerprint", "fetched_at", "data"})."""
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r", encoding='utf-8') as f:
+            cached = json.load(f)
+        if isinstance(cached, dict) and isinstance(cached.get("data"), dict):
+            return cached
+        logger.warning(f"Ignoring malformed relay list cache: {cache_path}")
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not read relay list cache {cache_path}: {e}")
+    return None
+
+def fetch_relay_list_from_cli(cache_path: str, max_age_sec: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Ask the Mullvad CLI for the relay list and cache the normalized result.
+
+    The raw CLI output is fingerprinted (SHA-256); when it matches the cached
+    fingerprint the cached catalog is reused without re-parsing it.
+    If the CLI is unavailable, a stale cache is returned when present.
+
+    Args:
+        cache_path: Where to keep the normalized relay list.
+        max_age_sec: Skip the CLI entirely when the cache is younger than this.
+
+    Returns:
+        relays.json-shaped data, or None if neither the CLI nor the cache work.
+    """
+    cached = _load_relay_list_cache(cache_path)
+    if cached and max_age_sec is not None and time.time() - cached.get("fetched_at", 0) < max_age_sec:
+        logger.info(f"Using fresh relay list cache from {cache_path}")
+        return cached["data"]
+
+    try:
+        output = _run_mullvad_command(['mullvad', 'relay', 'list'])
+    except MullvadCLIError as e:
+        if cached:
+            logger.warning(f"Mullvad relay list unavailable ({e}). Using stale cache from {cache_path}")
+            return cached["data"]
+        logger.error(f"Mullvad relay list unavailable and no cache at {cache_path}: {e}")
+        return None
+
+    fingerprint = hashlib.sha256(output.encode('utf-8')).hexdigest()
+    if cached and cached.get("fingerprint") == fingerprint:
+        logger.info("Relay list unchanged since last fetch (fingerprint match).")
+        cached["fetched_at"] = time.time()
+        data = cached["data"]
+    else:
+        data = parse_relay_list(output)
+        relay_count = sum(len(c.get("relays", [])) for country in data["countries"] for c in country["cities"])
+        logger.info(f"Parsed {relay_count} relays from Mullvad CLI relay list.")
+        if not data["countries"]:
+            logger.error("Mullvad CLI relay list produced no countries.")
+            return cached["data"] if cached else None
+        cached = {"fingerprint": fingerprint, "source": "mullvad relay list", "data": data,
+                  "fetched_at": time.time()}
+
+    try:
+        write_json_atomic(cache_path, cached)
+    except OSError as e:
+        logger.warning(f"Could not write relay list cache {cache_path}: {e}")
+    return data
+
+def load_relay_data(cache_path: str, cli_cache_path: str, cli_max_age_sec: Optional[float] = 3600) -> Optional[Dict[str, Any]]:
+    """
+    Load relay data from the Mullvad relays.json cache, falling back to the
+    CLI relay list (cached at cli_cache_path) when the file is missing or invalid.
+    """
+    data = load_cached_servers(cache_path)
+    if data:
+        return data
+    logger.info("Falling back to the Mullvad CLI relay list.")
+    return fetch_relay_list_from_cli(cli_cache_path, max_age_sec=cli_max_age_sec)
+
+# --- Commands (sync wrappers around mullvad_client.MullvadClient) ---
+
+def _client():
+    from mullvad_client import get_client # asyncio is only loaded once a command runs
+    return get_client()
+
 def _run_mullvad_command(cmd: list[str]) -> str:
-    """Helper function to run Mullvad CLI commands and handle errors."""
-    command_str = ' '.join(cmd)
-    logger.info(f"Running Mullvad command: {command_str}")
+    """Run a Mullvad CLI command on the shared client and return its stdout. Raises MullvadCLIError."""
+    client = _client()
     try:
-        # Added timeout to prevent hanging indefinitely
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False, timeout=30)
-
-        if result.returncode != 0:
-            error_message = f"Mullvad command failed (code {result.returncode}): {command_str}\nStderr: {result.stderr.strip()}"
-            logger.error(error_message)
-            raise MullvadCLIError(error_message)
-
-        logger.info(f"Mullvad command successful: {command_str}")
-        return result.stdout.strip()
-    except FileNotFoundError:
-        logger.exception("Mullvad CLI command not found. Is Mullvad installed and in PATH?")
-        raise MullvadCLIError("Mullvad CLI not found. Ensure Mullvad VPN is installed and CLI is accessible.")
-    except subprocess.TimeoutExpired:
-        logger.error(f"Mullvad command timed out: {command_str}")
-        raise MullvadCLIError(f"Mullvad command timed out: {command_str}")
+        return client.call(client.run(cmd[1:]))
+    except MullvadCLIError:
+        raise
     except Exception as e:
-        logger.exception(f"An unexpected error occurred while running Mullvad command: {command_str}")
+        logger.exception(f"An unexpected error occurred while running Mullvad command: {' '.join(cmd)}")
         raise MullvadCLIError(f"An unexpected error occurred: {e}")
 
 
 def set_mullvad_location(country_code: str, city_code: Optional[str] = None, hostname: Optional[str] = None) -> str:
     """Set Mullvad location to the given country, city, and server."""
-    cmd = ['mullvad', 'relay', 'set', 'location']
-
     if not country_code:
          err = "Country code is required to set location."
          logger.error(err)
          raise ValueError(err)
 
-    cmd.append(country_code)
-    if city_code:
-        cmd.append(city_code)
-        if hostname:
-            cmd.append(hostname)
-
-    return _run_mullvad_command(cmd)
+    client = _client()
+    return client.call(client.set_location(country_code, city_code, hostname))
 
 def set_mullvad_protocol(protocol: str) -> str:
     """Set Mullvad tunneling protocol (openvpn or wireguard)."""
@@ -81,27 +220,28 @@ def set_mullvad_protocol(protocol: str) -> str:
         logger.error(err)
         raise ValueError(err)
 
-    cmd = ['mullvad', 'relay', 'set', 'tunnel-protocol', protocol]
-    return _run_mullvad_command(cmd)
+    client = _client()
+    return client.call(client.set_tunnel_protocol(protocol))
 
 def get_mullvad_status() -> str:
     """Get the current Mullvad connection status."""
-    cmd = ['mullvad', 'status']
     # Don't raise MullvadCLIError here, as status checks might run when CLI isn't fully functional
     # Let the caller handle potential exceptions more gracefully.
+    from mullvad_client import MullvadCLINotFoundError, MullvadCommandTimeoutError
+    client = _client()
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False, timeout=10)
-        if result.returncode != 0:
-            logger.warning(f"Mullvad status command failed (code {result.returncode}): {result.stderr.strip()}")
+        result = client.call(client.execute(["status"]))
+        if not result.ok:
+            logger.warning(f"Mullvad status command failed (code {result.returncode}): {result.stderr}")
             # Return a specific status indicating the issue
             if "Mullvad VPN daemon is not running" in result.stderr:
                 return "Daemon not running"
             return "Status unavailable"
-        return result.stdout.strip()
-    except FileNotFoundError:
+        return result.stdout
+    except MullvadCLINotFoundError:
         logger.error("Mullvad CLI command not found during status check.")
         return "CLI not found"
-    except subprocess.TimeoutExpired:
+    except MullvadCommandTimeoutError:
         logger.warning("Mullvad status command timed out.")
         return "Status timed out"
     except Exception as e:
@@ -111,10 +251,187 @@ def get_mullvad_status() -> str:
 
 def connect_mullvad() -> str:
     """Connect to Mullvad VPN using the currently set location/protocol."""
-    cmd = ['mullvad', 'connect']
-    return _run_mullvad_command(cmd)
+    client = _client()
+    return client.call(client.connect())
 
 def disconnect_mullvad() -> str:
     """Disconnect from Mullvad VPN."""
-    cmd = ['mullvad', 'disconnect']
-    return _run_mullvad_command(cmd)
+    client = _client()
+    return client.call(client.disconnect())
+
+
+# --- Status Stream ---
+
+class StatusStreamParser:
+    """
+    Incremental parser for `mullvad status listen` output.
+
+    Each state change starts with an unindented line ("Connected",
+    "Disconnected", "Connecting to ...") optionally followed by indented
+    detail lines. feed() returns the status text (same shape as the output
+    of `mullvad status`) whenever it changes.
+    """
+
+    def __init__(self):
+        self._lines: List[str] = []
+        self._last_emitted: Optional[str] = None
+
+    def feed(self, line: str) -> Optional[str]:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            return None
+        if line[0].isspace():
+            if not self._lines:
+                return None # Detail line without a state header
+            self._lines.append(line)
+        else:
+            self._lines = [line] # New state block
+        status = "\n".join(self._lines)
+        if status == self._last_emitted:
+            return None
+        self._last_emitted = status
+        return status
+
+
+class MullvadStatusListener:
+    """
+    Keeps the connection status up to date from one long-lived
+    `mullvad status listen` stream (opened through the shared MullvadClient,
+    so it follows the configured backend).
+
+    The stream is restarted with exponential backoff when it exits. If it
+    fails immediately several times in a row (CLI missing or too old to
+    support 'listen'), the listener falls back to polling `mullvad status`
+    with an adaptive interval: fast while the state changes, backing off
+    while it stays the same.
+    """
+
+    STREAM_CMD = ['mullvad', 'status', 'listen']
+    MIN_BACKOFF_SEC = 1.0
+    MAX_BACKOFF_SEC = 60.0
+    STABLE_STREAM_SEC = 30.0 # A stream that ran this long resets the backoff
+    MAX_FAST_FAILURES = 3 # Consecutive quick failures before falling back to polling
+    MIN_POLL_SEC = 2.0
+    MAX_POLL_SEC = 60.0
+
+    def __init__(self, callback):
+        """
+        Args:
+            callback: Called from the listener thread with the new status text.
+        """
+        self.callback = callback
+        self.streaming_available = True
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._stream = None # mullvad_client.CommandStream while streaming
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="mullvad-status-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the listener and terminate the stream subprocess."""
+        self._stop_event.set()
+        self._wake_event.set()
+        stream = self._stream
+        if stream is not None and stream.running:
+            try:
+                _client().submit(stream.close()).result(timeout=3)
+            except Exception as e:
+                logger.debug(f"Error terminating status stream: {e}")
+
+    def refresh(self):
+        """Ask for an immediate status check (only meaningful while polling)."""
+        self._wake_event.set()
+
+    def _emit(self, status: str):
+        try:
+            self.callback(status)
+        except Exception as e:
+            logger.exception(f"Error in status listener callback: {e}")
+
+    def _run(self):
+        # The stream only reports changes, so fetch the current state once first
+        self._emit(get_mullvad_status())
+        backoff = self.MIN_BACKOFF_SEC
+        fast_failures = 0
+
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            received_output = self._stream_once()
+            if self._stop_event.is_set():
+                break
+            ran_for = time.monotonic() - started
+
+            if ran_for >= self.STABLE_STREAM_SEC:
+                backoff, fast_failures = self.MIN_BACKOFF_SEC, 0
+            elif not received_output:
+                fast_failures += 1
+                if fast_failures >= self.MAX_FAST_FAILURES:
+                    logger.warning("Status stream unavailable, falling back to polling 'mullvad status'.")
+                    self.streaming_available = False
+                    self._poll_loop()
+                    return
+
+            logger.info(f"Status stream ended after {ran_for:.1f}s, restarting in {backoff:.0f}s.")
+            self._emit(get_mullvad_status()) # Don't show a stale state while waiting
+            if self._stop_event.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.MAX_BACKOFF_SEC)
+
+    def _stream_once(self) -> bool:
+        """Run one `status listen` stream until it exits. Returns True if it produced output."""
+        client = _client()
+        parser = StatusStreamParser()
+        received_output = False
+        try:
+            stream = self._stream = client.call(client.open_stream(self.STREAM_CMD[1:]))
+        except MullvadCLIError as e:
+            logger.error(f"Cannot start status stream: {e}")
+            return False
+        except Exception as e:
+            logger.exception(f"Failed to start status stream: {e}")
+            return False
+
+        logger.info("Status stream started.")
+        try:
+            # Lines are read on the client's loop; callbacks still run on this thread
+            while not self._stop_event.is_set():
+                line = client.call(stream.readline())
+                if not line:
+                    break
+                received_output = True
+                status = parser.feed(line)
+                if status is not None:
+                    self._emit(status)
+        except Exception as e:
+            if not self._stop_event.is_set():
+                logger.warning(f"Error reading status stream: {e}")
+        finally:
+            self._stream = None
+            try:
+                client.call(stream.close(), timeout=5)
+            except Exception as e:
+                logger.debug(f"Error closing status stream: {e}")
+            if stream.returncode not in (0, None) and not self._stop_event.is_set():
+                logger.warning(f"Status stream exited with code {stream.returncode}: {getattr(stream, 'stderr', '')}")
+        return received_output
+
+    def _poll_loop(self):
+        """Fallback: poll `mullvad status`, backing off while the state is unchanged."""
+        interval = self.MIN_POLL_SEC
+        last_status: Optional[str] = None
+        while not self._stop_event.is_set():
+            status = get_mullvad_status()
+            if status != last_status:
+                self._emit(status)
+                last_status = status
+                interval = self.MIN_POLL_SEC
+            else:
+                interval = min(interval * 1.5, self.MAX_POLL_SEC)
+            self._wake_event.wait(interval)
+            self._wake_event.clear()
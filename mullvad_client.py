@@ -0,0 +1,406 @@
+import abc
+import asyncio
+import contextlib
+import os
+import re
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Optional, List, Dict, Any, Sequence, Awaitable, AsyncIterator, NamedTuple
+
+from mullvad_api import MullvadCLIError
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+MULLVAD_BINARY = "mullvad"
+BACKEND_ENV_VAR = "MULLVAD_FINDER_BACKEND" # "fake" runs everything against mullvad_fake (no VPN needed)
+DEFAULT_TIMEOUT_SEC = 30.0
+READ_CONCURRENCY = 4 # Read-only commands allowed to run at the same time
+# Per-command timeouts, by leading arguments (longest prefix wins)
+COMMAND_TIMEOUTS_SEC: Dict[Sequence[str], float] = {
+    ("status",): 10.0,
+    ("version",): 10.0,
+    ("relay", "list"): 30.0,
+    ("relay", "update"): 60.0,
+}
+# Subcommands that only read state; everything else is serialized
+READ_ONLY_COMMANDS = {"status", "version"}
+READ_ONLY_ACTIONS = {"list", "get"}
+
+class MullvadCLINotFoundError(MullvadCLIError):
+    """Custom exception for a missing Mullvad CLI executable."""
+    pass
+
+class MullvadCommandTimeoutError(MullvadCLIError):
+    """Custom exception for a Mullvad CLI command that did not finish in time."""
+    pass
+
+
+# --- Results ---
+
+class CommandResult(NamedTuple):
+    """Finished CLI command."""
+    args: List[str]
+    returncode: int
+    stdout: str
+    stderr: str
+    elapsed_ms: float
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+class MullvadStatus(NamedTuple):
+    """Parsed `mullvad status` output."""
+    state: str # connected, connecting, disconnected, disconnecting, blocked or unknown
+    hostname: Optional[str]
+    location: Optional[str]
+    text: str # Original output
+
+    @property
+    def tunnel_up(self) -> bool:
+        """Connected or connecting, i.e. a new location reconnects without `mullvad connect`."""
+        return self.state in ("connected", "connecting")
+
+    def is_connected_to(self, hostname: str) -> bool:
+        return self.state == "connected" and (
+            (self.hostname or "").lower() == hostname.lower() or hostname.lower() in self.text.lower())
+
+_STATES = ("connected", "connecting", "disconnected", "disconnecting", "blocked")
+# "Connected to se-got-wg-001 in Gothenburg, Sweden" (older CLIs put everything on the first line)
+_HEADER_RE = re.compile(r'^(?P<state>\w+):?(?: to (?P<hostname>\S+))?(?: in (?P<location>.+))?')
+# Detail lines of newer CLIs: "    Relay: se-got-wg-001", "    Visible location: Sweden, Gothenburg. IPv4: ..."
+_RELAY_LINE_RE = re.compile(r'^\s+Relay:\s*(?P<hostname>\S+)', re.MULTILINE)
+_LOCATION_LINE_RE = re.compile(r'^\s+Visible location:\s*(?P<location>[^.\n]+)', re.MULTILINE)
+
+def parse_status(text: str) -> MullvadStatus:
+    """Parse `mullvad status` (or one `status listen` block) into a MullvadStatus."""
+    text = text.strip()
+    header = _HEADER_RE.match(text)
+    state = header.group("state").lower() if header else ""
+    if state not in _STATES:
+        return MullvadStatus("unknown", None, None, text)
+    hostname = header.group("hostname")
+    location = header.group("location")
+    relay_line = _RELAY_LINE_RE.search(text)
+    if relay_line:
+        hostname = relay_line.group("hostname")
+    location_line = _LOCATION_LINE_RE.search(text)
+    if location_line and not location:
+        location = location_line.group("location").strip()
+    return MullvadStatus(state, hostname.rstrip(".") if hostname else None, location, text)
+
+# "    Tunnel protocol: WireGuard" (or "any") in the constraints printed by `relay get`
+_TUNNEL_PROTOCOL_RE = re.compile(r'^\s*Tunnel protocol:\s*(?P<protocol>[\w-]+)', re.MULTILINE | re.IGNORECASE)
+
+def parse_tunnel_protocol(text: str) -> Optional[str]:
+    """Tunnel protocol setting from `relay get` output: "wireguard", "openvpn", "any" or None if not shown."""
+    match = _TUNNEL_PROTOCOL_RE.search(text)
+    return match.group("protocol").lower() if match else None
+
+
+def is_read_only(args: Sequence[str]) -> bool:
+    """True for commands that only query state (status, version, `<x> list`, `<x> get`)."""
+    if not args:
+        return False
+    if args[0] in READ_ONLY_COMMANDS:
+        return len(args) == 1 or args[1] != "listen" # `status listen` is a stream, see open_stream()
+    return len(args) > 1 and args[1] in READ_ONLY_ACTIONS
+
+def command_timeout(args: Sequence[str]) -> float:
+    for length in range(len(args), 0, -1):
+        timeout = COMMAND_TIMEOUTS_SEC.get(tuple(args[:length]))
+        if timeout is not None:
+            return timeout
+    return DEFAULT_TIMEOUT_SEC
+
+
+# --- Backends ---
+
+class CommandStream(abc.ABC):
+    """Stdout of a long-running command such as `status listen`, line by line."""
+
+    returncode: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self.returncode is None
+
+    @abc.abstractmethod
+    async def readline(self) -> str:
+        """Next line including its newline; "" once the command has exited."""
+
+    @abc.abstractmethod
+    async def close(self):
+        """Stop the command (idempotent)."""
+
+class MullvadBackend(abc.ABC):
+    """
+    Executes Mullvad CLI commands for a MullvadClient, which adds the locking,
+    timeouts and logging. CLIBackend runs the real `mullvad` binary;
+    mullvad_fake.FakeMullvadBackend simulates the daemon in-process.
+    """
+
+    name = "backend"
+
+    @abc.abstractmethod
+    async def execute(self, args: List[str], timeout: float) -> CommandResult:
+        """Run one command. Raises MullvadCLINotFoundError/MullvadCommandTimeoutError; exit codes are returned."""
+
+    @abc.abstractmethod
+    async def open_stream(self, args: List[str]) -> CommandStream:
+        """Start a long-running command and return its output stream."""
+
+
+class _ProcessStream(CommandStream):
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self._proc = proc
+        self.stderr = ""
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self._proc.returncode
+
+    async def readline(self) -> str:
+        return (await self._proc.stdout.readline()).decode(errors='replace')
+
+    async def close(self):
+        proc = self._proc
+        if proc.returncode is None:
+            try:
+                proc.terminate()
+                await asyncio.wait_for(proc.wait(), 2)
+            except ProcessLookupError:
+                pass
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        elif proc.returncode != 0 and not self.stderr:
+            try:
+                self.stderr = (await asyncio.wait_for(proc.stderr.read(), 1)).decode(errors='replace').strip()
+            except asyncio.TimeoutError:
+                pass
+
+class CLIBackend(MullvadBackend):
+    """Runs the `mullvad` executable with asyncio subprocesses."""
+
+    name = "cli"
+
+    def __init__(self, binary: str = MULLVAD_BINARY):
+        self.binary = binary
+
+    async def execute(self, args: List[str], timeout: float) -> CommandResult:
+        command_str = ' '.join([self.binary] + args)
+        started = time.monotonic()
+        try:
+            proc = await asyncio.create_subprocess_exec(self.binary, *args, stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError:
+            raise MullvadCLINotFoundError("Mullvad CLI not found. Ensure Mullvad VPN is installed and CLI is accessible.")
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise MullvadCommandTimeoutError(f"Mullvad command timed out after {timeout:.0f}s: {command_str}")
+        return CommandResult(args, proc.returncode, stdout.decode(errors='replace').strip(),
+                             stderr.decode(errors='replace').strip(), (time.monotonic() - started) * 1000.0)
+
+    async def open_stream(self, args: List[str]) -> CommandStream:
+        try:
+            proc = await asyncio.create_subprocess_exec(self.binary, *args, stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError:
+            raise MullvadCLINotFoundError("Mullvad CLI not found. Ensure Mullvad VPN is installed and CLI is accessible.")
+        return _ProcessStream(proc)
+
+def default_backend() -> MullvadBackend:
+    """CLIBackend, or the fake when MULLVAD_FINDER_BACKEND=fake."""
+    if os.environ.get(BACKEND_ENV_VAR, "").lower() == "fake":
+        from mullvad_fake import FakeMullvadBackend
+        logger.warning("Using the simulated Mullvad backend (MULLVAD_FINDER_BACKEND=fake).")
+        return FakeMullvadBackend()
+    return CLIBackend()
+
+
+# --- Client ---
+
+class MullvadClient:
+    """
+    Runs Mullvad CLI commands through a backend (by default asyncio
+    subprocesses, see MullvadBackend) on one background event loop shared by
+    all callers.
+
+    State-changing commands (relay set, connect, disconnect, ...) are
+    serialized by a lock so that e.g. a protocol change and a location change
+    from different threads never interleave; read-only commands (status,
+    relay list, ...) run in parallel, up to READ_CONCURRENCY at a time.
+    exclusive() holds the lock across a sequence of state changes.
+
+    Coroutines are meant to run on the client's loop: async code calls them
+    through submit() (or from other coroutines running there), blocking code
+    through call().
+    """
+
+    def __init__(self, backend: Optional[MullvadBackend] = None, read_concurrency: int = READ_CONCURRENCY):
+        self.backend = backend or default_backend()
+        self.read_concurrency = read_concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._read_semaphore: Optional[asyncio.Semaphore] = None
+        self._write_owner: Optional[asyncio.Task] = None # Task inside exclusive()
+
+    # --- Event Loop ---
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                def run():
+                    asyncio.set_event_loop(loop)
+                    # Created on the loop so they are bound to it
+                    self._write_lock = asyncio.Lock()
+                    self._read_semaphore = asyncio.Semaphore(self.read_concurrency)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+                self._thread = threading.Thread(target=run, daemon=True, name="mullvad-client")
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        """Schedule a coroutine on the client's loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def call(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the client's loop and wait for its result (blocking code only)."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("MullvadClient.call() would deadlock on the client's own loop; await instead.")
+        return self.submit(coro).result(timeout)
+
+    def close(self):
+        """Stop the event loop thread (a later call starts a new one)."""
+        with self._start_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        loop.close()
+
+    # --- Commands ---
+
+    async def execute(self, args: Sequence[str], timeout: Optional[float] = None) -> CommandResult:
+        """
+        Run `mullvad <args>` under the read semaphore or the write lock.
+        Non-zero exit codes are returned, not raised.
+
+        Raises:
+            MullvadCLINotFoundError, MullvadCommandTimeoutError
+        """
+        args = list(args)
+        timeout = command_timeout(args) if timeout is None else timeout
+        logger.debug("Running Mullvad command: mullvad %s", ' '.join(args))
+        if is_read_only(args):
+            async with self._read_semaphore:
+                return await self.backend.execute(args, timeout)
+        if self._write_owner is not None and self._write_owner is asyncio.current_task():
+            return await self.backend.execute(args, timeout) # Already holds the lock (exclusive())
+        async with self._write_lock:
+            return await self.backend.execute(args, timeout)
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self) -> AsyncIterator["MullvadClient"]:
+        """Run several state-changing commands without commands of other callers in between."""
+        async with self._write_lock:
+            self._write_owner = asyncio.current_task()
+            try:
+                yield self
+            finally:
+                self._write_owner = None
+
+    async def run(self, args: Sequence[str], timeout: Optional[float] = None) -> str:
+        """Run a command and return its stdout. Raises MullvadCLIError on failure."""
+        command_str = ' '.join(['mullvad'] + list(args))
+        logger.info(f"Running Mullvad command: {command_str}")
+        try:
+            result = await self.execute(args, timeout)
+        except MullvadCLIError as e:
+            logger.error(str(e))
+            raise
+        if not result.ok:
+            error_message = f"Mullvad command failed (code {result.returncode}): {command_str}\nStderr: {result.stderr}"
+            logger.error(error_message)
+            raise MullvadCLIError(error_message)
+        logger.info(f"Mullvad command successful: {command_str} ({result.elapsed_ms:.0f} ms)")
+        return result.stdout
+
+    async def open_stream(self, args: Sequence[str]) -> CommandStream:
+        """Start a long-running command (e.g. `status listen`). Not serialized."""
+        return await self.backend.open_stream(list(args))
+
+    # --- Typed Commands ---
+
+    async def status(self) -> MullvadStatus:
+        return parse_status(await self.run(["status"]))
+
+    async def version(self) -> str:
+        return await self.run(["version"])
+
+    async def relay_list(self) -> str:
+        """Raw `relay list` output (see mullvad_api.parse_relay_list)."""
+        return await self.run(["relay", "list"])
+
+    async def tunnel_protocol(self) -> Optional[str]:
+        """The daemon's tunnel protocol setting (see parse_tunnel_protocol); a read-only call."""
+        return parse_tunnel_protocol(await self.run(["relay", "get"]))
+
+    async def set_tunnel_protocol(self, protocol: str) -> str:
+        return await self.run(["relay", "set", "tunnel-protocol", protocol])
+
+    async def set_location(self, country_code: str, city_code: Optional[str] = None,
+                           hostname: Optional[str] = None) -> str:
+        args = ["relay", "set", "location", country_code]
+        if city_code:
+            args.append(city_code)
+            if hostname:
+                args.append(hostname)
+        return await self.run(args)
+
+    async def connect(self) -> str:
+        return await self.run(["connect"])
+
+    async def disconnect(self) -> str:
+        return await self.run(["disconnect"])
+
+
+_client: Optional[MullvadClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> MullvadClient:
+    """The process-wide client (its lock only serializes commands issued through the same client)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MullvadClient()
+        return _client
+
+def set_backend(backend: MullvadBackend) -> MullvadClient:
+    """Route all Mullvad commands of this process through `backend` (e.g. a FakeMullvadBackend)."""
+    client = get_client()
+    client.backend = backend
+    return client
+
+def close_client():
+    with _client_lock:
+        if _client is not None:
+            _client.close()
@@ -0,0 +1,297 @@
+import asyncio
+import random
+import time
+import logging
+from typing import Optional, List, Dict, Any, Set, Tuple
+
+from catalog import relay_protocol
+from mullvad_client import (MullvadBackend, CommandStream, CommandResult, MullvadCommandTimeoutError)
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+FAKE_VERSION = "2025.0-fake"
+DEFAULT_COMMAND_LATENCY_SEC = 0.02
+DEFAULT_CONNECT_DELAY_SEC = 0.3 # Connecting -> Connected
+NO_MATCHING_RELAY = "No relay server matches the current settings"
+
+
+class _FakeStream(CommandStream):
+    def __init__(self, backend: "FakeMullvadBackend"):
+        self._backend = backend
+        self._lines: "asyncio.Queue[str]" = asyncio.Queue()
+        self.returncode: Optional[int] = None
+        self.stderr = ""
+
+    def push(self, text: str):
+        for line in text.splitlines():
+            self._lines.put_nowait(line + "\n")
+
+    async def readline(self) -> str:
+        if self.returncode is not None and self._lines.empty():
+            return ""
+        return await self._lines.get()
+
+    async def close(self):
+        if self.returncode is None:
+            self.returncode = 0
+            self._backend._streams.discard(self)
+            self._lines.put_nowait("") # Wake a pending readline()
+
+
+class FakeMullvadBackend(MullvadBackend):
+    """
+    Scriptable in-process stand-in for the Mullvad daemon and CLI, so the
+    connect, failover and status pipelines can run (and be benchmarked)
+    without the VPN installed. Select it with set_backend() or
+    MULLVAD_FINDER_BACKEND=fake.
+
+    Simulated: the connection state machine (Connecting -> Connected after
+    connect_delay_sec, reconnects on a location change while the tunnel is
+    up, Blocked when the chosen relay is blocked or its protocol does not
+    match the tunnel protocol), `status`/`status listen`, `relay get`,
+    `relay list` (from relays.json-shaped data), command latency with
+    jitter, random failures (failure_rate, state-changing commands only) and
+    scripted ones (fail_next(), hang_next()). Must be used from the
+    MullvadClient's loop.
+    """
+
+    name = "fake"
+
+    def __init__(self, relay_data: Optional[Dict[str, Any]] = None,
+                 command_latency_sec: float = DEFAULT_COMMAND_LATENCY_SEC, jitter_sec: float = 0.0,
+                 connect_delay_sec: float = DEFAULT_CONNECT_DELAY_SEC, failure_rate: float = 0.0,
+                 seed: Optional[int] = None, daemon_running: bool = True, supports_listen: bool = True):
+        self.command_latency_sec = command_latency_sec
+        self.jitter_sec = jitter_sec
+        self.connect_delay_sec = connect_delay_sec
+        self.connect_delays: Dict[str, float] = {} # Per-relay override of connect_delay_sec
+        self.failure_rate = failure_rate
+        self.daemon_running = daemon_running
+        self.supports_listen = supports_listen
+        self.blocked_relays: Set[str] = set()
+        self.random = random.Random(seed)
+        self.calls: List[List[str]] = []
+        self.state = "disconnected"
+        self.protocol: Optional[str] = None # None = any
+        self.location: Tuple[Optional[str], Optional[str], Optional[str]] = (None, None, None)
+        self.hostname: Optional[str] = None # Relay of the current connection attempt
+        self.block_reason = ""
+        self.transitions = 0
+        self._relays: Dict[str, Dict[str, Any]] = {}
+        self._relay_data: Dict[str, Any] = {"countries": []}
+        self._scripted: List[Tuple[Tuple[str, ...], str, int, str]] = [] # (prefix, action, returncode, stderr)
+        self._streams: Set[_FakeStream] = set()
+        self._transition: Optional[asyncio.Task] = None
+        if relay_data:
+            self.set_relay_data(relay_data)
+
+    # --- Scripting ---
+
+    def set_relay_data(self, relay_data: Dict[str, Any]):
+        """Relays (relays.json shape) for `relay list` and location checks; none means any location is accepted."""
+        self._relay_data = relay_data
+        self._relays = {}
+        for country in relay_data.get("countries", []):
+            for city in country.get("cities", []):
+                for relay in city.get("relays", []):
+                    self._relays[relay["hostname"]] = dict(relay, country=country.get("name"), country_code=country.get("code"),
+                                                           city=city.get("name"), city_code=city.get("code"))
+
+    def fail_next(self, *prefix: str, returncode: int = 1, stderr: str = "Error: simulated failure", times: int = 1):
+        """Make the next `times` commands starting with `prefix` (e.g. "connect") exit with an error."""
+        self._scripted.extend([(prefix, "fail", returncode, stderr)] * times)
+
+    def hang_next(self, *prefix: str, times: int = 1):
+        """Make the next `times` matching commands hang until the client's timeout."""
+        self._scripted.extend([(prefix, "hang", 0, "")] * times)
+
+    def set_state(self, state: str, hostname: Optional[str] = None, reason: str = ""):
+        """Change the state from outside (e.g. a tunnel drop), as the daemon would report it."""
+        self._cancel_transition()
+        self.state = state
+        self.hostname = hostname or self.hostname
+        self.block_reason = reason
+        self._publish()
+
+    def call_count(self, *prefix: str) -> int:
+        return sum(1 for args in self.calls if tuple(args[:len(prefix)]) == prefix)
+
+    # --- Status ---
+
+    def status_text(self) -> str:
+        if self.state in ("connected", "connecting"):
+            relay = self._relays.get(self.hostname or "", {})
+            where = ", ".join(p for p in (relay.get("city"), relay.get("country")) if p)
+            text = f"{self.state.capitalize()} to {self.hostname}" + (f" in {where}" if where else "")
+            if self.state == "connected":
+                text += f"\n    Tunnel protocol: {self.protocol or relay_protocol(relay)}"
+            return text
+        if self.state == "blocked":
+            return f"Blocked: {self.block_reason or 'simulated error'}"
+        return self.state.capitalize()
+
+    def _publish(self):
+        self.transitions += 1
+        text = self.status_text()
+        for stream in list(self._streams):
+            stream.push(text)
+
+    # --- State Machine ---
+
+    def _cancel_transition(self):
+        if self._transition is not None and not self._transition.done():
+            self._transition.cancel()
+        self._transition = None
+
+    def _target_hostname(self) -> Optional[str]:
+        country_code, city_code, hostname = self.location
+        if hostname:
+            return hostname
+        candidates = [h for h, r in self._relays.items()
+                      if r.get("country_code") == country_code and (not city_code or r.get("city_code") == city_code)]
+        return candidates[0] if candidates else (f"{country_code}-{city_code or 'any'}-fake-001" if country_code else None)
+
+    def _start_connecting(self):
+        self._cancel_transition()
+        self.hostname = self._target_hostname()
+        self.state = "connecting"
+        self._publish()
+        self._transition = asyncio.ensure_future(self._finish_connecting(self.hostname))
+
+    async def _finish_connecting(self, hostname: Optional[str]):
+        await asyncio.sleep(self.connect_delays.get(hostname or "", self.connect_delay_sec))
+        relay = self._relays.get(hostname or "")
+        if hostname is None or hostname in self.blocked_relays:
+            self.state, self.block_reason = "blocked", "Failed to set up the tunnel (simulated)"
+        elif relay is not None and self.protocol and relay_protocol(relay) not in (self.protocol, "unknown"):
+            self.state, self.block_reason = "blocked", NO_MATCHING_RELAY
+        else:
+            self.state, self.block_reason = "connected", ""
+        self._publish()
+
+    # --- Backend ---
+
+    def _scripted_action(self, args: List[str]) -> Optional[Tuple[str, int, str]]:
+        for index, (prefix, action, returncode, stderr) in enumerate(self._scripted):
+            if tuple(args[:len(prefix)]) == prefix:
+                del self._scripted[index]
+                return action, returncode, stderr
+        return None
+
+    async def execute(self, args: List[str], timeout: float) -> CommandResult:
+        started = time.monotonic()
+        self.calls.append(list(args))
+        latency = self.command_latency_sec + (self.random.uniform(0, self.jitter_sec) if self.jitter_sec else 0.0)
+        scripted = self._scripted_action(args)
+        if scripted and scripted[0] == "hang":
+            latency = timeout
+        if latency >= timeout:
+            await asyncio.sleep(timeout)
+            raise MullvadCommandTimeoutError(f"Mullvad command timed out after {timeout:.0f}s: mullvad {' '.join(args)}")
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+        def result(returncode: int = 0, stdout: str = "", stderr: str = "") -> CommandResult:
+            return CommandResult(list(args), returncode, stdout, stderr, (time.monotonic() - started) * 1000.0)
+
+        if not self.daemon_running:
+            return result(1, stderr="Error: Mullvad VPN daemon is not running")
+        if scripted:
+            return result(scripted[1], stderr=scripted[2])
+        mutating = args[:1] not in (["status"], ["version"]) and args[1:2] not in (["list"], ["get"])
+        if mutating and self.failure_rate and self.random.random() < self.failure_rate:
+            return result(1, stderr="Error: simulated random failure")
+        return self._handle(args, result)
+
+    def _handle(self, args: List[str], result) -> CommandResult:
+        if args == ["status"]:
+            return result(stdout=self.status_text())
+        if args == ["version"]:
+            return result(stdout=f"Current version: {FAKE_VERSION}")
+        if args == ["relay", "list"]:
+            return result(stdout=format_relay_list(self._relay_data))
+        if args == ["relay", "get"]:
+            location = " ".join(part for part in self.location if part) or "any"
+            return result(stdout=f"Generic constraints\n    Location: {location}\n"
+                                 f"    Tunnel protocol: {self.protocol or 'any'}\n"
+                                 f"    Provider(s): any\n    Ownership: any")
+        if args[:3] == ["relay", "set", "tunnel-protocol"] and len(args) == 4:
+            if args[3] not in ("wireguard", "openvpn", "any"):
+                return result(2, stderr=f"error: invalid value '{args[3]}'")
+            self.protocol = None if args[3] == "any" else args[3]
+            if self.state in ("connected", "connecting"):
+                self._start_connecting()
+            return result()
+        if args[:3] == ["relay", "set", "location"] and 4 <= len(args) <= 6:
+            hostname = args[5] if len(args) > 5 else None
+            if self._relays and hostname and hostname not in self._relays:
+                return result(1, stderr=f"Error: Invalid location argument: {hostname}")
+            self.location = (args[3], args[4] if len(args) > 4 else None, hostname)
+            if self.state in ("connected", "connecting", "blocked"):
+                self._start_connecting() # The daemon reconnects by itself
+            return result()
+        if args == ["connect"]:
+            if self.state not in ("connected", "connecting"):
+                self._start_connecting()
+            return result()
+        if args == ["disconnect"]:
+            self._cancel_transition()
+            if self.state != "disconnected":
+                self.state = "disconnected"
+                self._publish()
+            return result()
+        return result(2, stderr=f"error: unrecognized subcommand '{' '.join(args)}'")
+
+    async def open_stream(self, args: List[str]) -> CommandStream:
+        self.calls.append(list(args))
+        stream = _FakeStream(self)
+        if args != ["status", "listen"] or not self.supports_listen or not self.daemon_running:
+            stream.returncode = 2
+            stream.stderr = "error: unrecognized subcommand 'listen'" if self.daemon_running else \
+                "Error: Mullvad VPN daemon is not running"
+            return stream
+        self._streams.add(stream)
+        return stream
+
+
+# --- Relay Data ---
+
+def format_relay_list(relay_data: Dict[str, Any]) -> str:
+    """relays.json-shaped data as `mullvad relay list` output (readable by mullvad_api.parse_relay_list)."""
+    lines = []
+    for country in relay_data.get("countries", []):
+        lines.append(f"{country['name']} ({country['code']})")
+        for city in country.get("cities", []):
+            lines.append(f"\t{city['name']} ({city['code']})")
+            for relay in city.get("relays", []):
+                protocol = relay_protocol(relay)
+                kind = {"wireguard": "WireGuard", "openvpn": "OpenVPN"}.get(protocol, "Bridge")
+                lines.append(f"\t\t{relay['hostname']} ({relay.get('ipv4_addr_in', '0.0.0.0')}) - {kind}, "
+                             f"hosted by {relay.get('provider') or 'Fake'} "
+                             f"({'Mullvad-owned' if relay.get('owned') else 'rented'})")
+    return "\n".join(lines)
+
+def synthetic_relay_data(count: int, countries: int = 40, cities_per_country: int = 3,
+                         seed: int = 0) -> Dict[str, Any]:
+    """relays.json-shaped data with `count` relays spread over countries and cities (about 2/3 WireGuard)."""
+    rng = random.Random(seed)
+    country_codes = [f"{chr(97 + i // 26)}{chr(97 + i % 26)}" for i in range(countries)]
+    data: Dict[str, Any] = {"countries": [
+        {"name": f"Country {code.upper()}", "code": code,
+         "cities": [{"name": f"City {code.upper()}{c}", "code": f"c{c:02d}", "relays": []}
+                    for c in range(cities_per_country)]}
+        for code in country_codes]}
+    for i in range(count):
+        country = data["countries"][i % countries]
+        city = country["cities"][(i // countries) % cities_per_country]
+        wireguard = rng.random() < 0.67
+        city["relays"].append({
+            "hostname": f"{country['code']}-{city['code']}-{'wg' if wireguard else 'ovpn'}-{i:06d}",
+            "ipv4_addr_in": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            "active": True,
+            "owned": rng.random() < 0.3,
+            "provider": rng.choice(("M247", "31173", "DataPacket", "xtom")),
+            "endpoint_data": {"wireguard": {}} if wireguard else "openvpn",
+        })
+    return data
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Headless command line interface for Mullvad Server Finder.
+
+    python -m mullvad_finder scan --country se --protocol wireguard --top 5 --json
+    python -m mullvad_finder list --country de --query "owned"
+    python -m mullvad_finder daemon                 # continuous probing + local query API
+    python -m mullvad_finder scan --country se --use-daemon --top 5
+
+Never imports tkinter; the relay/test modules are imported inside the
+commands so `--help` and argument errors return immediately.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import logging
+from typing import Optional, List, Dict, Any
+
+# Setup logger for this module
+logger = logging.getLogger("mullvad_finder")
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_NO_RESULTS = 3
+
+_OUTPUT_FIELDS = ("hostname", "country", "country_code", "city", "city_code", "protocol", "ipv4_addr_in")
+
+
+# --- Helpers ---
+
+def _relay_record(relay: Dict[str, Any], **results: Any) -> Dict[str, Any]:
+    """Flat, JSON-friendly description of a relay plus test results."""
+    from catalog import relay_protocol
+    record = {field: relay.get(field) for field in _OUTPUT_FIELDS}
+    record["protocol"] = relay_protocol(relay)
+    record.update(results)
+    return record
+
+def _load_catalog(relays_path: Optional[str]):
+    """Load relays.json (or the CLI relay list fallback) into a RelayCatalog."""
+    from config import load_config, get_cache_path, get_relay_list_cache_path
+    from mullvad_api import load_relay_data
+    from catalog import RelayCatalog
+
+    cache_path = relays_path or get_cache_path(load_config())
+    data = load_relay_data(cache_path, get_relay_list_cache_path())
+    if not data:
+        return None
+    return RelayCatalog(data)
+
+def _select_relays(catalog, args: argparse.Namespace) -> Optional[List[Dict[str, Any]]]:
+    """Relays matching the filters (None after printing the error for an invalid query)."""
+    from catalog import RelayQueryError
+    query = args.query or ""
+    if args.city:
+        query = f"{query} city:{args.city}"
+    countries = [c.strip() for c in (args.country or "").split(",") if c.strip()]
+    if len(countries) > 1:
+        query = f"{query} country:{','.join(countries)}"
+        countries = []
+    try:
+        return catalog.select(countries[0] if countries else None, args.protocol, query.strip() or None)
+    except RelayQueryError as e:
+        print(f"error: invalid query: {e}", file=sys.stderr)
+        return None
+
+def _write_line(record: Dict[str, Any]):
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+    sys.stdout.flush()
+
+def _format_value(value: Optional[float]) -> str:
+    return f"{value:.1f}" if value is not None else "-"
+
+def _print_table(records: List[Dict[str, Any]], speed: bool):
+    header = f"{'#':>3}  {'Hostname':<20} {'City':<18} {'CC':<3} {'Protocol':<10} {'Latency':>8}"
+    if speed:
+        header += f" {'DL Mbps':>8} {'UL Mbps':>8}"
+    print(header)
+    for rank, record in enumerate(records, 1):
+        line = (f"{rank:>3}  {record['hostname'] or '':<20} {(record['city'] or '')[:18]:<18} "
+                f"{(record['country_code'] or '').upper():<3} {record['protocol']:<10} "
+                f"{_format_value(record.get('latency_ms')):>8}")
+        if speed:
+            line += f" {_format_value(record.get('download_mbps')):>8} {_format_value(record.get('upload_mbps')):>8}"
+        print(line)
+
+
+# --- Commands ---
+
+def cmd_list(args: argparse.Namespace) -> int:
+    """Print the relays matching the filters without testing them."""
+    catalog = _load_catalog(args.relays)
+    if catalog is None:
+        print("error: could not load relay data (relays.json or `mullvad relay list`)", file=sys.stderr)
+        return EXIT_ERROR
+    relays = _select_relays(catalog, args)
+    if relays is None:
+        return EXIT_ERROR
+    for relay in relays:
+        if args.json:
+            _write_line(_relay_record(relay))
+        else:
+            print(relay.get("hostname"))
+    return EXIT_OK if relays else EXIT_NO_RESULTS
+
+def _daemon_records(args: argparse.Namespace) -> Optional[List[Dict[str, Any]]]:
+    """The running daemon's ranking for the filters (None if it cannot answer this scan)."""
+    from daemon import DaemonClient, DaemonError
+    if args.query:
+        print("error: --use-daemon supports --country, --city and --protocol filters only", file=sys.stderr)
+        return None
+    countries = [c.strip() for c in (args.country or "").split(",") if c.strip()]
+    try:
+        return DaemonClient().best(args.top or 0, countries, args.protocol, args.city, include_unreachable=args.all)
+    except DaemonError as e:
+        print(f"error: {e} (start it with `python -m mullvad_finder daemon`)", file=sys.stderr)
+        return None
+
+def _output_records(records: List[Dict[str, Any]], args: argparse.Namespace):
+    if args.ndjson:
+        for record in records:
+            _write_line(record)
+    elif args.json:
+        json.dump(records, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    else:
+        _print_table(records, args.speed)
+
+def cmd_scan(args: argparse.Namespace) -> int:
+    """Ping the matching relays (optionally speed test the best ones) and print a ranking."""
+    from server_manager import test_servers, run_socket_ping_pong_test
+
+    if args.use_daemon:
+        records = _daemon_records(args)
+        if records is None:
+            return EXIT_ERROR
+        if args.speed:
+            for record in records:
+                record["download_mbps"], record["upload_mbps"] = run_socket_ping_pong_test(
+                    record, duration=args.speed_duration)
+        _output_records(records, args)
+        return EXIT_OK if records else EXIT_NO_RESULTS
+
+    catalog = _load_catalog(args.relays)
+    if catalog is None:
+        print("error: could not load relay data (relays.json or `mullvad relay list`)", file=sys.stderr)
+        return EXIT_ERROR
+    relays = _select_relays(catalog, args)
+    if relays is None:
+        return EXIT_ERROR
+    if not relays:
+        print("error: no relays match the given filters", file=sys.stderr)
+        return EXIT_NO_RESULTS
+
+    history = None
+    if not args.no_history:
+        try:
+            from config import get_history_db_path
+            from history import HistoryStore
+            history = HistoryStore(get_history_db_path())
+        except Exception as e:
+            logger.warning("Probe history unavailable: %s", e)
+
+    # Without --top, NDJSON results are streamed as each ping completes
+    stream = args.ndjson and args.top is None and not args.speed
+    output_lock = threading.Lock()
+    # Set when the reader closes the pipe (e.g. `| head`); written from the ping
+    # workers, whose callback errors test_servers only logs
+    output_closed = threading.Event()
+
+    def on_result(result: Dict[str, Any]):
+        relay = result.get("server") or {}
+        if history:
+            history.record_ping(relay, result.get("latency"))
+        if stream and (args.all or result.get("latency") is not None): # Same rows as the non-streamed output
+            with output_lock:
+                if output_closed.is_set():
+                    return
+                try:
+                    _write_line(_relay_record(relay, latency_ms=result.get("latency")))
+                except OSError: # BrokenPipeError included
+                    output_closed.set()
+
+    started = time.monotonic()
+    results = test_servers(relays, result_callback=on_result, max_workers=args.workers,
+                           ping_count=args.ping_count, timeout_sec=args.timeout, stop_event=output_closed)
+    logger.info("Pinged %d relays in %.1fs", len(results), time.monotonic() - started)
+    if output_closed.is_set():
+        if history:
+            history.close()
+        return EXIT_OK # Output piped into e.g. `head`, as in main()
+
+    records = [_relay_record(r["server"], latency_ms=r.get("latency")) for r in results]
+    if not args.all:
+        records = [r for r in records if r["latency_ms"] is not None]
+    if args.top is not None:
+        records = records[:args.top]
+
+    if args.speed:
+        by_hostname = {r["server"].get("hostname"): r["server"] for r in results}
+        for record in records:
+            relay = by_hostname[record["hostname"]]
+            download, upload = run_socket_ping_pong_test(relay, duration=args.speed_duration)
+            record["download_mbps"], record["upload_mbps"] = download, upload
+            if history:
+                history.record_speed(relay, download, upload)
+    if history:
+        history.close()
+
+    if not stream: # Streamed NDJSON is already written
+        _output_records(records, args)
+    return EXIT_OK if records else EXIT_NO_RESULTS
+
+def cmd_daemon(args: argparse.Namespace) -> int:
+    """Run the probe daemon in the foreground (or print the status of a running one)."""
+    import signal
+    from daemon import ProbeDaemon, DaemonClient, DaemonError, start_server, stop_server
+    from config import get_daemon_socket_path
+
+    socket_path = args.socket or get_daemon_socket_path()
+    if args.status:
+        try:
+            status = DaemonClient(socket_path, args.port).status()
+        except DaemonError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return EXIT_ERROR
+        json.dump(status, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return EXIT_OK
+
+    catalog = _load_catalog(args.relays)
+    if catalog is None or not len(catalog):
+        print("error: could not load relay data (relays.json or `mullvad relay list`)", file=sys.stderr)
+        return EXIT_ERROR
+    history = None
+    if not args.no_history:
+        try:
+            from config import get_history_db_path
+            from history import HistoryStore
+            history = HistoryStore(get_history_db_path())
+        except Exception as e:
+            logger.warning("Probe history unavailable: %s", e)
+
+    try:
+        probe_daemon = ProbeDaemon(catalog, history, rate_per_sec=args.rate, workers=args.workers,
+                                   ping_count=args.ping_count, timeout_sec=args.timeout,
+                                   window=args.window, catalog_loader=lambda: _load_catalog(args.relays))
+        server = start_server(probe_daemon, socket_path, args.port)
+    except (DaemonError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    signal.signal(signal.SIGTERM, lambda signum, frame: probe_daemon.stop_event.set())
+    probe_daemon.start()
+    print(f"Probe daemon running ({len(catalog)} relays, {args.rate:g} probes/s). Ctrl+C to stop.", file=sys.stderr)
+    try:
+        while not probe_daemon.stop_event.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        probe_daemon.stop()
+        stop_server(server)
+        if history:
+            history.close()
+    return EXIT_OK
+
+
+# --- Argument Parsing ---
+
+def _add_filter_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--country", "-c", help="Country code(s), comma separated (e.g. se or se,de)")
+    parser.add_argument("--city", help="City code or name (e.g. got)")
+    parser.add_argument("--protocol", "-p", choices=["wireguard", "openvpn", "both"], default="both",
+                        help="Tunnel protocol (default: both)")
+    parser.add_argument("--query", "-q", help="Filter bar query, e.g. 'owned -provider:M247 weight>=100'")
+    parser.add_argument("--relays", help="Path to relays.json (default: from the app settings)")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="mullvad_finder", description="Find the best Mullvad relays from the command line.")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Log to stderr (-v info, -vv debug)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan = subparsers.add_parser("scan", help="Ping matching relays and rank them by latency")
+    _add_filter_args(scan)
+    scan.add_argument("--top", "-n", type=int, help="Only output the N best relays")
+    scan.add_argument("--ping-count", type=int, default=3, help="Pings per relay (default: 3)")
+    scan.add_argument("--timeout", type=int, default=10, help="Ping timeout in seconds (default: 10)")
+    scan.add_argument("--workers", type=int, default=15, help="Concurrent pings (default: 15)")
+    scan.add_argument("--speed", action="store_true", help="Also run the socket speed test on the output relays")
+    scan.add_argument("--speed-duration", type=int, default=5, help="Speed test seconds per relay (default: 5)")
+    scan.add_argument("--all", action="store_true", help="Include relays that timed out")
+    scan.add_argument("--no-history", action="store_true", help="Do not record results in the probe history")
+    scan.add_argument("--use-daemon", action="store_true",
+                      help="Use the ranking of a running probe daemon instead of pinging")
+    output = scan.add_mutually_exclusive_group()
+    output.add_argument("--json", action="store_true", help="Print a JSON array")
+    output.add_argument("--ndjson", action="store_true",
+                        help="Print one JSON object per line (streamed as results arrive unless --top/--speed)")
+    scan.set_defaults(func=cmd_scan)
+
+    list_parser = subparsers.add_parser("list", help="List matching relays without testing them")
+    _add_filter_args(list_parser)
+    list_parser.add_argument("--json", action="store_true", help="Print one JSON object per relay")
+    list_parser.set_defaults(func=cmd_list)
+
+    daemon = subparsers.add_parser("daemon", help="Probe relays continuously and serve a local ranking API")
+    daemon.add_argument("--relays", help="Path to relays.json (default: from the app settings)")
+    daemon.add_argument("--rate", type=float, default=1.0, help="Probes started per second (default: 1)")
+    daemon.add_argument("--workers", type=int, default=4, help="Concurrent pings (default: 4)")
+    daemon.add_argument("--ping-count", type=int, default=2, help="Pings per probe (default: 2)")
+    daemon.add_argument("--timeout", type=int, default=4, help="Probe timeout in seconds (default: 4)")
+    daemon.add_argument("--window", type=int, default=5, help="Probes per relay in the rolling ranking (default: 5)")
+    daemon.add_argument("--socket", help="Unix socket path (default: ~/.config/mullvad-finder/daemon.sock)")
+    daemon.add_argument("--port", type=int, help="Listen on 127.0.0.1:PORT instead of the Unix socket")
+    daemon.add_argument("--no-history", action="store_true", help="Do not record probes in the probe history")
+    daemon.add_argument("--status", action="store_true", help="Print the status of the running daemon and exit")
+    daemon.set_defaults(func=cmd_daemon)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    level = logging.WARNING if args.verbose == 0 else logging.INFO if args.verbose == 1 else logging.DEBUG
+    logging.basicConfig(level=level, stream=sys.stderr, format="%(levelname)s %(name)s: %(message)s")
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        return EXIT_OK # Output piped into e.g. `head`
+
+
+if __name__ == "__main__":
+    sys.exit(main())
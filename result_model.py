@@ -0,0 +1,242 @@
+import logging
+from bisect import bisect_left
+from typing import Optional, List, Dict, Any, Sequence, Tuple, Set, NamedTuple
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+# Column order of the server list (matches the grid columns in gui.py)
+COLUMNS = ("selected", "hostname", "city", "country", "protocol", "latency", "download", "upload")
+NUMERIC_COLUMNS = ("latency", "download", "upload")
+TEXT_COLUMNS = ("hostname", "city", "country", "protocol")
+
+MISSING_KEY = float('inf') # Sort key of empty/timeout results (always placed last)
+
+def parse_result_value(value: Any) -> Optional[float]:
+    """Convert a result cell value ('12.3', 'Timeout', '', None, 12.3) to a float or None."""
+    if value is None or value == "" or value == "Timeout":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number == MISSING_KEY else number
+
+def _text_sort_key(column: str, value: str) -> str:
+    """Case-insensitive text key; the country column is sorted without its flag emoji."""
+    if column == "country":
+        parts = value.split(" ", 1)
+        if len(parts) > 1:
+            value = parts[-1]
+    return value.lower()
+
+
+class RowSnapshot(NamedTuple):
+    """Immutable copy of a row's values, e.g. for an export running on a worker thread."""
+    hostname: str
+    city: str
+    country: str
+    protocol: str
+    latency: Optional[float]
+    download: Optional[float]
+    upload: Optional[float]
+
+
+class ServerRow:
+    """Typed Python-side copy of one server list row."""
+
+    __slots__ = ("item_id", "hostname", "city", "country", "protocol", "selected",
+                 "latency", "download", "upload")
+
+    def __init__(self, item_id: str, values: Sequence[Any], selected: bool = False):
+        self.item_id = item_id
+        self.hostname = str(values[1])
+        self.city = str(values[2])
+        self.country = str(values[3]) # Display value including the flag
+        self.protocol = str(values[4])
+        self.selected = selected
+        self.latency = parse_result_value(values[5]) if len(values) > 5 else None
+        self.download = parse_result_value(values[6]) if len(values) > 6 else None
+        self.upload = parse_result_value(values[7]) if len(values) > 7 else None
+
+    def snapshot(self) -> RowSnapshot:
+        """Copy of the values; the row itself is updated in place on the Tk thread."""
+        return RowSnapshot(self.hostname, self.city, self.country, self.protocol,
+                           self.latency, self.download, self.upload)
+
+    def __repr__(self) -> str:
+        return f"ServerRow({self.item_id!r}, {self.hostname!r}, latency={self.latency}, download={self.download})"
+
+
+class ResultModel:
+    """
+    Rows of the server list with precomputed sort keys per column.
+
+    Keys are stored per column as item_id -> key dicts and refreshed only for
+    the rows whose value changes, so sorting is a single list.sort() with a
+    C-level key lookup instead of reading and reparsing every cell from Tk.
+    Missing results sort last in both directions.
+
+    While the order is sorted by a numeric column, a parallel list of sort
+    keys is kept so that new results are moved to their bisected position
+    (O(log n) search plus one list shift) instead of re-sorting everything.
+    """
+
+    def __init__(self):
+        self.rows: Dict[str, ServerRow] = {}
+        self.order: List[str] = [] # Current display order (item ids)
+        self.sort_column: Optional[str] = None
+        self.sort_descending = False
+        self._sorted_keys: Optional[List[Tuple[float, int]]] = None # (key, seq) parallel to order (numeric sort only)
+        self._seq: Dict[str, int] = {} # item_id -> insertion number, breaks ties between equal keys
+        self.by_hostname: Dict[str, str] = {} # hostname -> item_id
+        self.visible: Optional[Set[str]] = None # Item ids passing the search filter (None = all)
+        # (column, descending) -> {item_id: key}; text columns only store the ascending table
+        self._keys: Dict[Tuple[str, bool], Dict[str, Any]] = {}
+        self._reset_keys()
+
+    def _reset_keys(self):
+        self._keys = {("selected", False): {}}
+        for column in TEXT_COLUMNS:
+            self._keys[(column, False)] = {}
+        for column in NUMERIC_COLUMNS:
+            self._keys[(column, False)] = {}
+            self._keys[(column, True)] = {}
+
+    def _store_numeric_keys(self, item_id: str, column: str, value: Optional[float]):
+        self._keys[(column, False)][item_id] = MISSING_KEY if value is None else value
+        self._keys[(column, True)][item_id] = MISSING_KEY if value is None else -value
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.rows
+
+    def get(self, item_id: str) -> Optional[ServerRow]:
+        return self.rows.get(item_id)
+
+    def clear(self):
+        """Remove all rows."""
+        self.rows.clear()
+        self.order = []
+        self._sorted_keys = None
+        self._seq.clear()
+        self.by_hostname.clear()
+        self.visible = None
+        self._reset_keys()
+
+    def add(self, item_id: str, values: Sequence[Any], selected: bool = False) -> ServerRow:
+        """Add a row (appended to the display order) from its grid values tuple."""
+        row = ServerRow(item_id, values, selected)
+        self.rows[item_id] = row
+        self.order.append(item_id)
+        self._seq[item_id] = len(self._seq)
+        self.by_hostname[row.hostname] = item_id
+        self._sorted_keys = None # Order is no longer sorted until the next sort()
+        for column in TEXT_COLUMNS:
+            self._keys[(column, False)][item_id] = _text_sort_key(column, getattr(row, column))
+        self._keys[("selected", False)][item_id] = 0 if selected else 1 # Checked items first
+        for column in NUMERIC_COLUMNS:
+            self._store_numeric_keys(item_id, column, getattr(row, column))
+        return row
+
+    def set_selected(self, item_id: str, selected: bool):
+        row = self.rows.get(item_id)
+        if row is None: return
+        row.selected = selected
+        self._keys[("selected", False)][item_id] = 0 if selected else 1
+
+    def set_result(self, item_id: str, column: str, value: Any) -> bool:
+        """
+        Store a latency/download/upload result. If the order is sorted by this
+        column, the row is moved to its new position.
+
+        Returns:
+            True if the row moved in the display order, False otherwise.
+        """
+        row = self.rows.get(item_id)
+        if row is None or column not in NUMERIC_COLUMNS:
+            return False
+        number = parse_result_value(value)
+        if getattr(row, column) == number:
+            return False
+        old_key = self._keys[(column, self.sort_descending)][item_id]
+        setattr(row, column, number)
+        self._store_numeric_keys(item_id, column, number)
+
+        if column != self.sort_column or self._sorted_keys is None:
+            return False
+        return self._reposition(item_id, old_key, self._keys[(column, self.sort_descending)][item_id])
+
+    def _reposition(self, item_id: str, old_key: float, new_key: float) -> bool:
+        """Move one row from its old key position to the bisected position of its new key."""
+        keys = self._sorted_keys
+        seq = self._seq[item_id]
+        index = bisect_left(keys, (old_key, seq))
+        if index >= len(keys) or self.order[index] != item_id:
+            logger.warning(f"Row {item_id} not found at its sort position; falling back to a full sort.")
+            self.sort(self.sort_column, self.sort_descending)
+            return True
+
+        del keys[index]
+        del self.order[index]
+        new_index = bisect_left(keys, (new_key, seq))
+        keys.insert(new_index, (new_key, seq))
+        self.order.insert(new_index, item_id)
+        return new_index != index
+
+    def clear_results(self):
+        """Reset all latency/speed results."""
+        for item_id, row in self.rows.items():
+            for column in NUMERIC_COLUMNS:
+                setattr(row, column, None)
+                self._store_numeric_keys(item_id, column, None)
+        if self._sorted_keys is not None:
+            self.sort(self.sort_column, self.sort_descending) # All keys equal: orders by seq
+
+    def sort(self, column: str, descending: bool = False) -> List[str]:
+        """Sort the display order by a column and return it."""
+        if column in NUMERIC_COLUMNS:
+            keys, reverse = self._keys[(column, descending)], False
+        elif (column, False) in self._keys:
+            keys, reverse = self._keys[(column, False)], descending
+        else:
+            logger.warning(f"Unknown sort column '{column}', keeping current order.")
+            return self.order
+        self.sort_column = column
+        self.sort_descending = descending
+        if column in NUMERIC_COLUMNS:
+            # Keep (key, seq) pairs for incremental repositioning (numeric keys are always ascending)
+            seq = self._seq
+            self.order.sort(key=lambda item_id: (keys[item_id], seq[item_id]))
+            self._sorted_keys = [(keys[item_id], seq[item_id]) for item_id in self.order]
+        else:
+            self.order.sort(key=keys.__getitem__, reverse=reverse)
+            self._sorted_keys = None
+        return self.order
+
+    def set_visible(self, item_ids: Optional[Set[str]]):
+        """Restrict the displayed rows to item_ids (None shows all rows)."""
+        self.visible = item_ids
+
+    def is_visible(self, item_id: str) -> bool:
+        return self.visible is None or item_id in self.visible
+
+    def visible_order(self) -> List[str]:
+        """The display order restricted to visible rows."""
+        if self.visible is None:
+            return self.order
+        visible = self.visible
+        return [item_id for item_id in self.order if item_id in visible]
+
+    def best(self, column: str = "latency") -> Optional[ServerRow]:
+        """Return the row with the best result for a column (lowest latency, highest speed)."""
+        if column not in NUMERIC_COLUMNS or not self.rows:
+            return None
+        keys = self._keys[(column, column != "latency")]
+        candidates = keys if self.visible is None else self.visible
+        if not candidates:
+            return None
+        item_id = min(candidates, key=keys.__getitem__)
+        return self.rows[item_id] if keys[item_id] != MISSING_KEY else None
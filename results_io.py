@@ -0,0 +1,221 @@
+import io
+import json
+import os
+import pickle
+import tempfile
+import time
+import logging
+from typing import Optional, List, Dict, Any, Iterator, Iterable, Tuple
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+# --- Results File Format (version 2) ---
+#
+# UTF-8 NDJSON. The first line is a JSON header padded with spaces to a fixed
+# size, so it can be rewritten in place once all records are written:
+#
+#   {"format": "mullvad-finder-results", "version": 2, "count": N,
+#    "fields": [...], "index": {"chunk_records": 4096, "offsets": [...]}, ...}
+#
+# Every following line is one result as a compact JSON array in the order of
+# "fields". Result values are a number, null (not tested) or "timeout".
+# "index.offsets" holds the byte offset of every chunk_records-th record, so
+# readers can start at any record without parsing the ones before it.
+#
+# Files written by older versions (pickled dicts, version "1.x") are still
+# imported, with a restricted unpickler that refuses to construct any objects.
+
+RESULTS_FORMAT = "mullvad-finder-results"
+RESULTS_VERSION = 2
+HEADER_RESERVED_BYTES = 8192
+INDEX_CHUNK_RECORDS = 4096
+RECORD_FIELDS = ("hostname", "city", "country", "protocol", "latency", "download", "upload", "selected")
+TIMEOUT_VALUE = "timeout"
+
+class ResultsFormatError(ValueError):
+    """Custom exception for unreadable or unsupported results files."""
+    pass
+
+def encode_result_value(value: Any) -> Any:
+    """Normalize a result cell ('12.3', 12.3, 'Timeout', '', None) for storage."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        if value.lower() == TIMEOUT_VALUE:
+            return TIMEOUT_VALUE
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return float(value)
+
+def format_result_value(value: Any, timeout_text: str = "Timeout") -> str:
+    """Turn a stored result value back into the text shown in the server list."""
+    if value is None:
+        return ""
+    if value == TIMEOUT_VALUE:
+        return timeout_text
+    return f"{float(value):.1f}"
+
+
+# --- Writing ---
+
+def write_results(path: str, records: Iterable[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Stream result records to a version 2 results file (atomically replaced).
+
+    Args:
+        path: Destination file.
+        records: Dicts with the keys of RECORD_FIELDS (missing keys are stored as null).
+        metadata: Extra header fields (config summary, view state, ...).
+
+    Returns:
+        Number of records written.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".msf", dir=directory)
+    count = 0
+    offsets: List[int] = []
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b" " * (HEADER_RESERVED_BYTES - 1) + b"\n") # Placeholder, rewritten below
+            for record in records:
+                if count % INDEX_CHUNK_RECORDS == 0:
+                    offsets.append(f.tell())
+                row = [record.get(field) for field in RECORD_FIELDS]
+                for i in (4, 5, 6):
+                    row[i] = encode_result_value(row[i])
+                row[7] = 1 if row[7] else 0
+                f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+                count += 1
+
+            header = dict(metadata or {})
+            header.update({
+                "format": RESULTS_FORMAT,
+                "version": RESULTS_VERSION,
+                "timestamp": header.get("timestamp", time.time()),
+                "count": count,
+                "fields": list(RECORD_FIELDS),
+                "index": {"chunk_records": INDEX_CHUNK_RECORDS, "offsets": offsets},
+            })
+            header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            if len(header_bytes) > HEADER_RESERVED_BYTES - 1:
+                logger.warning("Results header too large for the record index; saving without it.")
+                header["index"] = None
+                header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                if len(header_bytes) > HEADER_RESERVED_BYTES - 1:
+                    raise ResultsFormatError("Results header metadata is too large.")
+            f.seek(0)
+            f.write(header_bytes.ljust(HEADER_RESERVED_BYTES - 1) + b"\n")
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    logger.info(f"Wrote {count} results to {path}")
+    return count
+
+
+# --- Reading ---
+
+def _is_legacy_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(1) == b"\x80" # Pickle protocol 2+ opcode
+
+def read_header(path: str) -> Dict[str, Any]:
+    """Read and validate the header of a version 2 results file."""
+    with open(path, "rb") as f:
+        line = f.readline(HEADER_RESERVED_BYTES + 1)
+    try:
+        header = json.loads(line.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ResultsFormatError(f"Not a results file (bad header): {e}")
+    if not isinstance(header, dict) or header.get("format") != RESULTS_FORMAT:
+        raise ResultsFormatError("Not a Mullvad Server Finder results file.")
+    if not isinstance(header.get("version"), int) or header["version"] > RESULTS_VERSION:
+        raise ResultsFormatError(f"Unsupported results file version: {header.get('version')}")
+    return header
+
+def iter_results(path: str, start: int = 0, header: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield result records from a version 2 file, beginning at record index start.
+    Uses the header's chunk index to seek close to start instead of reading from the top.
+    """
+    header = header or read_header(path)
+    fields = header.get("fields") or list(RECORD_FIELDS)
+    index = header.get("index") or {}
+    offsets = index.get("offsets") or []
+    chunk_records = index.get("chunk_records") or INDEX_CHUNK_RECORDS
+
+    with open(path, "rb") as f:
+        f.readline() # Header
+        skip = start
+        if start and offsets:
+            chunk = min(start // chunk_records, len(offsets) - 1)
+            f.seek(offsets[chunk])
+            skip = start - chunk * chunk_records
+        for line_number, line in enumerate(f):
+            if line_number < skip or not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ResultsFormatError(f"Corrupt record after index {start + line_number - skip}: {e}")
+            record = dict(zip(fields, row))
+            record["selected"] = bool(record.get("selected"))
+            yield record
+
+
+# --- Legacy (pickle) Files ---
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    """Unpickler for legacy .msf files, which only ever contain builtin containers and scalars."""
+
+    def find_class(self, module: str, name: str):
+        raise pickle.UnpicklingError(f"Refusing to load '{module}.{name}' from a results file.")
+
+def load_legacy_results(path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Import a pickled (version 1.x) .msf file as (header, records)."""
+    with open(path, "rb") as f:
+        data = _RestrictedUnpickler(io.BytesIO(f.read())).load()
+    if not isinstance(data, dict) or not isinstance(data.get("results"), list):
+        raise ResultsFormatError("Invalid or unrecognized legacy results file.")
+
+    selected = set(data.get("selected_hostnames") or [])
+    records = []
+    for result in data["results"]:
+        if not isinstance(result, dict):
+            continue
+        hostname = result.get("hostname", "N/A")
+        records.append({
+            "hostname": hostname,
+            "city": result.get("city", ""),
+            "country": result.get("country", ""),
+            "protocol": result.get("protocol", ""),
+            "latency": encode_result_value(result.get("latency")),
+            "download": encode_result_value(result.get("download_speed")),
+            "upload": encode_result_value(result.get("upload_speed")),
+            "selected": hostname in selected,
+        })
+    header = {
+        "format": RESULTS_FORMAT,
+        "version": 1,
+        "legacy_version": data.get("version"),
+        "timestamp": data.get("timestamp"),
+        "count": len(records),
+        "config_summary": data.get("config_summary", {}),
+        "view_state": data.get("view_state", {}),
+    }
+    return header, records
+
+def open_results(path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """Open a results file of any supported version as (header, record iterator)."""
+    if _is_legacy_file(path):
+        logger.info(f"Importing legacy pickled results file: {path}")
+        header, records = load_legacy_results(path)
+        return header, iter(records)
+    header = read_header(path)
+    return header, iter_results(path, header=header)
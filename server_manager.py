@@ -5,7 +5,6 @@ from queue import Queue, Empty
 import time
 import platform
 import re
-import csv
 import os
 import socket
 import random # Keep this import
@@ -13,8 +12,14 @@ import logging
 from threading import Event
 from typing import Optional, List, Dict, Any, Tuple, Callable
 
+from log_utils import RateLimitedLog
+
 # Setup logger for this module
 logger = logging.getLogger(__name__)
+# Per-relay failure warnings: a sweep where many relays time out logs a few lines plus a suppressed count
+_relay_warnings = RateLimitedLog(logger)
+# A missing ping binary fails every test: logged once, outside the per-relay rate limit so it is never dropped
+_ping_missing_logged = False
 
 # --- Ping Functions ---
 
@@ -33,7 +38,7 @@ def parse_unix_ping(output: str) -> Optional[float]:
                     return float(parts[1])
             except (IndexError, ValueError):
                 continue # Ignore lines that don't parse correctly
-    logger.debug(f"Could not parse Unix ping avg latency from output:\n{output}")
+    logger.debug("Could not parse Unix ping avg latency from output:\n%s", output)
     return None
 
 def parse_windows_ping(output: str) -> Optional[float]:
@@ -41,7 +46,7 @@ def parse_windows_ping(output: str) -> Optional[float]:
     match = re.search(r"Average = (\d+)ms", output)
     if match:
         return float(match.group(1))
-    logger.debug(f"Could not parse Windows ping avg latency from output:\n{output}")
+    logger.debug("Could not parse Windows ping avg latency from output:\n%s", output)
     return None
 
 def ping_test(target_ip: str, count: int = 3, timeout_sec: int = 5) -> Optional[float]:
@@ -72,7 +77,7 @@ def ping_test(target_ip: str, count: int = 3, timeout_sec: int = 5) -> Optional[
             cmd = ['ping', '-c', str(count), '-W', str(timeout_sec), target_ip]
             parse_func = parse_unix_ping
 
-        logger.debug(f"Executing ping command: {' '.join(cmd)}")
+        logger.debug("Executing ping command: %s", cmd)
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout_sec + 2) # Command timeout slightly longer
 
         if result.returncode != 0:
@@ -80,27 +85,30 @@ def ping_test(target_ip: str, count: int = 3, timeout_sec: int = 5) -> Optional[
             stderr_lower = result.stderr.lower()
             stdout_lower = result.stdout.lower()
             if "unknown host" in stderr_lower or "could not find host" in stdout_lower:
-                 logger.warning(f"Ping failed for {target_ip}: Unknown host.")
+                 _relay_warnings.warning(target_ip, "Ping failed for %s: Unknown host.", target_ip)
             elif "request timed out" in stdout_lower or "100% packet loss" in stdout_lower:
-                 logger.warning(f"Ping failed for {target_ip}: Request timed out / packet loss.")
+                 _relay_warnings.warning(target_ip, "Ping failed for %s: Request timed out / packet loss.", target_ip)
             else:
-                 logger.warning(f"Ping failed for {target_ip} (code {result.returncode}). Stderr: {result.stderr.strip()}")
+                 _relay_warnings.warning(target_ip, "Ping failed for %s (code %s). Stderr: %s", target_ip, result.returncode, result.stderr.strip())
             return None
 
         avg_latency = parse_func(result.stdout)
         if avg_latency is None:
-             logger.warning(f"Ping successful for {target_ip}, but failed to parse average latency.")
+             _relay_warnings.warning(target_ip, "Ping successful for %s, but failed to parse average latency.", target_ip)
         return avg_latency
 
     except subprocess.TimeoutExpired:
-        logger.warning(f"Ping command timed out for {target_ip} after {timeout_sec} seconds.")
+        _relay_warnings.warning(target_ip, "Ping command timed out for %s after %s seconds.", target_ip, timeout_sec)
         return None
     except FileNotFoundError:
-        logger.exception("Ping command not found. Is ICMP allowed or ping installed?")
+        global _ping_missing_logged
+        if not _ping_missing_logged:
+            _ping_missing_logged = True
+            logger.exception("Ping command not found. Is ICMP allowed or ping installed?")
         # Re-raise or return None; returning None might be more user-friendly
         return None
     except Exception as e:
-        logger.exception(f"Unexpected error pinging {target_ip}: {e}")
+        logger.exception("Unexpected error pinging %s: %s", target_ip, e)
         return None
 
 # --- Server Testing Framework ---
@@ -113,7 +121,7 @@ def get_server_latency(server: Dict[str, Any], ping_count: int, timeout_sec: int
         "latency": None
     }
     if not ip_address:
-        logger.warning(f"Server {server.get('hostname', 'N/A')} has no ipv4_addr_in.")
+        _relay_warnings.warning(server.get("hostname"), "Server %s has no ipv4_addr_in.", server.get("hostname", "N/A"))
         return result # Return result with None latency
 
     latency = ping_test(ip_address, count=ping_count, timeout_sec=timeout_sec // 2) # Use half the main timeout per ping
@@ -147,6 +155,11 @@ def test_servers(
         List of result dictionaries, each containing the server and its latency.
     """
     results: List[Dict[str, Any]] = []
+    # Never schedule probes for relays the catalog marks as inactive
+    active_servers = [s for s in servers if s.get("active", True) is not False]
+    if len(active_servers) != len(servers):
+        logger.info(f"Skipping {len(servers) - len(active_servers)} inactive servers.")
+        servers = active_servers
     total = len(servers)
     if total == 0:
         return results
@@ -193,7 +206,7 @@ def test_servers(
                         try:
                             result_callback(result)
                         except Exception as cb_err:
-                             logger.error(f"Error in result_callback: {cb_err}")
+                             logger.error("Error in result_callback: %s", cb_err)
 
                 with lock:
                     completed += 1
@@ -201,10 +214,10 @@ def test_servers(
                          try:
                              progress_callback(completed / total * 100)
                          except Exception as cb_err:
-                             logger.error(f"Error in progress_callback: {cb_err}")
+                             logger.error("Error in progress_callback: %s", cb_err)
 
             except Exception as e:
-                logger.exception(f"Error testing server {server.get('hostname', 'N/A')} in worker thread: {e}")
+                logger.exception("Error testing server %s in worker thread: %s", server.get("hostname", "N/A"), e)
             finally:
                 server_queue.task_done() # Ensure task_done is called even on error
 
@@ -280,7 +293,7 @@ def _execute_socket_ping_pong(
     Core logic for the Ping-Pong socket test on a specific IP and port.
     Returns (download_mbps, upload_mbps).
     """
-    logger.debug(f"[PingPong] Testing {ip}:{port} (Duration: {duration}s, Chunk: {chunk_size}b)")
+    logger.debug("[PingPong] Testing %s:%s (Duration: %ss, Chunk: %sb)", ip, port, duration, chunk_size)
     download_mbps: Optional[float] = None
     upload_mbps: Optional[float] = None
     sock = None
@@ -290,7 +303,7 @@ def _execute_socket_ping_pong(
 
     try:
         # 1. Connect
-        logger.debug(f"[PingPong] Connecting to {ip}:{port}...")
+        logger.debug("[PingPong] Connecting to %s:%s...", ip, port)
         conn_start_time = time.monotonic()
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(conn_timeout)
@@ -300,10 +313,10 @@ def _execute_socket_ping_pong(
         # A slightly longer timeout might allow slower servers to respond occasionally
         round_timeout = 2.0 # Seconds to wait for response after sending
         sock.settimeout(round_timeout)
-        logger.info(f"[PingPong] Connected to {ip}:{port} in {conn_elapsed:.3f}s. Round timeout: {round_timeout}s.")
+        logger.info("[PingPong] Connected to %s:%s in %.3fs. Round timeout: %ss.", ip, port, conn_elapsed, round_timeout)
 
         # 2. Ping-Pong Loop
-        logger.debug(f"[PingPong] Starting Send/Recv Loop...")
+        logger.debug("[PingPong] Starting Send/Recv Loop...")
         total_bytes_sent = 0
         total_bytes_received = 0
         successful_exchanges = 0
@@ -358,12 +371,11 @@ def _execute_socket_ping_pong(
                 rtt_samples.append(rtt)
                 if bytes_received_this_round > 0: # Count exchange if we got anything back
                     successful_exchanges += 1
-                    # logger.debug(f"[PingPong] Round RTT: {rtt*1000:.1f}ms, Recv: {bytes_received_this_round} bytes")
 
             except StopIteration: # Catch stop event from inner loop
                  break
             except socket.timeout:
-                logger.debug(f"[PingPong] Timeout waiting for full response this round.")
+                logger.debug("[PingPong] Timeout waiting for full response this round.")
                 # Continue to next round even if this one timed out recv
                 pass
             except (socket.error, Exception) as e:
@@ -373,22 +385,23 @@ def _execute_socket_ping_pong(
         # --- Loop End ---
         loop_elapsed = time.monotonic() - loop_start_time
         if loop_error:
-            logger.warning(f"[PingPong] Loop stopped early: {loop_error}")
-        logger.info(f"[PingPong] Loop finished: Sent={total_bytes_sent}, Recv={total_bytes_received} bytes in {loop_elapsed:.2f}s. Successful Exchanges={successful_exchanges}/{len(rtt_samples)}")
+            _relay_warnings.warning(ip, "[PingPong] Loop stopped early for %s: %s", ip, loop_error)
+        logger.info("[PingPong] Loop finished: Sent=%s, Recv=%s bytes in %.2fs. Successful Exchanges=%s/%s",
+                    total_bytes_sent, total_bytes_received, loop_elapsed, successful_exchanges, len(rtt_samples))
 
         # Calculate aggregate speeds
         upload_mbps = calculate_mbps(total_bytes_sent, loop_elapsed)
         download_mbps = calculate_mbps(total_bytes_received, loop_elapsed)
 
     except socket.timeout:
-        logger.error(f"[PingPong] Initial connection to {ip}:{port} timed out ({conn_timeout}s).")
+        _relay_warnings.error(ip, "[PingPong] Initial connection to %s:%s timed out (%ss).", ip, port, conn_timeout)
     except socket.error as e:
-        logger.error(f"[PingPong] Connection error to {ip}:{port}: {e}")
+        _relay_warnings.error(ip, "[PingPong] Connection error to %s:%s: %s", ip, port, e)
     except Exception as e:
-        logger.exception(f"[PingPong] Unexpected error testing {ip}:{port}: {e}")
+        logger.exception("[PingPong] Unexpected error testing %s:%s: %s", ip, port, e)
     finally:
         if sock:
-            logger.debug(f"[PingPong] Closing socket for {ip}:{port}.")
+            logger.debug("[PingPong] Closing socket for %s:%s.", ip, port)
             try:
                 sock.shutdown(socket.SHUT_RDWR)
             except: pass
@@ -404,7 +417,7 @@ def _execute_socket_ping_pong(
     ul_str = f"{upload_mbps:.2f}" if upload_mbps is not None else "N/A"
     rtt_str = f"{avg_rtt_ms:.1f}" if avg_rtt_ms is not None else "N/A"
 
-    logger.info(f"[PingPong] Result for {ip}:{port}: DL={dl_str} Mbps, UL={ul_str} Mbps, Avg RTT={rtt_str} ms")
+    logger.info("[PingPong] Result for %s:%s: DL=%s Mbps, UL=%s Mbps, Avg RTT=%s ms", ip, port, dl_str, ul_str, rtt_str)
 
     return download_mbps, upload_mbps
 
@@ -423,15 +436,15 @@ def run_socket_ping_pong_test(
     ip_address = server.get("ipv4_addr_in")
     hostname = server.get("hostname", "N/A")
     if not ip_address:
-        logger.warning(f"PingPong Wrapper: No IP for server {hostname}")
+        _relay_warnings.warning(hostname, "PingPong Wrapper: No IP for server %s", hostname)
         return None, None
 
-    logger.info(f"Initiating PingPong speed test for {hostname} ({ip_address}) on ports {ports}...")
+    logger.info("Initiating PingPong speed test for %s (%s) on ports %s...", hostname, ip_address, ports)
 
     # Try ports sequentially, return first success
     for port in ports:
         if stop_event and stop_event.is_set():
-             logger.info(f"PingPong Wrapper: Test stopped by event before trying port {port}.")
+             logger.info("PingPong Wrapper: Test stopped by event before trying port %s.", port)
              return None, None
 
         dl_mbps, ul_mbps = _execute_socket_ping_pong(
@@ -446,10 +459,10 @@ def run_socket_ping_pong_test(
         # Consider a test successful if *either* upload or download has a value > 0
         # (as download might often be 0 even if upload burst worked)
         if dl_mbps is not None or ul_mbps is not None:
-            logger.info(f"PingPong Wrapper: Test for {hostname} completed on port {port}.")
+            logger.info("PingPong Wrapper: Test for %s completed on port %s.", hostname, port)
             return dl_mbps, ul_mbps # Return result from first working port
 
-    logger.warning(f"PingPong Wrapper: Test failed for {hostname} on all tried ports {ports}.")
+    _relay_warnings.warning(hostname, "PingPong Wrapper: Test failed for %s on all tried ports %s.", hostname, ports)
     return None, None # Failed on all ports
 
 # --- Server Data Processing ---
@@ -477,11 +490,10 @@ def filter_servers_by_protocol(servers: List[Dict[str, Any]], protocol: Optional
 
     protocol_filter = protocol.lower()
     filtered_servers: List[Dict[str, Any]] = []
-    logger.debug(f"Filtering {len(servers)} servers by protocol: {protocol_filter}")
+    logger.debug("Filtering %d servers by protocol: %s", len(servers), protocol_filter)
 
     for server in servers:
         endpoint_data = server.get("endpoint_data")
-        hostname = server.get("hostname", "N/A") # Keep for logging
 
         # Determine server type based on endpoint_data structure
         is_wireguard = isinstance(endpoint_data, dict) and "wireguard" in endpoint_data
@@ -492,16 +504,12 @@ def filter_servers_by_protocol(servers: List[Dict[str, Any]], protocol: Optional
         # Apply the filter
         if protocol_filter == "wireguard":
             if is_wireguard:
-                # logger.debug(f"Match WG: {hostname}")
                 filtered_servers.append(server)
-            # else: logger.debug(f"No Match WG: {hostname}, endpoint_data={endpoint_data}")
         elif protocol_filter == "openvpn":
             if is_openvpn:
-                # logger.debug(f"Match OVPN: {hostname}")
                 filtered_servers.append(server)
-            # else: logger.debug(f"No Match OVPN: {hostname}, endpoint_data={endpoint_data}")
 
-    logger.info(f"Filtering complete. {len(filtered_servers)} servers match protocol '{protocol_filter}'.")
+    logger.info("Filtering complete. %d servers match protocol '%s'.", len(filtered_servers), protocol_filter)
     return filtered_servers
 
 
@@ -578,44 +586,25 @@ def get_servers_by_country(data: Optional[Dict[str, Any]], country_code_filter:
 # --- Formatting and Export ---
 
 def export_to_csv(servers: List[Dict[str, Any]], filename: str) -> bool:
-    """Export server list with results to a CSV file."""
+    """
+    Export server list with results to a CSV file (streamed, see exporters.py).
+    Keeps the original columns (latency, download_speed, upload_speed) and
+    values; the GUI export writes the latency_ms/download_mbps/upload_mbps
+    names with rounded values instead.
+    """
     if not servers:
         logger.warning("Export to CSV called with no servers.")
         return False
 
-    # Define consistent headers, prioritize common results
-    headers = [
-        'hostname', 'country', 'city', 'protocol', 'latency',
-        'download_speed', 'upload_speed', 'country_code', 'city_code',
-        'ipv4_addr_in', 'ipv6_addr_in', 'active', 'owned', 'provider'
-        # Add other potential fields if needed, checking the first server is less reliable
-    ]
-    # Ensure all actual keys from the first server are included if not already present
-    # first_server_keys = servers[0].keys()
-    # for key in first_server_keys:
-    #     if key not in headers and not key.startswith('_'): # Avoid internal keys like 'treeview_item'
-    #          headers.append(key)
-
+    # Imported here: exporters -> catalog -> server_manager would be circular at module level
+    from exporters import export_records, legacy_server_records, LEGACY_RESULT_FIELDS, ExportError
     try:
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=headers, extrasaction='ignore')
-            writer.writeheader()
-
-            for server in servers:
-                # Create a row dict based on headers, getting values safely
-                row_data = {header: server.get(header, '') for header in headers}
-
-                # Determine protocol string if not explicitly set
-                if 'protocol' not in server or not isinstance(server.get('protocol'), str):
-                    hostname = server.get("hostname", "").lower()
-                    is_wireguard = hostname.endswith("-wg") or ".wg." in hostname
-                    row_data['protocol'] = "WireGuard" if is_wireguard else "OpenVPN"
-
-                writer.writerow(row_data)
-        logger.info(f"Successfully exported {len(servers)} servers to CSV: {filename}")
+        count = export_records(legacy_server_records(servers), filename,
+                               fields=LEGACY_RESULT_FIELDS, fmt="csv", compress=False)
+        logger.info(f"Successfully exported {count} servers to CSV: {filename}")
         return True
-    except IOError as e:
-        logger.exception(f"IOError exporting server list to CSV {filename}: {e}")
+    except (IOError, ExportError) as e:
+        logger.exception(f"Error exporting server list to CSV {filename}: {e}")
         return False
     except Exception as e:
         logger.exception(f"Unexpected error exporting server list to CSV {filename}: {e}")
@@ -672,4 +661,48 @@ def calculate_speed_color(speed: Optional[float], max_expected_speed: float = 10
         r = int(255 + (99 - 255) * ratio)
         g = int(235 + (190 - 235) * ratio)
         b = int(132 + (123 - 132) * ratio)
-        return f"#{r:02x}{g:02x}{b:02x}"
\ No newline at end of file
+        return f"#{r:02x}{g:02x}{b:02x}"
+
+# --- Quantized Color Palettes ---
+
+COLOR_PALETTE_STEPS = 32
+LATENCY_COLOR_RANGE_MS = 250.0 # Gradient ends at 250 ms (red beyond)
+SPEED_COLOR_RANGE_MBPS = 200.0 # Max expected speed used for the speed gradient
+
+def _contrast_text_color(color: str) -> str:
+    """Dark background -> white text, light background -> black text."""
+    r, g, b = int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+    return "#FFFFFF" if (r*0.299 + g*0.587 + b*0.114) < 140 else "#000000"
+
+class ColorPalette:
+    """
+    A fixed number of precomputed color steps for one metric.
+
+    Colors (and their Tk tag names) are computed once from the gradient
+    functions above, so coloring a cell is an index lookup into a table.
+    """
+
+    def __init__(self, name: str, color_func: Callable[[float], str], max_value: float, steps: int = COLOR_PALETTE_STEPS):
+        self.name = name
+        self.max_value = max_value
+        self.steps = steps
+        self._scale = (steps - 1) / max_value
+        self.colors: List[str] = [color_func(i * max_value / (steps - 1)).upper() for i in range(steps)]
+        self.text_colors: List[str] = [_contrast_text_color(color) for color in self.colors]
+        self.tags: List[str] = [f"cell_{name}_{i:02d}" for i in range(steps)]
+
+    def index(self, value: float) -> int:
+        """Map a value to its palette step (clamped to the palette range)."""
+        if value <= 0:
+            return 0
+        step = int(value * self._scale + 0.5)
+        return step if step < self.steps else self.steps - 1
+
+    def tag_for(self, value: float) -> str:
+        return self.tags[self.index(value)]
+
+    def color_for(self, value: float) -> str:
+        return self.colors[self.index(value)]
+
+LATENCY_PALETTE = ColorPalette("latency", calculate_latency_color, LATENCY_COLOR_RANGE_MS)
+SPEED_PALETTE = ColorPalette("speed", lambda speed: calculate_speed_color(speed, SPEED_COLOR_RANGE_MBPS), SPEED_COLOR_RANGE_MBPS)
@@ -16,7 +16,10 @@ setup(
     author_email="your.email@example.com", # Replace with your email
     url="https://github.com/yourusername/mullvad-server-finder", # Optional: Link to your repository
     packages=find_packages(exclude=("tests",)), # Find packages automatically
-    py_modules=["main", "gui", "mullvad_api", "server_manager", "config", "testing"], # Explicitly list modules if not in a package
+    py_modules=["main", "gui", "mullvad_api", "server_manager", "config", "testing",
+                "mullvad_finder", "catalog", "virtual_grid", "ui_bus", "result_model", "task_pool",
+                "results_io", "history", "exporters", "log_utils", "daemon", "failover",
+                "connection", "mullvad_client", "mullvad_fake"], # Explicitly list modules if not in a package
     install_requires=[
         "ttkthemes>=3.2.2", # Optional but recommended for better themes
     ],
@@ -26,6 +29,7 @@ setup(
         ],
         "console_scripts": [ # Keep console script for testing
              "mullvad-finder-test = testing:main",
+             "mullvad-finder-cli = mullvad_finder:main", # Headless scan/list (no tkinter)
         ]
     },
     classifiers=[
@@ -0,0 +1,224 @@
+import heapq
+import itertools
+import threading
+import time
+import logging
+from collections import deque
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+# --- Priorities (lower runs first within a lane) ---
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+# --- Task States ---
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+STATE_CANCELLED = "cancelled"
+
+# Each lane has its own queue and worker limit, so e.g. a long connect never
+# delays a status poll or a data reload.
+DEFAULT_LANES: Dict[str, int] = {
+    "test": 1,        # Ping/speed test runs (one at a time)
+    "connection": 1,  # Connect/disconnect (mutating CLI calls, serialized)
+    "status": 1,      # Status fetches
+    "data": 2,        # Relay data loading, CLI checks
+    "misc": 2,        # Anything else
+}
+
+class TaskCancelled(Exception):
+    """Custom exception a task can raise to report that it honoured a cancel request."""
+    pass
+
+
+class Task:
+    """A unit of work submitted to the TaskPool, with its state and timings."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name: str, lane: str, priority: int, func: Callable[..., Any],
+                 args: Tuple[Any, ...], kwargs: Dict[str, Any], cancel_event: Optional[threading.Event] = None):
+        self.id = next(Task._ids)
+        self.name = name
+        self.lane = lane
+        self.priority = priority
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancel_event = cancel_event or threading.Event()
+        self.state = STATE_QUEUED
+        self.error: Optional[BaseException] = None
+        self.result: Any = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """Request cancellation. Queued tasks never start; running tasks should poll cancel_event."""
+        self.cancel_event.set()
+
+    @property
+    def runtime(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def __repr__(self) -> str:
+        return f"Task(#{self.id} {self.name!r}, lane={self.lane}, state={self.state})"
+
+
+class _Lane:
+    """Priority queue plus a bounded set of worker threads."""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.queue: List[Tuple[int, int, Task]] = []
+        self.workers = 0
+        self.idle = 0
+
+
+class TaskPool:
+    """
+    Application-owned executor with named lanes, priorities and cancellation.
+
+    Worker threads are started on demand up to each lane's limit and exit
+    after being idle for a while. Active and recently finished tasks can be
+    listed with tasks() (used by the debug window).
+    """
+
+    IDLE_TIMEOUT_SEC = 30.0
+
+    def __init__(self, lanes: Optional[Dict[str, int]] = None, history_size: int = 50):
+        self._lock = threading.Condition()
+        self._lanes: Dict[str, _Lane] = {name: _Lane(name, n) for name, n in (lanes or DEFAULT_LANES).items()}
+        self._seq = itertools.count()
+        self._active: Dict[int, Task] = {} # Queued or running
+        self._history: "deque[Task]" = deque(maxlen=history_size)
+        self._shutdown = False
+
+    def submit(self, name: str, func: Callable[..., Any], *args: Any, lane: str = "misc",
+               priority: int = PRIORITY_NORMAL, cancel_event: Optional[threading.Event] = None,
+               **kwargs: Any) -> Task:
+        """
+        Queue func(*args, **kwargs) on a lane.
+
+        Args:
+            name: Human readable task name (shown in the debug window).
+            lane: Lane name; unknown lanes are created with one worker.
+            priority: Lower values run first within the lane.
+            cancel_event: Optional existing Event to use as the task's cancel flag
+                (e.g. a test's stop event), so cancel() reaches the running code.
+
+        Returns:
+            The Task handle.
+        """
+        task = Task(name, lane, priority, func, args, kwargs, cancel_event)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("TaskPool has been shut down")
+            lane_obj = self._lanes.get(lane)
+            if lane_obj is None:
+                logger.warning(f"Unknown task lane '{lane}', creating it with one worker.")
+                lane_obj = self._lanes[lane] = _Lane(lane, 1)
+            heapq.heappush(lane_obj.queue, (priority, next(self._seq), task))
+            self._active[task.id] = task
+            if lane_obj.idle == 0 and lane_obj.workers < lane_obj.max_workers:
+                lane_obj.workers += 1
+                threading.Thread(target=self._worker, args=(lane_obj,), daemon=True,
+                                 name=f"{lane}-worker-{lane_obj.workers}").start()
+            self._lock.notify_all()
+        logger.debug("Submitted %r (priority %d).", task, priority)
+        return task
+
+    def cancel(self, task_id: int) -> bool:
+        """Cancel a queued or running task by id. Returns False if it is not active."""
+        with self._lock:
+            task = self._active.get(task_id)
+        if task is None:
+            return False
+        task.cancel()
+        logger.info(f"Cancellation requested for {task!r}.")
+        return True
+
+    def cancel_lane(self, lane: str):
+        """Cancel every queued or running task of a lane."""
+        with self._lock:
+            tasks = [task for task in self._active.values() if task.lane == lane]
+        for task in tasks:
+            task.cancel()
+
+    def tasks(self) -> List[Task]:
+        """Snapshot of active tasks followed by recently finished ones (newest first)."""
+        with self._lock:
+            return sorted(self._active.values(), key=lambda t: t.id) + list(reversed(self._history))
+
+    def lane_limits(self) -> Dict[str, int]:
+        return {name: lane.max_workers for name, lane in self._lanes.items()}
+
+    def shutdown(self):
+        """Cancel all tasks and let the workers exit."""
+        with self._lock:
+            self._shutdown = True
+            tasks = list(self._active.values())
+            self._lock.notify_all()
+        for task in tasks:
+            task.cancel()
+        logger.info(f"Task pool shut down ({len(tasks)} active tasks cancelled).")
+
+    def _next_task(self, lane: _Lane) -> Optional[Task]:
+        """Pop the next runnable task, waiting up to IDLE_TIMEOUT_SEC. Called with the lock held."""
+        deadline = time.monotonic() + self.IDLE_TIMEOUT_SEC
+        while True:
+            while lane.queue:
+                task = heapq.heappop(lane.queue)[2]
+                if not task.cancelled:
+                    return task
+                self._finish(task, STATE_CANCELLED) # Cancelled before it started
+            remaining = deadline - time.monotonic()
+            if self._shutdown or remaining <= 0:
+                return None
+            lane.idle += 1
+            self._lock.wait(remaining)
+            lane.idle -= 1
+
+    def _finish(self, task: Task, state: str):
+        task.state = state
+        task.finished_at = time.time()
+        self._active.pop(task.id, None)
+        self._history.append(task)
+
+    def _worker(self, lane: _Lane):
+        while True:
+            with self._lock:
+                task = self._next_task(lane)
+                if task is None:
+                    lane.workers -= 1
+                    return
+                task.state = STATE_RUNNING
+                task.started_at = time.time()
+
+            state = STATE_DONE
+            try:
+                task.result = task.func(*task.args, **task.kwargs)
+            except TaskCancelled:
+                state = STATE_CANCELLED
+            except Exception as e:
+                task.error = e
+                state = STATE_FAILED
+                logger.exception(f"Task {task!r} failed: {e}")
+            if state == STATE_DONE and task.cancelled:
+                state = STATE_CANCELLED # Returned early after a cancel request
+
+            with self._lock:
+                self._finish(task, state)
+            logger.debug("%r finished in %.2fs.", task, task.runtime)
@@ -0,0 +1,104 @@
+import threading
+import logging
+from typing import Optional, List, Dict, Any, Callable, Tuple, NamedTuple
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+DEFAULT_DRAIN_INTERVAL_MS = 33 # ~30 UI refreshes per second
+
+class UIUpdateBatch(NamedTuple):
+    """Everything posted to the bus since the previous drain."""
+    rows: Dict[str, Dict[str, Any]] # item_id -> merged {column: value} updates
+    progress: Optional[float] # Latest progress percentage, if any was posted
+    status: Optional[str] # Latest operation/status text, if any was posted
+    calls: List[Tuple[Callable[[], Any], int]] # (callback, delay_ms) in posting order
+
+    def is_empty(self) -> bool:
+        return not self.rows and self.progress is None and self.status is None and not self.calls
+
+
+class UIUpdateBus:
+    """
+    Thread-safe collection point for UI updates produced by worker threads.
+
+    Workers post row results, progress and status text; repeated updates are
+    coalesced (last value wins, row updates are merged per item). A single
+    periodic Tk callback drains the bus and applies the whole batch at once,
+    instead of every result scheduling its own root.after(0, ...) closure.
+    """
+
+    def __init__(self, interval_ms: int = DEFAULT_DRAIN_INTERVAL_MS):
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._progress: Optional[float] = None
+        self._status: Optional[str] = None
+        self._calls: List[Tuple[Callable[[], Any], int]] = []
+        self._root = None
+        self._handler: Optional[Callable[[UIUpdateBatch], None]] = None
+        self._after_id: Optional[str] = None
+
+    # --- Producer API (any thread) ---
+
+    def post_row(self, item_id: str, **updates: Any):
+        """Merge column updates for a row (e.g. latency=12.3)."""
+        with self._lock:
+            self._rows.setdefault(item_id, {}).update(updates)
+
+    def post_progress(self, percentage: float):
+        """Set the progress bar value; only the latest value is applied."""
+        with self._lock:
+            self._progress = percentage
+
+    def post_status(self, text: str):
+        """Set the operation/status text; only the latest value is applied."""
+        with self._lock:
+            self._status = text
+
+    def post_call(self, callback: Callable[[], Any], delay_ms: int = 0):
+        """Run a callback on the Tk thread after the batched updates (optionally delayed)."""
+        with self._lock:
+            self._calls.append((callback, delay_ms))
+
+    # --- Consumer API (Tk thread) ---
+
+    def drain(self) -> UIUpdateBatch:
+        """Atomically take everything posted so far."""
+        with self._lock:
+            batch = UIUpdateBatch(self._rows, self._progress, self._status, self._calls)
+            self._rows = {}
+            self._progress = None
+            self._status = None
+            self._calls = []
+        return batch
+
+    def start(self, root, handler: Callable[[UIUpdateBatch], None]):
+        """Start draining every interval_ms on root's event loop, passing batches to handler."""
+        self._root = root
+        self._handler = handler
+        if self._after_id is None:
+            self._after_id = root.after(self.interval_ms, self._tick)
+            logger.debug(f"UI update bus started ({self.interval_ms} ms interval).")
+
+    def stop(self):
+        """Stop the periodic drain."""
+        if self._root is not None and self._after_id is not None:
+            try:
+                self._root.after_cancel(self._after_id)
+            except Exception as e:
+                logger.debug(f"Error cancelling UI bus drain: {e}")
+        self._after_id = None
+
+    def _tick(self):
+        batch = self.drain()
+        if not batch.is_empty() and self._handler:
+            try:
+                self._handler(batch)
+            except Exception as e:
+                logger.exception(f"Error applying UI update batch: {e}")
+        try:
+            self._after_id = self._root.after(self.interval_ms, self._tick)
+        except Exception:
+            # Root window destroyed
+            self._after_id = None
@@ -0,0 +1,597 @@
+import tkinter as tk
+from tkinter import ttk
+from tkinter import font as tkfont
+import logging
+from typing import Optional, List, Dict, Any, Sequence, Tuple, Callable, Union
+
+# Setup logger for this module
+logger = logging.getLogger(__name__)
+
+CELL_PADDING = 6 # Horizontal text padding inside a cell (pixels)
+RESIZE_GRIP = 4 # Distance from a heading border that starts a column resize (pixels)
+
+class VirtualGrid(ttk.Frame):
+    """
+    Treeview-like table that only renders the rows currently in view.
+
+    Rows live in an in-memory model (values, row tags and per-cell tags keyed
+    by item id). A small pool of canvas rectangles/texts is reused for the
+    visible window, so inserting, sorting or scrolling 20k rows costs about
+    the same as a few dozen. The public methods mirror the subset of
+    ttk.Treeview used by the GUI (insert, item, set, move, selection, ...);
+    bulk operations such as reorder() and set_cell_tag() are grid specific.
+    """
+
+    def __init__(self, parent, columns: Sequence[str], **kwargs):
+        super().__init__(parent, **kwargs)
+        self.columns: List[str] = list(columns)
+        self._col_opts: Dict[str, Dict[str, Any]] = {
+            c: {"width": 100, "minwidth": 20, "stretch": True, "anchor": tk.CENTER} for c in self.columns
+        }
+        self._headings: Dict[str, Dict[str, Any]] = {
+            c: {"text": c, "anchor": tk.CENTER, "command": None} for c in self.columns
+        }
+
+        # --- Row Model ---
+        self._values: Dict[str, List[str]] = {}
+        self._row_tags: Dict[str, Tuple[str, ...]] = {}
+        self._cell_tags: Dict[str, Dict[str, str]] = {}
+        self._order: List[str] = []
+        self._positions: Optional[Dict[str, int]] = None # Lazily rebuilt iid -> display index
+        self._tag_styles: Dict[str, Dict[str, str]] = {}
+        self._selection: List[str] = []
+        self._focus = ""
+        self._next_id = 0
+        self.striped = True # Use 'even_row'/'odd_row' tag styles by display position
+
+        self.colors: Dict[str, str] = {
+            "background": "#FFFFFF", "foreground": "#000000",
+            "select_bg": "#0078D7", "select_fg": "#FFFFFF",
+            "header_bg": "#E1E1E1", "header_fg": "#000000",
+            "grid_line": "#D9D9D9",
+        }
+
+        # --- Widgets ---
+        self._font = tkfont.nametofont("TkDefaultFont")
+        self._heading_font = tkfont.nametofont("TkHeadingFont")
+        self.row_height = self._font.metrics("linespace") + 8
+        header_height = self._heading_font.metrics("linespace") + 10
+
+        self.header = tk.Canvas(self, height=header_height, highlightthickness=0, bd=0)
+        self.body = tk.Canvas(self, highlightthickness=0, bd=0, takefocus=1)
+        self.header.grid(row=0, column=0, sticky="ew")
+        self.body.grid(row=1, column=0, sticky="nsew")
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        # --- Render State ---
+        self._slots: List[List[Tuple[int, int]]] = [] # Per pooled row: [(rect_id, text_id), ...] per column
+        self._slot_state: List[Any] = [] # Last rendered signature per slot (skip unchanged slots)
+        self._col_x: List[Tuple[int, int]] = [] # (x0, x1) per column after stretching
+        self._total_width = 0
+        self._layout_version = 0
+        self._redraw_pending = False
+        self._fit_cache: Dict[Tuple[str, int], str] = {}
+        self._scrollregion: Optional[Tuple[int, int, int, int]] = None
+        self._last_yview: Optional[Tuple[str, str]] = None
+        self._yscrollcommand: Optional[Callable] = None
+        self._xscrollcommand: Optional[Callable] = None
+        self._resize_state: Optional[Tuple[int, int, int]] = None # (column index, start x, start width)
+
+        self.body.configure(yscrollcommand=self._on_yscroll, xscrollcommand=self._on_xscroll)
+        self.body.bind("<Configure>", lambda e: self._relayout())
+        self.body.bind("<Button-1>", self._on_body_press)
+        self.body.bind("<MouseWheel>", self._on_mousewheel)
+        self.body.bind("<Button-4>", lambda e: self.yview_scroll(-3, "units"))
+        self.body.bind("<Button-5>", lambda e: self.yview_scroll(3, "units"))
+        self.body.bind("<Up>", lambda e: self._move_focus(-1))
+        self.body.bind("<Down>", lambda e: self._move_focus(1))
+        self.body.bind("<Prior>", lambda e: self._move_focus(-self._visible_rows()))
+        self.body.bind("<Next>", lambda e: self._move_focus(self._visible_rows()))
+        self.header.bind("<Button-1>", self._on_header_press)
+        self.header.bind("<B1-Motion>", self._on_header_drag)
+        self.header.bind("<ButtonRelease-1>", self._on_header_release)
+        self.header.bind("<Motion>", self._on_header_motion)
+
+    # --- Treeview-Compatible Configuration ---
+
+    def configure(self, cnf=None, **kw):
+        """Accept yscrollcommand/xscrollcommand like a Treeview; pass the rest to the Frame."""
+        if "yscrollcommand" in kw:
+            self._yscrollcommand = kw.pop("yscrollcommand")
+        if "xscrollcommand" in kw:
+            self._xscrollcommand = kw.pop("xscrollcommand")
+        if cnf or kw:
+            return super().configure(cnf, **kw)
+        return None
+
+    config = configure
+
+    def bind(self, sequence=None, func=None, add=None):
+        """Bind events on the row area. Always adds, so built-in handlers keep working."""
+        return self.body.bind(sequence, func, "+")
+
+    def heading(self, column: str, option: Optional[str] = None, **kw) -> Any:
+        """Query or modify heading options (text, anchor, command)."""
+        opts = self._headings[self._column_name(column)]
+        if kw:
+            opts.update(kw)
+            self._draw_header()
+            return None
+        return opts.get(option) if option else dict(opts)
+
+    def column(self, column: str, option: Optional[str] = None, **kw) -> Any:
+        """Query or modify column options (width, minwidth, stretch, anchor)."""
+        opts = self._col_opts[self._column_name(column)]
+        if kw:
+            opts.update(kw)
+            self._relayout()
+            return None
+        return opts.get(option) if option else dict(opts)
+
+    def tag_configure(self, tag: str, **kw):
+        """Define the background/foreground used for a row or cell tag."""
+        self._tag_styles.setdefault(tag, {}).update({k: v for k, v in kw.items() if k in ("background", "foreground")})
+        self._invalidate()
+
+    def set_colors(self, **colors: str):
+        """Update base colors (background, foreground, select_bg, select_fg, header_bg, header_fg, grid_line)."""
+        self.colors.update({k: v for k, v in colors.items() if v})
+        self.body.configure(background=self.colors["background"])
+        self.header.configure(background=self.colors["header_bg"])
+        self._draw_header()
+        self._invalidate()
+
+    def set_striped(self, striped: bool):
+        """Enable or disable alternating row colors."""
+        if striped != self.striped:
+            self.striped = striped
+            self._invalidate()
+
+    # --- Treeview-Compatible Row API ---
+
+    def insert(self, parent: str, index: Union[int, str], iid: Optional[str] = None,
+               values: Sequence[Any] = (), tags: Sequence[str] = ()) -> str:
+        """Insert a row and return its item id. Only top-level rows are supported."""
+        if iid is None:
+            self._next_id += 1
+            iid = f"R{self._next_id:06X}"
+        self._values[iid] = self._normalize_values(values)
+        self._row_tags[iid] = tuple(tags) if not isinstance(tags, str) else (tags,)
+        if index == tk.END or index == "end" or index >= len(self._order):
+            self._order.append(iid)
+            if self._positions is not None:
+                self._positions[iid] = len(self._order) - 1
+        else:
+            self._order.insert(int(index), iid)
+            self._positions = None
+        self._schedule_redraw()
+        return iid
+
+    def delete(self, *items: str):
+        """Delete rows (one pass over the display order, however many are removed)."""
+        if not items:
+            return
+        removed = set(items)
+        self._order = [iid for iid in self._order if iid not in removed]
+        for iid in removed:
+            self._values.pop(iid, None)
+            self._row_tags.pop(iid, None)
+            self._cell_tags.pop(iid, None)
+        self._selection = [iid for iid in self._selection if iid not in removed]
+        if self._focus in removed:
+            self._focus = ""
+        self._positions = None
+        self._schedule_redraw()
+
+    def get_children(self, item: str = "") -> Tuple[str, ...]:
+        """Return all row ids in display order."""
+        return tuple(self._order)
+
+    def exists(self, iid: str) -> bool:
+        return iid in self._values
+
+    def set(self, iid: str, column: Optional[str] = None, value: Any = None) -> Any:
+        """Get or set a single cell (column name or '#n'), or get the row as a dict."""
+        values = self._values[iid]
+        if column is None:
+            return dict(zip(self.columns, values))
+        col_index = self._column_index(column)
+        if value is None:
+            return values[col_index]
+        values[col_index] = str(value)
+        self._schedule_redraw()
+        return None
+
+    def item(self, iid: str, option: Optional[str] = None, **kw) -> Any:
+        """Query or modify a row's 'values' and 'tags'."""
+        if kw:
+            if "values" in kw:
+                self._values[iid] = self._normalize_values(kw["values"])
+            if "tags" in kw:
+                tags = kw["tags"]
+                self._row_tags[iid] = (tags,) if isinstance(tags, str) else tuple(tags)
+            self._schedule_redraw()
+            return None
+        if option == "values":
+            return tuple(self._values[iid])
+        if option == "tags":
+            return self._row_tags.get(iid, ())
+        return {"values": tuple(self._values[iid]), "tags": self._row_tags.get(iid, ())}
+
+    def move(self, iid: str, parent: str, index: int):
+        """Move a single row to a new display index."""
+        self._order.remove(iid)
+        self._order.insert(index, iid)
+        self._positions = None
+        self._schedule_redraw()
+
+    def reorder(self, order: Sequence[str]):
+        """
+        Replace the display order in one step (e.g. after sorting the model).
+        Rows left out of order are hidden but keep their values and tags.
+        """
+        self._order = list(order)
+        self._positions = None
+        self._schedule_redraw()
+
+    def index(self, iid: str) -> int:
+        """Return the display index of a row."""
+        return self._position_map()[iid]
+
+    def selection(self) -> Tuple[str, ...]:
+        return tuple(self._selection)
+
+    def selection_set(self, *items: Any):
+        """Replace the selection (accepts ids or a sequence of ids, like Treeview)."""
+        if len(items) == 1 and isinstance(items[0], (list, tuple)):
+            items = tuple(items[0])
+        self._selection = [iid for iid in items if iid in self._values]
+        self._schedule_redraw()
+        self.event_generate("<<TreeviewSelect>>")
+
+    def focus(self, iid: Optional[str] = None) -> Optional[str]:
+        """Get or set the focused row id."""
+        if iid is None:
+            return self._focus
+        self._focus = iid
+        return None
+
+    def see(self, iid: str):
+        """Scroll vertically so the given row is visible."""
+        if iid not in self._position_map():
+            return # Unknown or hidden row
+        self._update_scrollregion() # Fractions below refer to the current row count
+        index = self.index(iid)
+        top = self.body.canvasy(0)
+        height = self.body.winfo_height()
+        y0 = index * self.row_height
+        y1 = y0 + self.row_height
+        total = max(len(self._order) * self.row_height, 1)
+        if y0 < top:
+            self.body.yview_moveto(y0 / total)
+        elif y1 > top + height:
+            self.body.yview_moveto(max(0, y1 - height) / total)
+
+    def identify_region(self, x: int, y: int) -> str:
+        return "cell" if self.identify_row(y) and self.identify_column(x) else "nothing"
+
+    def identify_column(self, x: int) -> str:
+        canvas_x = self.body.canvasx(x)
+        for index, (x0, x1) in enumerate(self._col_x):
+            if x0 <= canvas_x < x1:
+                return f"#{index + 1}"
+        return ""
+
+    def identify_row(self, y: int) -> str:
+        index = int(self.body.canvasy(y) // self.row_height)
+        if 0 <= index < len(self._order):
+            return self._order[index]
+        return ""
+
+    def yview(self, *args):
+        return self.body.yview(*args)
+
+    def xview(self, *args):
+        result = self.body.xview(*args)
+        if args:
+            self.header.xview(*args)
+        return result
+
+    def yview_scroll(self, number: int, what: str):
+        self.body.yview_scroll(number, what)
+
+    # --- Per-Cell Tags ---
+
+    def set_cell_tag(self, iid: str, column: str, tag: Optional[str]):
+        """Set (or clear with None) the style tag of a single cell."""
+        if iid not in self._values:
+            return
+        cells = self._cell_tags.setdefault(iid, {})
+        if tag:
+            cells[self._column_name(column)] = tag
+        else:
+            cells.pop(self._column_name(column), None)
+        self._schedule_redraw()
+
+    def cell_tags(self, iid: str) -> Dict[str, str]:
+        """Return the {column: tag} mapping for a row."""
+        return dict(self._cell_tags.get(iid, {}))
+
+    def clear_cell_tags(self, iid: Optional[str] = None):
+        """Remove cell tags from one row, or from all rows when iid is None."""
+        if iid is None:
+            self._cell_tags.clear()
+        else:
+            self._cell_tags.pop(iid, None)
+        self._schedule_redraw()
+
+    # --- Internal Helpers ---
+
+    def _normalize_values(self, values: Sequence[Any]) -> List[str]:
+        row = ["" if v is None else str(v) for v in values]
+        if len(row) < len(self.columns):
+            row.extend([""] * (len(self.columns) - len(row)))
+        return row
+
+    def _column_index(self, column: str) -> int:
+        if column.startswith("#"):
+            return int(column[1:]) - 1
+        return self.columns.index(column)
+
+    def _column_name(self, column: str) -> str:
+        return self.columns[self._column_index(column)]
+
+    def _position_map(self) -> Dict[str, int]:
+        if self._positions is None:
+            self._positions = {iid: i for i, iid in enumerate(self._order)}
+        return self._positions
+
+    def _visible_rows(self) -> int:
+        return max(1, self.body.winfo_height() // self.row_height)
+
+    def _invalidate(self):
+        """Force every pooled slot to be re-rendered on the next redraw."""
+        self._slot_state = [None] * len(self._slots)
+        self._schedule_redraw()
+
+    # --- Layout and Rendering ---
+
+    def _relayout(self):
+        """Recompute column positions, stretching columns to fill the visible width."""
+        available = max(self.body.winfo_width(), 1)
+        widths = [max(int(self._col_opts[c]["width"]), int(self._col_opts[c]["minwidth"])) for c in self.columns]
+        extra = available - sum(widths)
+        stretchable = [i for i, c in enumerate(self.columns) if self._col_opts[c]["stretch"]]
+        if extra > 0 and stretchable:
+            base = sum(widths[i] for i in stretchable) or 1
+            for i in stretchable:
+                widths[i] += extra * widths[i] // base
+        x = 0
+        self._col_x = []
+        for width in widths:
+            self._col_x.append((x, x + width))
+            x += width
+        self._total_width = x
+        self._layout_version += 1
+        self._fit_cache.clear()
+        self._draw_header()
+        self._invalidate()
+
+    def _fit_text(self, text: str, width: int, heading: bool = False) -> str:
+        """Truncate text with an ellipsis so it fits into width pixels (cached)."""
+        key = (text, width)
+        fitted = self._fit_cache.get(key)
+        if fitted is not None:
+            return fitted
+        font = self._heading_font if heading else self._font
+        limit = width - 2 * CELL_PADDING
+        fitted = text
+        if text and font.measure(text) > limit:
+            lo, hi = 0, len(text)
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if font.measure(text[:mid] + "…") <= limit:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            fitted = text[:lo] + "…" if lo else ""
+        if len(self._fit_cache) > 20000:
+            self._fit_cache.clear()
+        self._fit_cache[key] = fitted
+        return fitted
+
+    def _text_position(self, anchor: str, x0: int, x1: int) -> Tuple[float, str]:
+        if anchor == tk.W:
+            return x0 + CELL_PADDING, tk.W
+        if anchor == tk.E:
+            return x1 - CELL_PADDING, tk.E
+        return (x0 + x1) / 2, tk.CENTER
+
+    def _draw_header(self):
+        """Redraw the heading row (cheap: one rectangle and one text per column)."""
+        self.header.delete("all")
+        height = int(self.header.cget("height"))
+        for index, column in enumerate(self.columns):
+            if index >= len(self._col_x):
+                break
+            x0, x1 = self._col_x[index]
+            opts = self._headings[column]
+            self.header.create_rectangle(x0, 0, x1, height, fill=self.colors["header_bg"],
+                                         outline=self.colors["grid_line"])
+            text_x, anchor = self._text_position(opts.get("anchor", tk.CENTER), x0, x1)
+            self.header.create_text(text_x, height / 2, text=self._fit_text(str(opts["text"]), x1 - x0, heading=True),
+                                    anchor=anchor, fill=self.colors["header_fg"], font=self._heading_font)
+        self.header.configure(scrollregion=(0, 0, self._total_width, height))
+
+    def _update_scrollregion(self):
+        scrollregion = (0, 0, self._total_width, max(len(self._order) * self.row_height, 1))
+        if scrollregion != self._scrollregion: # Reconfiguring always re-fires yscrollcommand
+            self._scrollregion = scrollregion
+            self.body.configure(scrollregion=scrollregion)
+
+    def _ensure_slots(self, count: int):
+        """Grow the pool of canvas items to at least `count` rows."""
+        while len(self._slots) < count:
+            slot = []
+            for _ in self.columns:
+                rect = self.body.create_rectangle(0, 0, 0, 0, state=tk.HIDDEN, width=1)
+                text = self.body.create_text(0, 0, state=tk.HIDDEN, font=self._font)
+                slot.append((rect, text))
+            self._slots.append(slot)
+            self._slot_state.append(None)
+
+    def _schedule_redraw(self):
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self._redraw)
+
+    def _row_colors(self, iid: str, index: int) -> Tuple[str, str]:
+        if iid in self._selection:
+            return self.colors["select_bg"], self.colors["select_fg"]
+        background, foreground = self.colors["background"], self.colors["foreground"]
+        tags = self._row_tags.get(iid, ())
+        if self.striped:
+            tags = tags + ("odd_row" if index % 2 else "even_row",)
+        for tag in tags:
+            style = self._tag_styles.get(tag)
+            if style:
+                background = style.get("background", background)
+                foreground = style.get("foreground", foreground)
+        return background, foreground
+
+    def _redraw(self):
+        """Render the rows inside the viewport into the pooled canvas items."""
+        self._redraw_pending = False
+        try:
+            if not self.winfo_exists():
+                return
+        except tk.TclError:
+            return
+
+        row_height = self.row_height
+        total_rows = len(self._order)
+        self._update_scrollregion()
+
+        first = max(0, int(self.body.canvasy(0) // row_height))
+        slot_count = self._visible_rows() + 2
+        self._ensure_slots(slot_count)
+        pool_size = len(self._slots)
+        grid_line = self.colors["grid_line"]
+        itemconfigure = self.body.itemconfigure
+        coords = self.body.coords
+
+        rendered = set()
+        for index in range(first, min(first + slot_count, total_rows)):
+            slot_index = index % pool_size # Rows keep their slot while scrolling
+            rendered.add(slot_index)
+            iid = self._order[index]
+            values = self._values[iid]
+            cells = self._cell_tags.get(iid)
+            row_bg, row_fg = self._row_colors(iid, index)
+            selected = iid in self._selection
+            signature = (index, iid, tuple(values), row_bg, row_fg,
+                         tuple(cells.items()) if cells and not selected else None, self._layout_version)
+            if self._slot_state[slot_index] == signature:
+                continue
+            self._slot_state[slot_index] = signature
+
+            y0 = index * row_height
+            for col_index, (rect, text) in enumerate(self._slots[slot_index]):
+                column = self.columns[col_index]
+                x0, x1 = self._col_x[col_index] if col_index < len(self._col_x) else (0, 0)
+                bg, fg = row_bg, row_fg
+                if cells and not selected:
+                    style = self._tag_styles.get(cells.get(column, ""))
+                    if style:
+                        bg = style.get("background", bg)
+                        fg = style.get("foreground", fg)
+                coords(rect, x0, y0, x1, y0 + row_height)
+                itemconfigure(rect, fill=bg, outline=grid_line, state=tk.NORMAL)
+                text_x, anchor = self._text_position(self._col_opts[column]["anchor"], x0, x1)
+                coords(text, text_x, y0 + row_height / 2)
+                itemconfigure(text, text=self._fit_text(values[col_index], x1 - x0), fill=fg,
+                              anchor=anchor, state=tk.NORMAL)
+
+        # Hide pooled items that are not showing a row
+        for slot_index in range(pool_size):
+            if slot_index not in rendered and self._slot_state[slot_index] != "hidden":
+                self._slot_state[slot_index] = "hidden"
+                for rect, text in self._slots[slot_index]:
+                    itemconfigure(rect, state=tk.HIDDEN)
+                    itemconfigure(text, state=tk.HIDDEN)
+
+    # --- Event Handlers ---
+
+    def _on_yscroll(self, first: str, last: str):
+        if self._yscrollcommand:
+            self._yscrollcommand(first, last)
+        if (first, last) != self._last_yview:
+            self._last_yview = (first, last)
+            self._schedule_redraw()
+
+    def _on_xscroll(self, first: str, last: str):
+        self.header.xview_moveto(first)
+        if self._xscrollcommand:
+            self._xscrollcommand(first, last)
+
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.yview_scroll(-delta * 3, "units")
+
+    def _on_body_press(self, event):
+        self.body.focus_set()
+        iid = self.identify_row(event.y)
+        if iid:
+            self._focus = iid
+            self.selection_set(iid)
+
+    def _move_focus(self, step: int):
+        if not self._order:
+            return
+        current = self._position_map().get(self._focus, -1 if step > 0 else len(self._order))
+        target = min(max(current + step, 0), len(self._order) - 1)
+        iid = self._order[target]
+        self._focus = iid
+        self.selection_set(iid)
+        self.see(iid)
+
+    def _header_border_at(self, x: int) -> Optional[int]:
+        """Return the column whose right border is near x (for resizing)."""
+        canvas_x = self.header.canvasx(x)
+        for index, (_, x1) in enumerate(self._col_x):
+            if abs(canvas_x - x1) <= RESIZE_GRIP:
+                return index
+        return None
+
+    def _on_header_motion(self, event):
+        cursor = "sb_h_double_arrow" if self._header_border_at(event.x) is not None else ""
+        self.header.configure(cursor=cursor)
+
+    def _on_header_press(self, event):
+        border = self._header_border_at(event.x)
+        if border is not None:
+            x0, x1 = self._col_x[border]
+            self._resize_state = (border, event.x, x1 - x0)
+            return
+        canvas_x = self.header.canvasx(event.x)
+        for index, (x0, x1) in enumerate(self._col_x):
+            if x0 <= canvas_x < x1:
+                command = self._headings[self.columns[index]].get("command")
+                if command:
+                    command()
+                return
+
+    def _on_header_drag(self, event):
+        if not self._resize_state:
+            return
+        index, start_x, start_width = self._resize_state
+        column = self.columns[index]
+        new_width = max(int(self._col_opts[column]["minwidth"]), start_width + event.x - start_x)
+        self._col_opts[column]["width"] = new_width
+        self._col_opts[column]["stretch"] = False # Keep the user's width
+        self._relayout()
+
+    def _on_header_release(self, event):
+        self._resize_state = None